@@ -7,6 +7,15 @@ CORS_ORIGINS = os.getenv("CORS_ORIGINS", "https://client.renoviapro.fr").strip()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "client_portal")
+# Pool de connexions (par worker) et instrumentation des commandes
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "0")) or None  # 0 = pas de limite
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0")) or None  # attente max d'une connexion libre
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_MONITORING = os.getenv("MONGO_MONITORING", "1") == "1"
+MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))  # au-delà : log + /internal/metrics
 
 # JWT
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me-in-production")
@@ -21,11 +30,25 @@ MAGIC_LINK_EXPIRE_MINUTES = int(os.getenv("MAGIC_LINK_EXPIRE_MINUTES", "30"))  #
 RATE_LIMIT_MAGIC_LINK_PER_HOUR = int(os.getenv("RATE_LIMIT_MAGIC_LINK_PER_HOUR", "5"))
 RATE_LIMIT_VERIFY_PER_HOUR = int(os.getenv("RATE_LIMIT_VERIFY_PER_HOUR", "10"))
 RATE_LIMIT_TICKET_CREATE_PER_HOUR = int(os.getenv("RATE_LIMIT_TICKET_CREATE_PER_HOUR", "5"))
+RATE_LIMIT_EXPORT_PER_HOUR = int(os.getenv("RATE_LIMIT_EXPORT_PER_HOUR", "10"))
 
 # Upload (tickets)
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "5"))
 MAX_TICKET_FILES = int(os.getenv("MAX_TICKET_FILES", "8"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))  # fichiers traités en parallèle par requête
+DOCUMENT_BUNDLE_CONCURRENCY = int(os.getenv("DOCUMENT_BUNDLE_CONCURRENCY", "4"))  # PDF DF téléchargés en parallèle (ZIP)
+# Préfixe `internal` nginx pour servir les pièces jointes via X-Accel-Redirect (ex. "/_uploads/"), vide = servi par l'API
+ATTACHMENTS_ACCEL_REDIRECT = os.getenv("ATTACHMENTS_ACCEL_REDIRECT", "")
+
+# Compression des réponses (gzip / brotli selon Accept-Encoding)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # en dessous, le gain ne couvre pas le coût CPU
+
+# Temps réel tickets (SSE, change streams — MongoDB en replica set requis)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_CONNECTIONS_PER_USER = int(os.getenv("SSE_MAX_CONNECTIONS_PER_USER", "3"))  # par worker
+SSE_REPLAY_BUFFER = int(os.getenv("SSE_REPLAY_BUFFER", "1000"))  # événements gardés pour Last-Event-ID
+SSE_TOKEN_EXPIRE_SECONDS = int(os.getenv("SSE_TOKEN_EXPIRE_SECONDS", "60"))  # jeton ?token= du flux, à usage immédiat
 
 # ── Connexions inter-services ──────────────────────────────────────────────
 # renovia-pro-compta (chantiers, documents client)
@@ -38,6 +61,20 @@ DF_URL = os.getenv("DF_URL", "https://df.renoviapro.fr")
 DF_JWT_SECRET = os.getenv("DF_JWT_SECRET", "")
 DF_ADMIN_USER_ID = os.getenv("DF_ADMIN_USER_ID", "")
 DF_CLIENT_PORTAL_API_KEY = os.getenv("DF_CLIENT_PORTAL_API_KEY", "")
+DF_DOCUMENTS_PAGE_SIZE = int(os.getenv("DF_DOCUMENTS_PAGE_SIZE", "50"))  # documents par page GET /api/documents
+
+# Cloisons par service amont (par worker) : appels simultanés puis file d'attente bornée
+DF_MAX_CONCURRENCY = int(os.getenv("DF_MAX_CONCURRENCY", "8"))
+DF_PDF_MAX_CONCURRENCY = int(os.getenv("DF_PDF_MAX_CONCURRENCY", "3"))  # PDF : gros et lents, plafonnés à part
+COMPTA_MAX_CONCURRENCY = int(os.getenv("COMPTA_MAX_CONCURRENCY", "8"))
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", "50"))  # au-delà : refus immédiat
+UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "5"))
+
+# Cache des lectures compta / DF (par worker) et préchargement après connexion
+CONNECTOR_CACHE_TTL_SECONDS = float(os.getenv("CONNECTOR_CACHE_TTL_SECONDS", "60"))
+CONNECTOR_CACHE_MAX_ENTRIES = int(os.getenv("CONNECTOR_CACHE_MAX_ENTRIES", "5000"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))  # utilisateurs préchargés en parallèle
+PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", "100"))  # au-delà, pas de préchargement
 # ────────────────────────────────────────────────────────────────────────────
 
 # SMTP (emails magic link) — même schéma que le site principal (backend)
@@ -47,3 +84,31 @@ SMTP_USER = os.getenv("SMTP_USER", "")
 # SMTP_PASS ou SMTP_PASSWORD pour partager le .env avec le site principal
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD") or os.getenv("SMTP_PASS", "")
 SMTP_FROM = os.getenv("SMTP_FROM", "noreply@renoviapro.fr")
+# ssl (port 465) | starttls | none (sink SMTP local, ex. `python -m aiosmtpd -n -l localhost:1025`)
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl" if SMTP_PORT == 465 else "starttls").lower()
+
+# Outbox email (envoi asynchrone par workers en tâche de fond)
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "2"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))  # 30s, 60s, 120s…
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", "120"))  # message "sending" repris après ce délai
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))  # messages envoyés par session SMTP
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_IDLE_TIMEOUT_SECONDS = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "60"))
+
+# Surveillance de la boucle asyncio : retard mesuré en continu, détecteur d'appels bloquants (pile capturée)
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "1") == "1"
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_BLOCK_DETECTOR = os.getenv("LOOP_BLOCK_DETECTOR", "1" if DEBUG else "0") == "1"
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+
+# Profilage à la demande (en-tête X-Profile: 1) : réservé aux emails de ADMIN_EMAILS
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+PROFILE_RETENTION_HOURS = int(os.getenv("PROFILE_RETENTION_HOURS", "24"))
+RATE_LIMIT_PROFILE_PER_HOUR = int(os.getenv("RATE_LIMIT_PROFILE_PER_HOUR", "30"))
+
+# Métriques internes (GET /api/v1/internal/metrics, header X-Metrics-Token) — vide = désactivé
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
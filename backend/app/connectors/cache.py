@@ -0,0 +1,90 @@
+"""
+Cache mémoire (par worker) des lectures compta / DF, clé = arguments de l'appel.
+
+Entrées valides CONNECTOR_CACHE_TTL_SECONDS ; appels concurrents sur la même clé
+fusionnés (un seul appel amont, les autres attendent son résultat). Les valeurs
+vides ou None ne sont pas gardées : les connecteurs les renvoient aussi en cas
+d'erreur amont. Les valeurs sont partagées entre appelants : ne pas les modifier.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from app.config import CONNECTOR_CACHE_MAX_ENTRIES, CONNECTOR_CACHE_TTL_SECONDS
+from app.services import metrics
+
+
+class TtlCache:
+    def __init__(self, name: str, ttl: float = CONNECTOR_CACHE_TTL_SECONDS, max_entries: int = CONNECTOR_CACHE_MAX_ENTRIES) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    def fresh(self, key: tuple) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def peek(self, key: tuple) -> Any:
+        """Valeur en cache si encore valide, sinon None (sans appel ni métrique)."""
+        entry = self._data.get(key)
+        return entry[1] if entry is not None and entry[0] > time.monotonic() else None
+
+    def invalidate(self, key: tuple) -> None:
+        self._data.pop(key, None)
+
+    def invalidate_where(self, match: Callable[[tuple], bool]) -> None:
+        for key in [k for k in self._data if match(k)]:
+            del self._data[key]
+
+    async def get(self, key: tuple, load: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._data.move_to_end(key)
+            metrics.incr("connector_cache", cache=self.name, result="hit")
+            return entry[1]
+        if key in self._inflight:
+            metrics.incr("connector_cache", cache=self.name, result="joined")
+            return await asyncio.shield(self._inflight[key])
+        metrics.incr("connector_cache", cache=self.name, result="miss")
+        fut = asyncio.ensure_future(load())
+        self._inflight[key] = fut
+        try:
+            # shield : l'annulation d'un appelant n'interrompt pas l'appel partagé
+            value = await asyncio.shield(fut)
+        finally:
+            if fut.done():
+                self._inflight.pop(key, None)
+            else:
+                fut.add_done_callback(lambda f: self._store(key, f))
+        self._put(key, value)
+        return value
+
+    def _store(self, key: tuple, fut: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not fut.cancelled() and fut.exception() is None:
+            self._put(key, fut.result())
+
+    def _put(self, key: tuple, value: Any) -> None:
+        if not value:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+def cached(fn: Callable[..., Awaitable[Any]]):
+    """Met en cache une lecture de connecteur (arguments positionnels hashables)."""
+    cache = TtlCache(fn.__qualname__)
+
+    @functools.wraps(fn)
+    async def wrapper(*args):
+        return await cache.get(args, lambda: fn(*args))
+
+    wrapper.cache = cache
+    return wrapper
@@ -11,9 +11,14 @@ from datetime import datetime, timedelta, timezone
 from typing import Any
 
 import httpx
+import orjson
 from jose import jwt
 
 from app.config import COMPTA_URL, COMPTA_JWT_SECRET, COMPTA_JWT_ALGORITHM
+from app.connectors import failures
+from app.connectors.cache import cached
+from app.connectors.schemas import ComptaDocument, ComptaSite, decode_items, entry_photos
+from app.services import bulkhead
 
 log = logging.getLogger(__name__)
 
@@ -31,37 +36,61 @@ def _headers(email: str) -> dict:
     return {"Authorization": f"Bearer {_compta_token(email)}"}
 
 
-async def _get(path: str, email: str, params: dict | None = None) -> Any:
-    """GET vers compta. Retourne None en cas d'erreur."""
+async def _get_raw(path: str, email: str, params: dict | None = None) -> bytes | None:
+    """GET vers compta, corps brut (décodé par l'appelant). None en cas d'erreur."""
     if not COMPTA_JWT_SECRET:
         return None
     url = f"{COMPTA_URL.rstrip('/')}{path}"
     try:
-        async with httpx.AsyncClient(timeout=8) as client:
+        async with bulkhead.compta.slot(), httpx.AsyncClient(timeout=8) as client:
             r = await client.get(url, headers=_headers(email), params=params or {})
         if r.status_code == 200:
-            return r.json()
+            return r.content
         log.warning("[compta] %s → %s", url, r.status_code)
+        if r.status_code != 404:
+            failures.report("compta", f"{path} → HTTP {r.status_code}")
         return None
     except Exception as exc:
         log.error("[compta] erreur HTTP : %s", exc)
+        failures.report("compta", f"{path} : {type(exc).__name__}")
+        return None
+
+
+async def _get(path: str, email: str, params: dict | None = None) -> Any:
+    """GET vers compta. Retourne None en cas d'erreur."""
+    raw = await _get_raw(path, email, params)
+    if not raw:
+        return None
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError as exc:
+        log.error("[compta] JSON invalide %s : %s", path, exc)
         return None
 
 
+def _decode(raw: bytes | None, *keys: str) -> list[dict]:
+    if not raw:
+        return []
+    try:
+        return decode_items(raw, *keys)
+    except orjson.JSONDecodeError as exc:
+        log.error("[compta] JSON invalide : %s", exc)
+        failures.report("compta", "JSON invalide")
+        return []
+
+
 # ── Chantiers (sites) ────────────────────────────────────────────────────────
 
+@cached
 async def get_chantiers_for_client(email: str) -> list[dict[str, Any]]:
-    data = await _get("/api/sites", email)
-    if not data:
-        return []
-    sites = data if isinstance(data, list) else data.get("items", data.get("sites", []))
+    sites = _decode(await _get_raw("/api/sites", email), "items", "sites")
     result = []
-    for s in sites:
+    for s in map(ComptaSite, sites):
         result.append({
-            "id": str(s.get("id") or s.get("_id", "")),
-            "label": s.get("name") or s.get("label", "Chantier"),
-            "status": _normalize_status(s.get("status", "")),
-            "address": s.get("address") or s.get("location", ""),
+            "id": s.id,
+            "label": s.label or "Chantier",
+            "status": _normalize_status(s.status),
+            "address": s.address,
         })
     return result
 
@@ -70,21 +99,14 @@ async def get_chantier_by_id(chantier_id: str, email: str) -> dict[str, Any] | N
     data = await _get(f"/api/sites/{chantier_id}", email)
     if not data:
         return None
-    entries = await _get(f"/api/sites/{chantier_id}/entries", email) or []
-    photos_avant = []
-    photos_apres = []
-    for e in (entries if isinstance(entries, list) else entries.get("items", [])):
-        for ph in e.get("photos", []):
-            url = ph.get("url") or ph.get("path", "")
-            if ph.get("type") == "avant":
-                photos_avant.append(url)
-            else:
-                photos_apres.append(url)
+    entries = _decode(await _get_raw(f"/api/sites/{chantier_id}/entries", email), "items")
+    photos_avant, photos_apres = entry_photos(entries)
+    site = ComptaSite(data, default_id=chantier_id)
     return {
-        "id": str(data.get("id") or data.get("_id", chantier_id)),
-        "label": data.get("name") or data.get("label", ""),
-        "status": _normalize_status(data.get("status", "")),
-        "address": data.get("address") or data.get("location", ""),
+        "id": site.id,
+        "label": site.label,
+        "status": _normalize_status(site.status),
+        "address": site.address,
         "photos_avant": photos_avant,
         "photos_apres": photos_apres,
     }
@@ -97,19 +119,18 @@ async def get_maintenance_contract(email: str) -> dict[str, Any] | None:
 
 # ── Documents ────────────────────────────────────────────────────────────────
 
+@cached
 async def get_documents_for_client(email: str) -> list[dict[str, Any]]:
-    data = await _get("/api/client/documents", email)
-    if not data:
-        return []
-    docs = data if isinstance(data, list) else data.get("items", data.get("documents", []))
+    docs = _decode(await _get_raw("/api/client/documents", email), "items", "documents")
     result = []
-    for d in docs:
+    for d in map(ComptaDocument, docs):
         result.append({
-            "id": str(d.get("id") or d.get("_id", "")),
-            "type": _doc_type(d.get("type") or d.get("category", "")),
-            "label": d.get("title") or d.get("label") or d.get("name", "Document"),
-            "date": _fmt_date(d.get("date") or d.get("created_at", "")),
-            "url": d.get("url") or d.get("download_url", ""),
+            "id": d.id,
+            "type": _doc_type(d.type),
+            "label": d.label,
+            "date": _fmt_date(d.date),
+            "url": d.url,
+            "source": "compta",
         })
     return result
 
@@ -4,24 +4,32 @@ Connecteur renovia-pros-DF (https://df.renoviapro.fr).
 - Authentification : JWT admin (sub = DF_ADMIN_USER_ID, secret = DF_JWT_SECRET)
 - Documents : les tokens public_signing_token / public_payment_token sont fournis
   directement par GET /api/documents. Si absents, on les génère via API.
+  Filtres (statut, archivage, type, dates) et pagination sont passés à DF
+  (voir scripts/df_standin.py pour le contrat modélisé).
 - Signature  : page publique DF → /sign/{public_signing_token}
 - Paiement   : page publique DF → /pay/{public_payment_token}
 """
 from __future__ import annotations
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, AsyncIterator
 
 import httpx
+import orjson
 from jose import jwt
 
-from app.config import DF_URL, DF_JWT_SECRET, DF_ADMIN_USER_ID, DF_CLIENT_PORTAL_API_KEY
+from app.config import DF_URL, DF_JWT_SECRET, DF_ADMIN_USER_ID, DF_CLIENT_PORTAL_API_KEY, DF_DOCUMENTS_PAGE_SIZE
+from app.connectors import failures
+from app.connectors.cache import cached
+from app.connectors.schemas import DfClient, DfContract, DfDocument, MaintenanceInvoice, decode_items
+from app.services import bulkhead
 
 log = logging.getLogger(__name__)
 
 # Statuts DF (uppercase dans la BDD DF)
 _CLIENT_VISIBLE_STATUSES = {"SENT", "ACCEPTED", "REFUSED", "INVOICED", "COMPLETED",
                              "PAID", "TRANSFER_PENDING", "PARTIALLY_PAID"}
+_DF_DOC_TYPES = {"devis": "QUOTE", "facture": "INVOICE"}
 
 
 def _df_token() -> str:
@@ -36,28 +44,54 @@ def _headers() -> dict:
     return {"Authorization": f"Bearer {_df_token()}"}
 
 
-async def _get(path: str, params: dict | None = None) -> Any:
+async def _get_raw(path: str, params: dict | None = None) -> bytes | None:
+    """GET admin DF, corps brut (décodé par l'appelant). None en cas d'erreur."""
     if not DF_JWT_SECRET or not DF_ADMIN_USER_ID:
         return None
     url = f"{DF_URL.rstrip('/')}{path}"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=10) as client:
             r = await client.get(url, headers=_headers(), params=params or {})
         if r.status_code == 200:
-            return r.json()
+            return r.content
         log.warning("[df] GET %s → %s : %s", url, r.status_code, r.text[:100])
+        if r.status_code != 404:
+            failures.report("df", f"{path} → HTTP {r.status_code}")
         return None
     except Exception as exc:
         log.error("[df] GET erreur : %s", exc)
+        failures.report("df", f"{path} : {type(exc).__name__}")
+        return None
+
+
+async def _get(path: str, params: dict | None = None) -> Any:
+    raw = await _get_raw(path, params)
+    if not raw:
+        return None
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError as exc:
+        log.error("[df] JSON invalide %s : %s", path, exc)
         return None
 
 
+def _decode(raw: bytes | None, *keys: str) -> list[dict]:
+    if not raw:
+        return []
+    try:
+        return decode_items(raw, *keys)
+    except orjson.JSONDecodeError as exc:
+        log.error("[df] JSON invalide : %s", exc)
+        failures.report("df", "JSON invalide")
+        return []
+
+
 async def _post(path: str, body: dict | None = None) -> Any:
     if not DF_JWT_SECRET or not DF_ADMIN_USER_ID:
         return None
     url = f"{DF_URL.rstrip('/')}{path}"
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=15) as client:
             r = await client.post(url, headers=_headers(), json=body or {})
         if r.status_code in (200, 201):
             return r.json()
@@ -68,13 +102,12 @@ async def _post(path: str, body: dict | None = None) -> Any:
         return None
 
 
+@cached
 async def _get_df_client_id(email: str) -> str | None:
-    data = await _get("/api/clients", {"search": email})
-    if not data:
-        return None
-    for c in (data if isinstance(data, list) else []):
-        if c.get("email", "").lower() == email.lower():
-            return c.get("id")
+    email = email.lower()
+    for c in map(DfClient, _decode(await _get_raw("/api/clients", {"search": email}))):
+        if c.email == email:
+            return c.id
     return None
 
 
@@ -98,105 +131,242 @@ async def _ensure_payment_token(doc_id: str, existing_token: str | None) -> str
     return None
 
 
+def _status_codes(status: str | None) -> set[str]:
+    return {c for c in _CLIENT_VISIBLE_STATUSES if not status or _doc_status(c) == status}
+
+
+def document_query(
+    client_id: str,
+    doc_type: str | None = None,
+    status: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+) -> tuple:
+    """Paramètres GET /api/documents (hors page), clé du cache `_fetch_document_page`."""
+    params: dict[str, Any] = {
+        "client_id": client_id,
+        "status": ",".join(sorted(_status_codes(status))),
+        "archived": "false",
+        "sort": "-date,-id",
+        "page_size": DF_DOCUMENTS_PAGE_SIZE,
+    }
+    if doc_type:
+        params["doc_type"] = _DF_DOC_TYPES.get(doc_type, doc_type.upper())
+    if since:
+        params["date_from"] = since
+    if until:
+        params["date_to"] = until
+    return tuple(params.items())
+
+
+async def warm_document_page(email: str) -> None:
+    """Met en cache la première page de la liste par défaut (préchargement après connexion).
+
+    Seule page demandée d'emblée par le SPA ; jetons signature / paiement laissés à la
+    vraie requête.
+    """
+    client_id = await _get_df_client_id(email)
+    if client_id:
+        await _fetch_document_page(document_query(client_id), 1)
+
+
+def document_page_warm(email: str) -> bool:
+    """Première page de la liste par défaut déjà en cache (vérification sans appel DF)."""
+    client_id = _get_df_client_id.cache.peek((email,))
+    return client_id is not None and _fetch_document_page.cache.fresh((document_query(client_id), 1))
+
+
+async def invalidate_client_documents(email: str) -> None:
+    """Oublie les documents DF et factures de maintenance en cache du client.
+
+    Statuts et actions (Signer / Payer) changent quand le client signe ou paie
+    sur DF : le SPA demande `refresh` à son retour.
+    """
+    get_maintenance_invoices_for_client.cache.invalidate((email,))
+    client_id = await _get_df_client_id(email)
+    if client_id:
+        _fetch_document_page.cache.invalidate_where(lambda key: dict(key[0]).get("client_id") == client_id)
+
+
+async def iter_client_documents(
+    email: str,
+    doc_type: str | None = None,
+    status: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+) -> AsyncIterator[DfDocument]:
+    """Devis/factures DF visibles du client, du plus récent au plus ancien (date, id).
+
+    Filtres : type (`devis`, `facture`), statut affiché (`Envoyé`…), dates minimale
+    et maximale incluses (YYYY-MM-DD ; `until` = date du curseur de la liste
+    paginée : la page N ne relit pas les N-1 premières). Statuts, archivage, type,
+    dates, tri et pagination sont envoyés à DF ; les pages sont lues à la demande,
+    l'appelant qui s'arrête ne déclenche pas les suivantes. Sans jetons signature/paiement : `document_item()` les obtient
+    pour les seuls documents effectivement renvoyés.
+    """
+    codes = _status_codes(status)
+    if not codes:
+        return
+    client_id = await _get_df_client_id(email)
+    if not client_id:
+        return
+    query = document_query(client_id, doc_type, status, since, until)
+
+    page = 1
+    while True:
+        items, has_more = await _fetch_document_page(query, page) or ([], False)
+        # Filtres rejoués localement : une version de DF qui ignore un paramètre
+        # renvoie un sur-ensemble, jamais un document à cacher.
+        docs = [
+            d for d in _visible_documents(items)
+            if (not doc_type or _doc_type(d.doc_type) == doc_type)
+            and d.status in codes
+            and (not since or d.date >= since)
+            and (not until or d.date <= until)
+        ]
+        docs.sort(key=lambda d: (d.date, d.id), reverse=True)
+        for d in docs:
+            yield d
+        if not has_more:
+            return
+        page += 1
+
+
+@cached
+async def _fetch_document_page(query: tuple, page: int) -> tuple[list[dict], bool] | None:
+    """(documents, page suivante ?) de GET /api/documents, None en cas d'erreur.
+
+    Réponse paginée : {"items": [...], "page": n, "has_more": bool}. Un tableau nu
+    (DF sans pagination) est la liste complète.
+    """
+    raw = await _get_raw("/api/documents", {**dict(query), "page": page})
+    if not raw:
+        return None
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError as exc:
+        log.error("[df] JSON invalide /api/documents : %s", exc)
+        failures.report("df", "/api/documents : JSON invalide")
+        return None
+    if isinstance(data, list):
+        return [d for d in data if isinstance(d, dict)], False
+    if not isinstance(data, dict):
+        return None
+    items = [d for d in data.get("items") or () if isinstance(d, dict)]
+    return items, bool(data.get("has_more")) and bool(items)
+
+
+def document_actions(d: DfDocument) -> list[str]:
+    """Actions attendues du client sur le document (`sign`, `pay`), sans créer de lien."""
+    doc_type = _doc_type(d.doc_type)
+    if doc_type == "devis" and d.status == "SENT":
+        return ["sign"]
+    if doc_type == "facture" and d.status in ("SENT", "TRANSFER_PENDING", "PARTIALLY_PAID"):
+        return ["pay"]
+    return []
+
+
+def document_fields(d: DfDocument) -> dict[str, Any]:
+    """Document DF au format API, sans liens de signature / paiement (aucun appel DF)."""
+    return {
+        "id": d.id,
+        "type": _doc_type(d.doc_type),
+        "label": d.label,
+        "date": d.date,
+        "status": _doc_status(d.status),
+        "url": f"/api/v1/documents/{d.id}/view",
+        "sign_url": None,
+        "pay_url": None,
+        "actions": document_actions(d),
+        "total_ttc": d.total_ttc,
+        "source": "df",
+    }
+
+
+async def document_item(d: DfDocument) -> dict[str, Any]:
+    """Document DF au format API, avec liens de signature / paiement (créés au besoin)."""
+    item = document_fields(d)
+    actions: list[str] = []
+
+    if "sign" in item["actions"]:
+        token = await _ensure_signing_token(d.id, d.public_signing_token)
+        if token:
+            item["sign_url"] = f"{DF_URL.rstrip('/')}/sign/{token}"
+            actions.append("sign")
+
+    if "pay" in item["actions"]:
+        token = await _ensure_payment_token(d.id, d.public_payment_token)
+        if token:
+            item["pay_url"] = f"{DF_URL.rstrip('/')}/pay/{token}"
+            actions.append("pay")
+
+    item["actions"] = actions
+    return item
+
+
 async def get_documents_for_client(email: str) -> list[dict[str, Any]]:
     """Retourne les devis, factures DF et factures de maintenance envoyés au client."""
-    result = []
-    
     # 1. Documents classiques (devis/factures de chantier)
-    client_id = await _get_df_client_id(email)
-    if client_id:
-        data = await _get("/api/documents", {"client_id": client_id})
-        if data:
-            for d in (data if isinstance(data, list) else []):
-                status_raw = (d.get("status") or "").upper()
-                if status_raw not in _CLIENT_VISIBLE_STATUSES:
-                    continue
-                if d.get("archived_at") or d.get("deleted_at"):
-                    continue
-
-                doc_id = d.get("id", "")
-                raw_doc_type = (d.get("doc_type") or "").upper()
-                doc_type = _doc_type(raw_doc_type)
-                label = d.get("doc_number") or d.get("title") or "Document"
-                if d.get("doc_number") and d.get("title"):
-                    label = f"{d['doc_number']} – {d['title']}"
-
-                sign_url: str | None = None
-                pay_url: str | None = None
-                actions: list[str] = []
-
-                if doc_type == "devis" and status_raw == "SENT":
-                    token = await _ensure_signing_token(doc_id, d.get("public_signing_token"))
-                    if token:
-                        sign_url = f"{DF_URL.rstrip('/')}/sign/{token}"
-                        actions.append("sign")
-
-                if doc_type == "facture" and status_raw in ("SENT", "TRANSFER_PENDING", "PARTIALLY_PAID"):
-                    token = await _ensure_payment_token(doc_id, d.get("public_payment_token"))
-                    if token:
-                        pay_url = f"{DF_URL.rstrip('/')}/pay/{token}"
-                        actions.append("pay")
-
-                result.append({
-                    "id": doc_id,
-                    "type": doc_type,
-                    "label": label,
-                    "date": str(d.get("issue_date") or d.get("created_at", ""))[:10],
-                    "status": _doc_status(status_raw),
-                    "url": f"/api/v1/documents/{doc_id}/view",
-                    "sign_url": sign_url,
-                    "pay_url": pay_url,
-                    "actions": actions,
-                    "total_ttc": d.get("total_ttc"),
-                    "source": "df",
-                })
-    
+    result = [await document_item(d) async for d in iter_client_documents(email)]
+
     # 2. Factures de maintenance (via API client-portal)
-    maintenance_invoices = await _get_maintenance_invoices(email)
+    maintenance_invoices = await get_maintenance_invoices_for_client(email)
     result.extend(maintenance_invoices)
-    
+
     return result
 
 
-async def _get_maintenance_invoices(email: str) -> list[dict[str, Any]]:
+def _visible_documents(items: list[dict]) -> list[DfDocument]:
+    """Documents montrables au client ; le statut est testé avant de construire l'objet."""
+    return [
+        DfDocument(d) for d in items
+        if (d.get("status") or "").upper() in _CLIENT_VISIBLE_STATUSES
+        and not (d.get("archived_at") or d.get("deleted_at"))
+    ]
+
+
+@cached
+async def get_maintenance_invoices_for_client(email: str) -> list[dict[str, Any]]:
     """Récupère les factures de maintenance depuis l'API client-portal DF."""
     if not DF_CLIENT_PORTAL_API_KEY:
         return []
     
     url = f"{DF_URL.rstrip('/')}/api/client-portal/contract"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=10) as client:
             r = await client.get(
                 url,
                 params={"email": email},
                 headers={"X-API-Key": DF_CLIENT_PORTAL_API_KEY}
             )
         if r.status_code != 200:
+            if r.status_code != 404:
+                failures.report("maintenance", f"client-portal/contract → HTTP {r.status_code}")
             return []
-        data = r.json()
+        data = orjson.loads(r.content)
     except Exception as exc:
         log.error("[df] maintenance invoices erreur : %s", exc)
+        failures.report("maintenance", f"client-portal/contract : {type(exc).__name__}")
         return []
 
     contract = data.get("contract")
     if not contract:
         return []
 
-    invoices_raw = data.get("invoices") or []
     result = []
-    for inv in invoices_raw:
-        status = "Payée" if inv.get("status") == "PAID" else "En attente"
+    for inv in map(MaintenanceInvoice, data.get("invoices") or ()):
+        payable = bool(inv.payment_url) and not inv.paid
         result.append({
-            "id": inv.get("id"),
+            "id": inv.id,
             "type": "facture",
-            "label": f"Facture Maintenance – {inv.get('reference', contract.get('contract_number', ''))}",
-            "date": inv.get("created_at", inv.get("due_date", ""))[:10] if inv.get("created_at") or inv.get("due_date") else "",
-            "status": status,
-            "url": f"/api/v1/maintenance/invoice-pdf/{inv.get('id')}",
+            "label": f"Facture Maintenance – {inv.reference or contract.get('contract_number', '')}",
+            "date": (inv.created_at or inv.due_date)[:10],
+            "status": "Payée" if inv.paid else "En attente",
+            "url": f"/api/v1/maintenance/invoice-pdf/{inv.id}",
             "sign_url": None,
-            "pay_url": inv.get("payment_url") if inv.get("status") != "PAID" else None,
-            "actions": ["pay"] if inv.get("payment_url") and inv.get("status") != "PAID" else [],
-            "total_ttc": inv.get("amount"),
+            "pay_url": None if inv.paid else inv.payment_url,
+            "actions": ["pay"] if payable else [],
+            "total_ttc": inv.amount,
             "source": "maintenance",
         })
     return result
@@ -208,7 +378,7 @@ async def fetch_document_html(doc_id: str) -> str | None:
         return None
     url = f"{DF_URL.rstrip('/')}/api/documents/{doc_id}/preview-html"
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=15) as client:
             r = await client.get(url, headers=_headers())
         if r.status_code == 200:
             return r.text
@@ -236,7 +406,7 @@ async def get_maintenance_contract_for_client(email: str) -> dict[str, Any] | No
     
     url = f"{DF_URL.rstrip('/')}/api/client-portal/contract"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=10) as client:
             r = await client.get(
                 url,
                 params={"email": email},
@@ -245,7 +415,7 @@ async def get_maintenance_contract_for_client(email: str) -> dict[str, Any] | No
         if r.status_code != 200:
             log.warning("[df] client-portal/contract → %s : %s", r.status_code, r.text[:100])
             return None
-        data = r.json()
+        data = orjson.loads(r.content)
     except Exception as exc:
         log.error("[df] client-portal/contract erreur : %s", exc)
         return None
@@ -254,7 +424,6 @@ async def get_maintenance_contract_for_client(email: str) -> dict[str, Any] | No
     if not contract:
         return None
 
-    invoices_raw = data.get("invoices") or []
     return {
         "id": contract.get("id", ""),
         "contract_number": contract.get("contract_number", ""),
@@ -267,40 +436,40 @@ async def get_maintenance_contract_for_client(email: str) -> dict[str, Any] | No
         "start_date": contract.get("start_date", ""),
         "invoices": [
             {
-                "id": inv.get("id"),
-                "amount": inv.get("amount"),
-                "status": "PAID" if inv.get("status") == "PAID" else "UNPAID",
-                "due_date": inv.get("due_date", ""),
-                "paid_at": inv.get("created_at", "") if inv.get("status") == "PAID" else "",
-                "pay_url": inv.get("payment_url"),
+                "id": inv.id,
+                "amount": inv.amount,
+                "status": "PAID" if inv.paid else "UNPAID",
+                "due_date": inv.due_date,
+                "paid_at": inv.created_at if inv.paid else "",
+                "pay_url": inv.payment_url,
             }
-            for inv in invoices_raw
+            for inv in map(MaintenanceInvoice, data.get("invoices") or ())
         ],
     }
 
 
 async def _get_maintenance_contract_fallback(email: str) -> dict[str, Any] | None:
     """Fallback: récupère via l'API admin (sans factures)."""
-    data = await _get("/api/contracts", params={"status": "ACTIVE"})
-    if not data:
-        data = await _get("/api/contracts")
-    if not data:
-        return None
-    contracts = data if isinstance(data, list) else data.get("contracts", [])
-    for c in contracts:
-        if (c.get("client_email") or "").lower() == email.lower():
-            return {
-                "id": c.get("id"),
-                "contract_number": c.get("contract_number"),
-                "pack": c.get("pack"),
-                "pack_label": c.get("pack_label"),
-                "billing_cycle": c.get("billing_cycle"),
-                "price": c.get("price"),
-                "status": c.get("status"),
-                "next_billing_date": (c.get("next_billing_date") or "")[:10],
-                "start_date": (c.get("start_date") or "")[:10],
-                "invoices": [],
-            }
+    items = _decode(await _get_raw("/api/contracts", params={"status": "ACTIVE"}), "contracts")
+    if not items:
+        items = _decode(await _get_raw("/api/contracts"), "contracts")
+    email = email.lower()
+    for item in items:
+        if (item.get("client_email") or "").lower() != email:
+            continue
+        c = DfContract(item)
+        return {
+            "id": c.id,
+            "contract_number": c.contract_number,
+            "pack": c.pack,
+            "pack_label": c.pack_label,
+            "billing_cycle": c.billing_cycle,
+            "price": c.price,
+            "status": c.status,
+            "next_billing_date": c.next_billing_date,
+            "start_date": c.start_date,
+            "invoices": [],
+        }
     return None
 
 
@@ -327,7 +496,7 @@ async def get_contract_pdf_bytes(contract_id: str, email: str) -> bytes | None:
         return None
     url = f"{DF_URL.rstrip('/')}/api/contracts/{contract_id}/pdf"
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
+        async with bulkhead.df_pdf.slot(), httpx.AsyncClient(timeout=30) as client:
             r = await client.get(url, headers=_headers(), params={"email": email})
         if r.status_code == 200:
             return r.content
@@ -344,7 +513,7 @@ async def get_invoice_pdf_bytes(invoice_id: str, email: str) -> bytes | None:
         return None
     url = f"{DF_URL.rstrip('/')}/api/client-portal/invoice-pdf/{invoice_id}"
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
+        async with bulkhead.df_pdf.slot(), httpx.AsyncClient(timeout=30) as client:
             r = await client.get(
                 url,
                 params={"email": email},
@@ -362,15 +531,18 @@ async def get_invoice_pdf_bytes(invoice_id: str, email: str) -> bytes | None:
 async def request_contract_cancellation(contract_id: str, email: str, reason: str) -> bool:
     """Demande de résiliation via l'API client-portal de DF."""
     result = await _post(f"/api/client-portal/contracts/{contract_id}/cancel", {"email": email, "reason": reason})
+    get_all_contracts_for_client.cache.invalidate((email,))
     return result is not None and result.get("ok", False)
 
 
 async def request_contract_upgrade(contract_id: str, email: str, new_pack: str) -> bool:
     """Demande de changement d'abonnement via l'API client-portal de DF."""
     result = await _post(f"/api/client-portal/contracts/{contract_id}/upgrade", {"email": email, "new_pack": new_pack})
+    get_all_contracts_for_client.cache.invalidate((email,))
     return result is not None and result.get("ok", False)
 
 
+@cached
 async def get_all_contracts_for_client(email: str) -> list[dict[str, Any]]:
     """Récupère tous les contrats de maintenance d'un client depuis DF via l'API client-portal."""
     if not DF_CLIENT_PORTAL_API_KEY:
@@ -379,7 +551,7 @@ async def get_all_contracts_for_client(email: str) -> list[dict[str, Any]]:
     
     url = f"{DF_URL.rstrip('/')}/api/client-portal/contracts"
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=15) as client:
             r = await client.get(
                 url,
                 params={"email": email},
@@ -388,7 +560,7 @@ async def get_all_contracts_for_client(email: str) -> list[dict[str, Any]]:
         if r.status_code != 200:
             log.warning("[df] client-portal/contracts → %s : %s", r.status_code, r.text[:100])
             return []
-        data = r.json()
+        data = orjson.loads(r.content)
     except Exception as exc:
         log.error("[df] client-portal/contracts erreur : %s", exc)
         return []
@@ -419,7 +591,7 @@ async def create_contract_for_client(
         "property_label": property_label,
     }
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with bulkhead.df.slot(), httpx.AsyncClient(timeout=15) as client:
             r = await client.post(
                 url,
                 params={"email": email},
@@ -428,6 +600,7 @@ async def create_contract_for_client(
             )
         if r.status_code in (200, 201):
             data = r.json()
+            get_all_contracts_for_client.cache.invalidate((email,))
             return {"ok": True, "contract": data.get("contract")}
         elif r.status_code == 409:
             data = r.json()
@@ -0,0 +1,30 @@
+"""
+Erreurs amont remontées à l'appelant qui le demande.
+
+Les connecteurs renvoient une valeur vide en cas d'erreur (l'écran reste
+utilisable). Un appelant qui ne doit pas prendre ce vide pour « aucune donnée »
+(export) ouvre `with collect() as failures:` : chaque erreur amont survenue dans
+ce contexte, tâches filles comprises, y est ajoutée (source, détail).
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+_failures: ContextVar[list[tuple[str, str]] | None] = ContextVar("upstream_failures", default=None)
+
+
+@contextmanager
+def collect() -> Iterator[list[tuple[str, str]]]:
+    failures: list[tuple[str, str]] = []
+    token = _failures.set(failures)
+    try:
+        yield failures
+    finally:
+        _failures.reset(token)
+
+
+def report(source: str, detail: str) -> None:
+    failures = _failures.get()
+    if failures is not None:
+        failures.append((source, detail))
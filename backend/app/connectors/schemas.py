@@ -0,0 +1,124 @@
+"""
+Schémas typés des réponses compta / DF.
+
+Le JSON est décodé directement depuis les octets de la réponse (orjson) : c'est
+ce décodage qui fait le gain mesuré. Les classes à `__slots__` ne l'accélèrent
+pas (un objet de plus par élément, lu depuis le dict déjà décodé) ; elles
+regroupent la résolution des champs alternatifs (`id`/`_id`,
+`title`/`label`/`name`…) en un seul endroit.
+"""
+from __future__ import annotations
+from typing import Any, Iterable
+
+import orjson
+
+
+def decode_items(content: bytes, *keys: str) -> list[dict]:
+    """Liste d'objets d'une réponse : tableau JSON, ou premier champ de `keys` présent."""
+    data = orjson.loads(content)
+    if isinstance(data, dict):
+        data = next((data[k] for k in keys if k in data), [])
+    return [d for d in data if isinstance(d, dict)] if isinstance(data, list) else []
+
+
+def _id(d: dict) -> str:
+    return str(d.get("id") or d.get("_id") or "")
+
+
+# ── DF ───────────────────────────────────────────────────────────────────────
+
+class DfClient:
+    __slots__ = ("id", "email")
+
+    def __init__(self, d: dict) -> None:
+        self.id = d.get("id")
+        self.email = (d.get("email") or "").lower()
+
+
+class DfDocument:
+    __slots__ = (
+        "id", "doc_type", "status", "doc_number", "title", "date", "total_ttc",
+        "public_signing_token", "public_payment_token",
+    )
+
+    def __init__(self, d: dict) -> None:
+        self.id = d.get("id", "")
+        self.doc_type = (d.get("doc_type") or "").upper()
+        self.status = (d.get("status") or "").upper()
+        self.doc_number = d.get("doc_number")
+        self.title = d.get("title")
+        self.date = str(d.get("issue_date") or d.get("created_at", ""))[:10]
+        self.total_ttc = d.get("total_ttc")
+        self.public_signing_token = d.get("public_signing_token")
+        self.public_payment_token = d.get("public_payment_token")
+
+    @property
+    def label(self) -> str:
+        if self.doc_number and self.title:
+            return f"{self.doc_number} – {self.title}"
+        return self.doc_number or self.title or "Document"
+
+
+class MaintenanceInvoice:
+    __slots__ = ("id", "reference", "paid", "amount", "created_at", "due_date", "payment_url")
+
+    def __init__(self, d: dict) -> None:
+        self.id = d.get("id")
+        self.reference = d.get("reference")
+        self.paid = d.get("status") == "PAID"
+        self.amount = d.get("amount")
+        self.created_at = d.get("created_at") or ""
+        self.due_date = d.get("due_date") or ""
+        self.payment_url = d.get("payment_url")
+
+
+class DfContract:
+    __slots__ = (
+        "id", "contract_number", "pack", "pack_label", "billing_cycle", "price",
+        "status", "next_billing_date", "start_date", "client_email",
+    )
+
+    def __init__(self, d: dict) -> None:
+        self.id = d.get("id")
+        self.contract_number = d.get("contract_number")
+        self.pack = d.get("pack")
+        self.pack_label = d.get("pack_label")
+        self.billing_cycle = d.get("billing_cycle")
+        self.price = d.get("price")
+        self.status = d.get("status")
+        self.next_billing_date = (d.get("next_billing_date") or "")[:10]
+        self.start_date = (d.get("start_date") or "")[:10]
+        self.client_email = (d.get("client_email") or "").lower()
+
+
+# ── Compta ───────────────────────────────────────────────────────────────────
+
+class ComptaSite:
+    __slots__ = ("id", "label", "status", "address")
+
+    def __init__(self, d: dict, default_id: str = "") -> None:
+        self.id = _id(d) or default_id
+        self.label = d.get("name") or d.get("label", "")
+        self.status = d.get("status", "")
+        self.address = d.get("address") or d.get("location", "")
+
+
+class ComptaDocument:
+    __slots__ = ("id", "type", "label", "date", "url")
+
+    def __init__(self, d: dict) -> None:
+        self.id = _id(d)
+        self.type = d.get("type") or d.get("category", "")
+        self.label = d.get("title") or d.get("label") or d.get("name", "Document")
+        self.date = d.get("date") or d.get("created_at", "")
+        self.url = d.get("url") or d.get("download_url", "")
+
+
+def entry_photos(entries: Iterable[dict]) -> tuple[list[Any], list[Any]]:
+    """Photos (avant, après) des entrées de chantier compta."""
+    avant, apres = [], []
+    for e in entries:
+        for ph in e.get("photos", ()):
+            url = ph.get("url") or ph.get("path", "")
+            (avant if ph.get("type") == "avant" else apres).append(url)
+    return avant, apres
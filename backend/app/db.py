@@ -1,13 +1,75 @@
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.config import MONGO_URI, MONGO_DB
+from pymongo import ASCENDING, DESCENDING, TEXT
+from app.config import (
+    MONGO_URI,
+    MONGO_DB,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MONITORING,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    PROFILE_RETENTION_HOURS,
+)
+from app.services.db_monitor import listeners
+
+log = logging.getLogger(__name__)
+
+# Index texte de la recherche SAV (langue française : racinisation, mots vides)
+TICKETS_TEXT_OPTS = {
+    "name": "tickets_text",
+    "default_language": "french",
+    "language_override": "_search_language",
+    "weights": {"subject": 3, "description": 1},
+}
+MESSAGES_TEXT_OPTS = {
+    "name": "ticket_messages_text",
+    "default_language": "french",
+    "language_override": "_search_language",
+}
 
 client: AsyncIOMotorClient | None = None
 
 def get_client() -> AsyncIOMotorClient:
     global client
     if client is None:
-        client = AsyncIOMotorClient(MONGO_URI)
+        client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=listeners() if MONGO_MONITORING else [],
+        )
     return client
 
 def get_db():
     return get_client()[MONGO_DB]
+
+async def ensure_indexes() -> None:
+    """Index des collections du portail. Erreurs loguées, non bloquantes."""
+    db = get_db()
+    specs = [
+        (db.client_users, [("email", ASCENDING)], {"unique": True}),
+        (db.magic_tokens, [("token", ASCENDING)], {"unique": True}),
+        (db.email_outbox, [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+        (db.email_outbox, [("sent_at", ASCENDING)], {"expireAfterSeconds": 30 * 86400}),
+        (db.email_outbox, [("lease", ASCENDING)], {}),
+        (db.tickets_sav, [("attachment_paths", ASCENDING)], {}),
+        (db.tickets_sav, [("client_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        (db.tickets_sav, [("client_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        (db.attachment_blobs, [("last_ref_at", ASCENDING)], {}),
+        (db.ticket_messages, [("ticket_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        (db.tickets_sav, [("client_id", ASCENDING), ("subject", TEXT), ("description", TEXT)], TICKETS_TEXT_OPTS),
+        (db.ticket_messages, [("client_id", ASCENDING), ("body", TEXT)], MESSAGES_TEXT_OPTS),
+        (db.request_profiles, [("created_at", ASCENDING)], {"expireAfterSeconds": PROFILE_RETENTION_HOURS * 3600}),
+    ]
+    for coll, keys, opts in specs:
+        try:
+            await coll.create_index(keys, **opts)
+        except Exception as exc:
+            log.error("[db] index %s %s : %s", coll.name, keys, exc)
@@ -1,18 +1,33 @@
 """Dépendances communes (auth)."""
 from fastapi import Request, HTTPException, Depends
+from app.config import ADMIN_EMAILS
 from app.services.auth_service import decode_token
 from app.db import get_db
 from bson import ObjectId
 
+def _user_id_from_token(token: str, kind: str = "access") -> str:
+    payload = decode_token(token)
+    if not payload or payload.get("type") != kind:
+        raise HTTPException(status_code=401, detail="Token invalide")
+    return payload["sub"]
+
 async def get_current_user_id(request: Request) -> str:
     auth = request.headers.get("Authorization")
     if not auth or not auth.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Non authentifié")
-    token = auth.split(" ", 1)[1]
-    payload = decode_token(token)
-    if not payload or payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Token invalide")
-    return payload["sub"]
+    return _user_id_from_token(auth.split(" ", 1)[1])
+
+async def get_stream_user_id(request: Request) -> str:
+    """Utilisateur du flux SSE, depuis ?token= (EventSource n'envoie pas d'en-têtes).
+
+    Seul un jeton `stream` (POST /tickets/stream-token, quelques dizaines de
+    secondes) est accepté : l'URL finit dans les journaux du proxy et l'historique,
+    le jeton d'accès n'y figure jamais.
+    """
+    token = request.query_params.get("token")
+    if not token:
+        raise HTTPException(status_code=401, detail="Non authentifié")
+    return _user_id_from_token(token, "stream")
 
 async def get_current_user(request: Request) -> dict:
     """Retourne l'utilisateur complet (id + email) depuis le JWT."""
@@ -22,3 +37,9 @@ async def get_current_user(request: Request) -> dict:
     if not user:
         raise HTTPException(status_code=401, detail="Utilisateur introuvable")
     return {"id": user_id, "email": user["email"], "name": user.get("name")}
+
+async def get_admin_user(user: dict = Depends(get_current_user)) -> dict:
+    """Utilisateur courant, s'il figure dans ADMIN_EMAILS."""
+    if user["email"].lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
+    return user
@@ -1,12 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import CORS_ORIGINS, UPLOAD_DIR
-from app.routes import auth, me, chantiers, documents, tickets, maintenance
+from app.db import ensure_indexes
+from app.middleware import BodyLimitMiddleware, CompressionMiddleware, ConditionalGetMiddleware, ProfilingMiddleware
+from app.responses import JSONResponse
+from app.routes import auth, me, chantiers, documents, tickets, maintenance, internal, export, dashboard
+from app.services import email_outbox, loop_monitor, prefetch
+from app.services.ticket_events import hub as ticket_events
 from app.services.file_service import ensure_upload_dir
 from pathlib import Path
 
-app = FastAPI(title="Client Portal RenoviaPro", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    await ensure_indexes()
+    email_outbox.start_workers()
+    yield
+    await ticket_events.stop()
+    await prefetch.stop()
+    await email_outbox.stop_workers()
+    await loop_monitor.stop()
 
+app = FastAPI(
+    title="Client Portal RenoviaPro",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=JSONResponse,
+)
+
+# Ordre (intérieur → extérieur) : profilage au plus près des routes, ETag sur le corps
+# brut, puis compression, limite des envois, puis CORS, qui reste la couche externe et
+# s'applique aussi aux 304 et 413.
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(BodyLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
@@ -19,10 +48,13 @@ Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
 app.include_router(auth.router)
 app.include_router(me.router)
+app.include_router(dashboard.router)
 app.include_router(chantiers.router)
 app.include_router(documents.router)
 app.include_router(tickets.router)
 app.include_router(maintenance.router)
+app.include_router(internal.router)
+app.include_router(export.router)
 
 @app.get("/")
 async def root():
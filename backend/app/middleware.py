@@ -0,0 +1,345 @@
+"""
+Middlewares ASGI de l'API : GET conditionnels (ETag / 304), compression,
+taille maximale des envois de fichiers et profilage à la demande.
+
+GET conditionnels sur les listes JSON interrogées en boucle par le SPA.
+
+Middleware ASGI pur (pas BaseHTTPMiddleware, qui casserait les flux SSE/ZIP) :
+seules les réponses 200 JSON des chemins de `CONDITIONAL_PATHS` sont mises en
+tampon. L'ETag fort est un BLAKE2b du corps sérialisé (sérialisation
+déterministe : même données → mêmes octets) ; si la route a déjà posé un ETag
+(horodatage de version de la source), il est conservé. Réponses privées à
+l'utilisateur : `Cache-Control: private, no-cache` et `Vary: Authorization`.
+"""
+import asyncio
+import time
+import zlib
+from hashlib import blake2b
+
+import brotli
+from fastapi import HTTPException
+
+from app.config import (
+    COMPRESS_MIN_BYTES,
+    MAX_FILE_SIZE_MB,
+    MAX_TICKET_FILES,
+    PROFILING_ENABLED,
+    RATE_LIMIT_PROFILE_PER_HOUR,
+)
+from app.responses import JSONResponse
+from app.services import metrics, profiler
+from app.services.rate_limit import is_allowed
+
+CONDITIONAL_PATHS = {
+    "/api/v1/me",
+    "/api/v1/dashboard",
+    "/api/v1/chantiers",
+    "/api/v1/documents",
+    "/api/v1/tickets",
+    "/api/v1/maintenance/contracts",
+}
+
+_CACHE_CONTROL = b"private, no-cache"
+
+
+def _etag(body: bytes) -> bytes:
+    return b'"' + blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """Comparaison faible (RFC 9110 §13.1.2) : W/"x" correspond à "x"."""
+    if if_none_match.strip() == b"*":
+        return True
+    return any(tag.strip().removeprefix(b"W/") == etag for tag in if_none_match.split(b","))
+
+
+def _with_vary(headers: list[tuple[bytes, bytes]]) -> list[tuple[bytes, bytes]]:
+    out, vary = [], [b"Authorization"]
+    for k, v in headers:
+        if k.lower() == b"vary":
+            vary.extend(p.strip() for p in v.split(b",") if p.strip().lower() != b"authorization")
+        elif k.lower() != b"cache-control":
+            out.append((k, v))
+    out.append((b"vary", b", ".join(vary)))
+    out.append((b"cache-control", _CACHE_CONTROL))
+    return out
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app, paths: set[str] = CONDITIONAL_PATHS) -> None:
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        if_none_match = next((v for k, v in scope["headers"] if k == b"if-none-match"), None)
+        start: dict | None = None
+        chunks: list[bytes] = []
+        passthrough = False
+
+        async def buffered_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                content_type = next((v for k, v in message["headers"] if k.lower() == b"content-type"), b"")
+                if message["status"] != 200 or not content_type.startswith(b"application/json"):
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if passthrough:
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            body = b"".join(chunks)
+            headers = _with_vary(start["headers"])
+            etag = next((v for k, v in headers if k.lower() == b"etag"), None)
+            if etag is None:
+                etag = _etag(body)
+                headers.append((b"etag", etag))
+            if if_none_match and etag_matches(if_none_match, etag):
+                headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+                metrics.incr("etag_not_modified", path=scope["path"])
+                metrics.incr("etag_bytes_saved", len(body), path=scope["path"])
+                await send({"type": "http.response.start", "status": 304, "headers": headers})
+                return await send({"type": "http.response.body", "body": b""})
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered_send)
+
+
+# ── Compression ─────────────────────────────────────────────────────────────
+
+_COMPRESSIBLE = (b"application/json", b"application/x-ndjson", b"text/", b"image/svg+xml")
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 4  # qualité « dynamique » : proche de gzip -6 en CPU, ~15 % plus petit
+_OFFLOAD_BYTES = 256 * 1024  # au-delà, compression dans un thread pour ne pas bloquer la boucle
+
+
+def negotiate(accept_encoding: bytes) -> str | None:
+    """br si accepté, sinon gzip, sinon None (valeurs q=0 respectées)."""
+    accepted = {}
+    for part in accept_encoding.decode("latin-1").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for coding in ("br", "gzip"):
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+class _Encoder:
+    def __init__(self, coding: str) -> None:
+        self.coding = coding
+        if coding == "br":
+            self._c = brotli.Compressor(quality=_BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compresse et vide le tampon : le client reçoit chaque morceau sans attendre la fin."""
+        if self.coding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.coding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush()
+
+
+def _suffix_etag(etag: bytes, coding: str) -> bytes:
+    # Un ETag fort désigne une représentation : la version compressée a le sien.
+    return etag[:-1] + b"-" + coding.encode() + b'"' if etag.endswith(b'"') else etag
+
+
+class CompressionMiddleware:
+    """gzip / brotli pour les réponses textuelles au-delà de COMPRESS_MIN_BYTES, flux compris (hors SSE)."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        coding = negotiate(headers.get(b"accept-encoding", b""))
+
+        # If-None-Match porte nos ETags suffixés (-br / -gzip) : on les ramène à l'ETag de base
+        # pour le middleware ETag, et on garde l'original pour le renvoyer sur un 304.
+        sent_tags: dict[bytes, bytes] = {}
+        if b"if-none-match" in headers:
+            tags = []
+            for tag in headers[b"if-none-match"].split(b","):
+                tag = tag.strip()
+                base = tag
+                for c in (b"-br", b"-gzip"):
+                    if tag.endswith(c + b'"'):
+                        base = tag[: -len(c) - 1] + b'"'
+                sent_tags[base.removeprefix(b"W/")] = tag
+                tags.append(base)
+            scope = {**scope, "headers": [(k, v) for k, v in scope["headers"] if k != b"if-none-match"]
+                     + [(b"if-none-match", b", ".join(tags))]}
+
+        start: dict | None = None
+        encoder: _Encoder | None = None
+        passthrough = False
+
+        async def compressed_send(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                hdrs = message["headers"]
+                if message["status"] == 304:
+                    hdrs = [(k, sent_tags.get(v, v) if k.lower() == b"etag" else v) for k, v in hdrs]
+                    return await send({**message, "headers": _add_vary(hdrs, b"Accept-Encoding")})
+                content_type = next((v for k, v in hdrs if k.lower() == b"content-type"), b"")
+                if (
+                    not content_type.startswith(_COMPRESSIBLE)
+                    or content_type.startswith(b"text/event-stream")
+                    or any(k.lower() == b"content-encoding" for k, _ in hdrs)
+                ):
+                    passthrough = True
+                    return await send(message)
+                start = {**message, "headers": _add_vary(hdrs, b"Accept-Encoding")}
+                return
+            if passthrough:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if encoder is None:
+                if coding is None or (not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                encoder = _Encoder(coding)
+                hdrs = [
+                    (k, _suffix_etag(v, coding) if k.lower() == b"etag" else v)
+                    for k, v in start["headers"] if k.lower() != b"content-length"
+                ]
+                hdrs.append((b"content-encoding", coding.encode()))
+                if not more:
+                    if len(body) > _OFFLOAD_BYTES:
+                        data = await asyncio.to_thread(encoder.finish, body)
+                    else:
+                        data = encoder.finish(body)
+                    metrics.incr("compression_bytes_in", len(body), coding=coding)
+                    metrics.incr("compression_bytes_out", len(data), coding=coding)
+                    hdrs.append((b"content-length", str(len(data)).encode()))
+                    await send({**start, "headers": hdrs})
+                    return await send({"type": "http.response.body", "body": data})
+                await send({**start, "headers": hdrs})
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, compressed_send)
+
+
+def _add_vary(headers: list[tuple[bytes, bytes]], field: bytes) -> list[tuple[bytes, bytes]]:
+    for i, (k, v) in enumerate(headers):
+        if k.lower() == b"vary":
+            if field.lower() not in v.lower():
+                headers = list(headers)
+                headers[i] = (k, v + b", " + field)
+            return headers
+    return [*headers, (b"vary", field)]
+
+
+# ── Taille des envois ───────────────────────────────────────────────────────
+
+# Corps multipart : toutes les pièces jointes au maximum, plus champs et délimiteurs
+UPLOAD_PATHS = {"/api/v1/tickets": MAX_TICKET_FILES * MAX_FILE_SIZE_MB * 1024 * 1024 + 1024 * 1024}
+
+
+class BodyLimitMiddleware:
+    """Refuse (413) un envoi trop gros avant que Starlette ne le reçoive et le copie sur disque.
+
+    Le formulaire multipart est lu en entier avant la route : la limite par fichier
+    de `save_ticket_file` arrive trop tard pour protéger le réseau et le disque.
+    `Content-Length` trop grand → 413 sans lire le corps ; sans `Content-Length`
+    (chunked), les octets reçus sont comptés et la lecture s'arrête au seuil.
+    """
+
+    def __init__(self, app, limits: dict[str, int] = UPLOAD_PATHS) -> None:
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        detail = f"Envoi trop volumineux (max {limit // (1024 * 1024)} Mo)."
+        length = next((v for k, v in scope["headers"] if k == b"content-length"), None)
+        if length is not None and length.isdigit() and int(length) > limit:
+            metrics.incr("upload_rejected", reason="content_length")
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    metrics.incr("upload_rejected", reason="stream")
+                    # Relancée telle quelle par FastAPI pendant la lecture du formulaire → 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# ── Profilage ───────────────────────────────────────────────────────────────
+
+class ProfilingMiddleware:
+    """`X-Profile: 1` d'un administrateur → requête échantillonnée, rapport sous `X-Profile-Id`."""
+
+    def __init__(self, app, enabled: bool = PROFILING_ENABLED) -> None:
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") != b"1":
+            return await self.app(scope, receive, send)
+        # Limite avant la lecture en base : un X-Profile répété ne coûte pas une requête Mongo
+        user_id = profiler.token_user_id(headers.get(b"authorization", b"").decode("latin-1"))
+        if not user_id or not is_allowed(f"profile:{user_id}", 3600, RATE_LIMIT_PROFILE_PER_HOUR):
+            return await self.app(scope, receive, send)
+        email = await profiler.admin_email(user_id)
+        if not email:
+            return await self.app(scope, receive, send)
+
+        profile_id = profiler.new_id()
+        status: int | None = None
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message["headers"], (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        sampler = profiler.StackSampler()
+        t0 = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.perf_counter() - t0
+            await sampler.stop()
+            metrics.incr("profiled_requests", path=scope["path"])
+            await profiler.save(profile_id, scope, email, duration, status, sampler)
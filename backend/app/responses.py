@@ -0,0 +1,34 @@
+"""
+Réponse JSON par défaut de l'API, sérialisée avec orjson.
+
+Les routes qui renvoient de grosses listes construisent directement
+`JSONResponse(...)` : FastAPI ne repasse alors pas le contenu dans
+`jsonable_encoder`, qui coûte plus cher que l'encodage lui-même.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+
+
+def _default(value):
+    if isinstance(value, (ObjectId, Decimal)):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class JSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
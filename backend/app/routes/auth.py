@@ -1,7 +1,9 @@
 """Magic link + verify + JWT + refresh + login mot de passe + définir mot de passe."""
+import asyncio
 from datetime import datetime
 from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel, EmailStr, Field
+from pymongo import ReturnDocument
 from app.db import get_db
 from app.config import (
     RATE_LIMIT_MAGIC_LINK_PER_HOUR,
@@ -18,7 +20,8 @@ from app.services.auth_service import (
     verify_password,
 )
 from app.services.rate_limit import is_allowed
-from app.services.email_service import send_magic_link_email, send_reset_password_email, send_welcome_email
+from app.services.email_outbox import enqueue_email
+from app.services import prefetch
 
 router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
 
@@ -43,6 +46,27 @@ class ResetPasswordRequest(BaseModel):
     token: str
     password: str = Field(..., min_length=8)
 
+def _new_user_fields() -> dict:
+    return {"name": None, "linked_client_id": None, "created_at": datetime.utcnow()}
+
+async def _consume_token(db, query: dict) -> dict:
+    """Marque le token utilisé en une seule opération atomique (pas de double usage concurrent)."""
+    now = datetime.utcnow()
+    row = await db.magic_tokens.find_one_and_update(
+        {**query, "used_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"used_at": now}},
+        projection={"email": 1, "_id": 0},
+    )
+    if row:
+        return row
+    # Chemin d'échec uniquement : relire pour un message d'erreur précis.
+    row = await db.magic_tokens.find_one(query, {"used_at": 1, "_id": 0})
+    if not row:
+        raise HTTPException(status_code=400, detail="Lien invalide ou expiré.")
+    if row.get("used_at"):
+        raise HTTPException(status_code=400, detail="Lien déjà utilisé.")
+    raise HTTPException(status_code=400, detail="Lien expiré.")
+
 @router.post("/magic-link")
 async def post_magic_link(req: MagicLinkRequest, request: Request):
     ip = request.client.host if request.client else "unknown"
@@ -51,15 +75,13 @@ async def post_magic_link(req: MagicLinkRequest, request: Request):
         raise HTTPException(status_code=429, detail="Trop de demandes. Réessayez plus tard.")
     email = req.email.strip().lower()
     db = get_db()
-    user = await db.client_users.find_one({"email": email})
-    is_new = not user
-    if is_new:
-        await db.client_users.insert_one({
-            "email": email,
-            "name": None,
-            "linked_client_id": None,
-            "created_at": datetime.utcnow(),
-        })
+    previous = await db.client_users.find_one_and_update(
+        {"email": email},
+        {"$setOnInsert": _new_user_fields()},
+        upsert=True,
+        projection={"_id": 1},
+    )
+    is_new = previous is None
     token = create_magic_token()
     await db.magic_tokens.insert_one({
         "token": token,
@@ -71,9 +93,9 @@ async def post_magic_link(req: MagicLinkRequest, request: Request):
     })
     link = magic_link_url(token)
     if is_new:
-        send_welcome_email(email, link)
+        await enqueue_email(email, "welcome", {"to": email, "link": link})
     else:
-        send_magic_link_email(email, link)
+        await enqueue_email(email, "magic_link", {"link": link})
     return {"ok": True, "message": "Si ce compte existe, un lien a été envoyé par email."}
 
 @router.post("/verify")
@@ -86,23 +108,19 @@ async def verify_token(request: Request):
     if not is_allowed(key, 3600, RATE_LIMIT_VERIFY_PER_HOUR):
         raise HTTPException(status_code=429, detail="Trop de demandes.")
     db = get_db()
-    row = await db.magic_tokens.find_one({"token": token})
-    if not row:
-        raise HTTPException(status_code=400, detail="Lien invalide ou expiré.")
-    if row.get("used_at"):
-        raise HTTPException(status_code=400, detail="Lien déjà utilisé.")
-    if datetime.utcnow() > row["expires_at"]:
-        raise HTTPException(status_code=400, detail="Lien expiré.")
-    email = row["email"]
-    await db.magic_tokens.update_one({"token": token}, {"$set": {"used_at": datetime.utcnow()}})
-    user = await db.client_users.find_one({"email": email})
-    user_id = str(user["_id"]) if user else None
-    if not user_id:
-        user_doc = await db.client_users.find_one({"email": email})
-        user_id = str(user_doc["_id"])
-    is_new = not user or not user.get("name")
+    row = await _consume_token(db, {"token": token})
+    user = await db.client_users.find_one_and_update(
+        {"email": row["email"]},
+        {"$setOnInsert": _new_user_fields()},
+        upsert=True,
+        projection={"name": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    user_id = str(user["_id"])
+    is_new = not user.get("name")
     access = create_access_token(user_id)
     refresh = create_refresh_token(user_id)
+    prefetch.schedule(row["email"])
     return {"access_token": access, "refresh_token": refresh, "token_type": "bearer", "is_new_user": is_new}
 
 @router.post("/refresh")
@@ -131,11 +149,13 @@ async def login_password(body: LoginRequest, request: Request):
     ph = user.get("password_hash")
     if not ph:
         raise HTTPException(status_code=400, detail="Ce compte n'a pas de mot de passe. Utilisez le lien magique ou créez un mot de passe.")
-    if not verify_password(body.password, ph):
+    # bcrypt : ~250 ms de CPU, hors de la boucle
+    if not await asyncio.to_thread(verify_password, body.password, ph):
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect.")
     user_id = str(user["_id"])
     access = create_access_token(user_id)
     refresh = create_refresh_token(user_id)
+    prefetch.schedule(email)
     return {"access_token": access, "refresh_token": refresh, "token_type": "bearer"}
 
 @router.post("/set-password")
@@ -146,21 +166,13 @@ async def set_password(body: SetPasswordRequest, request: Request):
         raise HTTPException(status_code=429, detail="Trop de demandes. Réessayez plus tard.")
     email = body.email.strip().lower()
     db = get_db()
-    user = await db.client_users.find_one({"email": email})
-    if not user:
-        await db.client_users.insert_one({
-            "email": email,
-            "name": None,
-            "linked_client_id": None,
-            "password_hash": hash_password(body.password),
-            "created_at": datetime.utcnow(),
-        })
-        user = await db.client_users.find_one({"email": email})
-    else:
-        await db.client_users.update_one(
-            {"email": email},
-            {"$set": {"password_hash": hash_password(body.password)}},
-        )
+    user = await db.client_users.find_one_and_update(
+        {"email": email},
+        {"$set": {"password_hash": await asyncio.to_thread(hash_password, body.password)}, "$setOnInsert": _new_user_fields()},
+        upsert=True,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
     user_id = str(user["_id"])
     access = create_access_token(user_id)
     refresh = create_refresh_token(user_id)
@@ -182,22 +194,19 @@ async def forgot_password(body: ForgotPasswordRequest, request: Request):
             "expires_at": magic_link_expires_at(), "used_at": None, "ip": ip,
         })
         reset_link = f"{BASE_URL_CLIENT.rstrip('/')}/reset-password?token={token}"
-        send_reset_password_email(email, reset_link)
+        await enqueue_email(email, "reset_password", {"link": reset_link})
     return {"ok": True, "message": "Si ce compte existe, un email a été envoyé."}
 
 @router.post("/reset-password")
 async def reset_password_route(body: ResetPasswordRequest, request: Request):
     db = get_db()
-    row = await db.magic_tokens.find_one({"token": body.token, "type": "reset"})
-    if not row or row.get("used_at"):
-        raise HTTPException(status_code=400, detail="Lien invalide ou déjà utilisé.")
-    if datetime.utcnow() > row["expires_at"]:
-        raise HTTPException(status_code=400, detail="Lien expiré.")
-    email = row["email"]
-    await db.magic_tokens.update_one({"token": body.token}, {"$set": {"used_at": datetime.utcnow()}})
-    await db.client_users.update_one(
-        {"email": email}, {"$set": {"password_hash": hash_password(body.password)}}, upsert=True,
+    row = await _consume_token(db, {"token": body.token, "type": "reset"})
+    user = await db.client_users.find_one_and_update(
+        {"email": row["email"]},
+        {"$set": {"password_hash": await asyncio.to_thread(hash_password, body.password)}, "$setOnInsert": _new_user_fields()},
+        upsert=True,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    user = await db.client_users.find_one({"email": email})
     uid = str(user["_id"])
     return {"access_token": create_access_token(uid), "refresh_token": create_refresh_token(uid), "token_type": "bearer"}
@@ -0,0 +1,157 @@
+"""
+Tableau de bord : une seule requête pour la page d'accueil.
+
+L'utilisateur est résolu une fois, toutes les sources partent en parallèle et
+chaque section attend seulement celles dont elle a besoin, avec son propre délai.
+Les tâches ne sont jamais annulées par le délai d'une section ; une section
+trop lente ou en erreur est marquée `timeout`/`error` sans bloquer les autres.
+
+Documents et actions passent par la liste paginée (`document_list`) sans liens
+signature / paiement : une page par source et aucun POST vers DF à l'affichage
+de l'accueil. Les actions « répondre » viennent de leur propre requête Mongo
+(tous les tickets concernés, pas seulement les derniers). Le compte de documents
+est celui de la première page (`more` si elle n'est pas la dernière).
+"""
+import asyncio
+import logging
+import time
+
+from fastapi import APIRouter, Depends
+
+from app.connectors.compta_connector import get_chantiers_for_client
+from app.connectors.df_connector import get_all_contracts_for_client
+from app.db import get_db
+from app.deps import get_current_user
+from app.responses import JSONResponse
+from app.models.ticket import STATUS_CLOSED, STATUS_NEW, STATUS_WAITING_CUSTOMER
+from app.services import metrics
+from app.services.document_list import PAGE_DEFAULT, PAGE_MAX, list_documents
+
+log = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1", tags=["dashboard"])
+
+LATEST = 3
+# Statuts affichés des documents DF qui attendent une signature ou un paiement
+_PENDING_STATUSES = ("Envoyé", "Partiel", "Virement en attente")
+
+# Délai par section (secondes) : Mongo local vs appels compta/DF
+_TIMEOUTS = {"tickets": 2.0, "chantiers": 4.0, "documents": 6.0, "actions": 6.0, "maintenance": 5.0}
+
+
+async def _ticket_summary(client_id: str) -> dict:
+    db = get_db()
+    counts, latest = await asyncio.gather(
+        db.tickets_sav.aggregate([
+            {"$match": {"client_id": client_id}},
+            {"$group": {"_id": "$status", "n": {"$sum": 1}, "unread": {"$sum": {"$ifNull": ["$unread_count", 0]}}}},
+        ]).to_list(None),
+        db.tickets_sav.find(
+            {"client_id": client_id, "status": {"$ne": STATUS_CLOSED}},
+            {"subject": 1, "status": 1, "created_at": 1, "unread_count": 1},
+        ).sort([("created_at", -1), ("_id", -1)]).limit(LATEST).to_list(LATEST),
+    )
+    by_status = {c["_id"] or STATUS_NEW: c["n"] for c in counts}
+    return {
+        "total": sum(by_status.values()),
+        "open": sum(n for s, n in by_status.items() if s != STATUS_CLOSED),
+        "waiting_customer": by_status.get(STATUS_WAITING_CUSTOMER, 0),
+        "unread": sum(c["unread"] for c in counts),
+        "latest": [
+            {
+                "id": str(t["_id"]),
+                "subject": t.get("subject"),
+                "status": t.get("status", STATUS_NEW),
+                "created_at": t["created_at"].isoformat() if t.get("created_at") else None,
+                "unread_count": t.get("unread_count", 0),
+            }
+            for t in latest
+        ],
+    }
+
+
+async def _section(name: str, needs: list[asyncio.Task], build) -> dict:
+    """Attend `needs` au plus _TIMEOUTS[name] secondes puis construit la section."""
+    t0 = time.perf_counter()
+    done, pending = await asyncio.wait(needs, timeout=_TIMEOUTS[name])
+    results = [t.result() if t in done and not t.exception() else None for t in needs]
+    failed = [t for t in done if t.exception()]
+    for t in failed:
+        log.error("[dashboard] %s : %s", name, t.exception())
+    if len(failed) + len(pending) == len(needs):
+        status = "timeout" if pending else "error"
+        section = {"status": status}
+    else:
+        section = {"status": "partial" if pending or failed else "ok", **build(*results)}
+    metrics.incr("dashboard_section", section=name, status=section["status"])
+    metrics.observe("dashboard_section_seconds", time.perf_counter() - t0, section=name)
+    return section
+
+
+async def _reply_tickets(client_id: str) -> list[dict]:
+    """Tickets ouverts qui attendent le client ou ont des réponses non lues."""
+    return await get_db().tickets_sav.find(
+        {
+            "client_id": client_id,
+            "status": {"$ne": STATUS_CLOSED},
+            "$or": [{"status": STATUS_WAITING_CUSTOMER}, {"unread_count": {"$gt": 0}}],
+        },
+        {"subject": 1},
+    ).sort([("created_at", -1), ("_id", -1)]).limit(PAGE_MAX).to_list(PAGE_MAX)
+
+
+async def _pending_documents(email: str) -> list[dict]:
+    pages = await asyncio.gather(*(
+        list_documents(email, status=s, sources={"df"}, limit=PAGE_MAX, links=False) for s in _PENDING_STATUSES
+    ))
+    return [d for page in pages for d in page["items"] if d["actions"]]
+
+
+def _documents(page: dict) -> dict:
+    items = page["items"]
+    return {"count": len(items), "more": page["next_cursor"] is not None, "latest": items[:LATEST]}
+
+
+def _actions(docs: list | None, replies: list | None) -> dict:
+    items = []
+    for d in docs or []:
+        if "sign" in d["actions"]:
+            items.append({"kind": "sign", "document_id": d["id"], "label": d.get("label")})
+        if "pay" in d["actions"]:
+            items.append({"kind": "pay", "document_id": d["id"], "label": d.get("label"), "amount": d.get("total_ttc")})
+    for t in replies or []:
+        items.append({"kind": "reply", "ticket_id": str(t["_id"]), "label": t.get("subject")})
+    return {"count": len(items), "items": items}
+
+
+@router.get("/dashboard")
+async def dashboard(user: dict = Depends(get_current_user)):
+    email = user["email"]
+    sources = {
+        "tickets": _ticket_summary(user["id"]),
+        "chantiers": get_chantiers_for_client(email),
+        "documents": list_documents(email, limit=PAGE_DEFAULT, links=False),
+        "pending_docs": _pending_documents(email),
+        "replies": _reply_tickets(user["id"]),
+        "contracts": get_all_contracts_for_client(email),
+    }
+    tasks = {name: asyncio.create_task(coro) for name, coro in sources.items()}
+    try:
+        tickets, chantiers, documents, actions, maintenance = await asyncio.gather(
+            _section("tickets", [tasks["tickets"]], lambda t: t),
+            _section("chantiers", [tasks["chantiers"]], lambda c: {"count": len(c), "latest": c[:LATEST]}),
+            _section("documents", [tasks["documents"]], _documents),
+            _section("actions", [tasks["pending_docs"], tasks["replies"]], _actions),
+            _section("maintenance", [tasks["contracts"]], lambda c: {"count": len(c), "contracts": c}),
+        )
+    finally:
+        for t in tasks.values():
+            t.cancel()
+    return JSONResponse({
+        "user": {"email": email, "name": user.get("name")},
+        "tickets": tickets,
+        "chantiers": chantiers,
+        "documents": documents,
+        "actions": actions,
+        "maintenance": maintenance,
+    })
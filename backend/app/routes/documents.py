@@ -1,20 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import HTMLResponse
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import HTMLResponse, StreamingResponse
 from app.deps import get_current_user
-from app.connectors.compta_connector import get_documents_for_client as compta_docs
-from app.connectors.df_connector import get_documents_for_client as df_docs, fetch_document_html
+from app.responses import JSONResponse
+from app.connectors.df_connector import fetch_document_html, invalidate_client_documents
+from app.services.document_bundle import BUNDLE_TYPES, list_entries, zip_stream
+from app.services.document_list import PAGE_DEFAULT, PAGE_MAX, SOURCES, InvalidCursor, list_documents as document_page
 
 router = APIRouter(prefix="/api/v1", tags=["documents"])
 
 
 @router.get("/documents")
-async def list_documents(user: dict = Depends(get_current_user)):
-    email = user["email"]
-    docs_compta = await compta_docs(email)
-    docs_df = await df_docs(email)
-    all_docs = docs_compta + docs_df
-    all_docs.sort(key=lambda d: d.get("date", ""), reverse=True)
-    return {"items": all_docs}
+async def list_documents(
+    type: str | None = None,
+    status: str | None = None,
+    since: date | None = None,
+    source: list[str] = Query(default=[]),
+    cursor: str | None = None,
+    limit: int = Query(default=PAGE_DEFAULT, ge=1, le=PAGE_MAX),
+    refresh: bool = False,
+    user: dict = Depends(get_current_user),
+):
+    """Documents du plus récent au plus ancien, par pages (`next_cursor` → page suivante).
+
+    `refresh=1` relit DF sans cache (retour de signature / paiement, bouton Actualiser).
+    """
+    sources = set(source)
+    if sources - SOURCES:
+        raise HTTPException(status_code=400, detail="Source invalide (compta, df, maintenance)")
+    if refresh:
+        await invalidate_client_documents(user["email"])
+    try:
+        page = await document_page(
+            user["email"], type, status, since.isoformat() if since else None, sources, cursor, limit,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return JSONResponse(page)
+
+
+@router.get("/documents/bundle.zip")
+async def download_bundle(
+    type: list[str] = Query(default=[]),
+    date_from: date | None = None,
+    date_to: date | None = None,
+    user: dict = Depends(get_current_user),
+):
+    """Archive ZIP des PDF du client (factures, contrats), filtrable par type et par date."""
+    types = set(type)
+    if types - BUNDLE_TYPES:
+        raise HTTPException(status_code=400, detail="Type invalide (facture, contrat)")
+    entries = await list_entries(user["email"], types, date_from, date_to)
+    if not entries:
+        raise HTTPException(status_code=404, detail="Aucun document à télécharger.")
+    filename = f"renovia-documents-{date.today().isoformat()}.zip"
+    return StreamingResponse(
+        zip_stream(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/documents/{doc_id}/view", response_class=HTMLResponse)
@@ -0,0 +1,30 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.config import RATE_LIMIT_EXPORT_PER_HOUR
+from app.db import get_db
+from app.deps import get_current_user
+from app.services.export_service import EXPORT_FORMATS, export_stream
+from app.services.rate_limit import is_allowed
+
+router = APIRouter(prefix="/api/v1", tags=["export"])
+
+
+@router.get("/export")
+async def export_history(
+    format: str = Query("ndjson"),
+    user: dict = Depends(get_current_user),
+):
+    """Historique complet du client (tickets, messages, documents), en flux NDJSON ou CSV."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format invalide (ndjson ou csv)")
+    if not is_allowed(f"export:{user['id']}", 3600, RATE_LIMIT_EXPORT_PER_HOUR):
+        raise HTTPException(status_code=429, detail="Trop d'exports, réessayez plus tard.")
+    filename = f"renovia-historique-{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        export_stream(get_db(), user["id"], user["email"], format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
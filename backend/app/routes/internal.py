@@ -0,0 +1,46 @@
+"""Routes internes (exploitation).
+
+Métriques et diagnostics : protégés par METRICS_TOKEN, désactivés si vide.
+Profils de requêtes (`/profiles`) : JWT d'un administrateur (ADMIN_EMAILS).
+"""
+import secrets
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.config import METRICS_TOKEN
+from app.deps import get_admin_user
+from app.services import profiler
+from app.services.metrics import snapshot
+from app.services.email_outbox import outbox_stats
+from app.services.db_monitor import slow_commands
+from app.services.loop_monitor import blocking_events
+
+router = APIRouter(prefix="/api/v1/internal", tags=["internal"])
+
+def _check_token(request: Request) -> None:
+    token = request.headers.get("X-Metrics-Token", "")
+    if not METRICS_TOKEN or not secrets.compare_digest(token, METRICS_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@router.get("/metrics")
+async def metrics(request: Request):
+    _check_token(request)
+    data = snapshot()
+    data["email_outbox"] = await outbox_stats()
+    data["mongo_slow_commands"] = slow_commands()
+    data["event_loop_blocking"] = blocking_events()
+    return data
+
+@router.get("/profiles")
+async def list_profiles(admin: dict = Depends(get_admin_user)):
+    """Derniers profils de requêtes (administrateurs)."""
+    return {"items": await profiler.recent()}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json", admin: dict = Depends(get_admin_user)):
+    """Rapport d'un profil ; `?format=folded` : piles repliées (flamegraph.pl, speedscope)."""
+    doc = await profiler.load(profile_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Profil introuvable ou expiré.")
+    if format == "folded":
+        return PlainTextResponse("\n".join(doc["folded"]) + "\n")
+    return doc
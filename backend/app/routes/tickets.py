@@ -1,46 +1,214 @@
 """Tickets SAV: création (multipart + photos), liste, détail, messages."""
+import asyncio
+import base64
+import os
+import stat
 from datetime import datetime
-from fastapi import APIRouter, Request, Depends, HTTPException, UploadFile, File, Form
+from pathlib import Path
+from fastapi import APIRouter, Request, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from bson import ObjectId
 from app.db import get_db
-from app.deps import get_current_user_id
+from app.deps import get_current_user_id, get_stream_user_id
+from app.middleware import etag_matches
+from app.responses import JSONResponse, dumps
 from app.models.ticket import (
     STATUS_NEW,
     STATUS_IN_PROGRESS,
     STATUS_WAITING_CUSTOMER,
     STATUS_CLOSED,
 )
-from app.services.file_service import save_ticket_file
-from app.config import RATE_LIMIT_TICKET_CREATE_PER_HOUR, MAX_TICKET_FILES
+from app.services.attachment_store import add_refs
+from app.services.auth_service import create_stream_token
+from app.services.file_service import save_ticket_files
+from app.services import ticket_messages
+from app.services.ticket_events import hub
+from app.services.ticket_search import search_tickets, query_terms, SEARCH_LIMIT
+from app.config import (
+    RATE_LIMIT_TICKET_CREATE_PER_HOUR,
+    MAX_TICKET_FILES,
+    UPLOAD_DIR,
+    ATTACHMENTS_ACCEL_REDIRECT,
+    SSE_HEARTBEAT_SECONDS,
+    SSE_MAX_CONNECTIONS_PER_USER,
+)
 from app.services.rate_limit import is_allowed
 
 router = APIRouter(prefix="/api/v1", tags=["tickets"])
 
+_LIST_STATUSES = {STATUS_NEW, STATUS_IN_PROGRESS, STATUS_WAITING_CUSTOMER, STATUS_CLOSED}
+_LIST_PROJECTION = {
+    "subject": 1, "status": 1, "resolution": 1, "created_at": 1, "last_message": 1, "unread_count": 1,
+    # Présence de messages encore embarqués (back office) : migrés avant réponse
+    "messages": {"$slice": 1}, "messages_migrating": {"$slice": 1},
+}
+
+def _encode_cursor(created_at: datetime, oid: ObjectId) -> str:
+    raw = f"{created_at.isoformat()}|{oid}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, oid = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+def _ticket_oid(ticket_id: str) -> ObjectId:
+    try:
+        return ObjectId(ticket_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Ticket introuvable")
+
+def _last_message(doc: dict) -> dict | None:
+    last = doc.get("last_message")
+    if not last:
+        return None
+    return {**last, "created_at": last["created_at"].isoformat() if last.get("created_at") else None}
+
+async def _load_ticket(db, ticket_id: str, user_id: str, projection: dict | None = None) -> dict:
+    """Ticket du client (404 sinon) ; migre au passage d'éventuels messages encore embarqués."""
+    oid = _ticket_oid(ticket_id)
+    if projection is not None:
+        projection = {**projection, "messages": 1, "messages_migrating": 1, "last_message_at": 1, "last_read_at": 1, "unread_count": 1}
+    doc = await db.tickets_sav.find_one({"_id": oid, "client_id": user_id}, projection)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Ticket introuvable")
+    if doc.get("messages") or doc.get("messages_migrating"):
+        if await ticket_messages.migrate_embedded(db, oid):
+            # Résumé et compteurs mis à jour par la migration
+            doc = await db.tickets_sav.find_one({"_id": oid}, projection)
+    return doc
+
+async def _mark_read(db, doc: dict) -> None:
+    # last_read_at sert aussi à compter les réponses SAV migrées depuis l'ancien tableau
+    last_read = doc.get("last_read_at")
+    if doc.get("unread_count") or not last_read or (doc.get("last_message_at") and doc["last_message_at"] > last_read):
+        await db.tickets_sav.update_one(
+            {"_id": doc["_id"]}, {"$set": {"unread_count": 0, "last_read_at": datetime.utcnow()}},
+        )
+
 @router.get("/tickets")
-async def list_tickets(user_id: str = Depends(get_current_user_id)):
+async def list_tickets(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    status: str | None = None,
+    user_id: str = Depends(get_current_user_id),
+):
+    """Tickets du client, du plus récent au plus ancien, paginés par curseur (created_at, _id)."""
+    query: dict = {"client_id": user_id}
+    if status:
+        if status not in _LIST_STATUSES:
+            raise HTTPException(status_code=400, detail="Statut invalide")
+        query["status"] = status
+    if cursor:
+        created_at, oid = _decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]
     db = get_db()
-    cursor = db.tickets_sav.find({"client_id": user_id}).sort("created_at", -1)
-    items = []
-    async for doc in cursor:
-        items.append({
+    docs = await (
+        db.tickets_sav.find(query, _LIST_PROJECTION)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+    legacy = [d for d in docs if d.get("messages") or d.get("messages_migrating")]
+    if legacy:
+        await asyncio.gather(*(ticket_messages.migrate_embedded(db, d["_id"]) for d in legacy))
+        fresh = {
+            d["_id"]: d
+            async for d in db.tickets_sav.find({"_id": {"$in": [d["_id"] for d in legacy]}}, _LIST_PROJECTION)
+        }
+        docs = [fresh.get(d["_id"], d) for d in docs]
+    items = [
+        {
             "id": str(doc["_id"]),
             "subject": doc.get("subject"),
             "status": doc.get("status", STATUS_NEW),
             "resolution": doc.get("resolution"),
             "created_at": doc["created_at"].isoformat() if doc.get("created_at") else None,
-        })
+            "last_message": _last_message(doc),
+            "unread_count": doc.get("unread_count", 0),
+        }
+        for doc in docs
+    ]
+    return JSONResponse({"items": items, "next_cursor": next_cursor})
+
+@router.get("/tickets/search")
+async def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=50),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Recherche plein texte (sujet, description, messages) dans les tickets du client."""
+    if not query_terms(q):
+        raise HTTPException(status_code=400, detail="Recherche vide")
+    items = await search_tickets(get_db(), user_id, q, limit)
+    for item in items:
+        item["status"] = item["status"] or STATUS_NEW
     return {"items": items}
 
+def _sse(event_id: str, kind: str, payload: dict) -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {kind}\ndata: {dumps(payload).decode()}\n\n"
+
+@router.post("/tickets/stream-token")
+async def stream_token(user_id: str = Depends(get_current_user_id)):
+    """Jeton court à passer en ?token= à /tickets/stream (jamais le jeton d'accès dans l'URL)."""
+    return {"token": create_stream_token(user_id)}
+
+@router.get("/tickets/stream")
+async def stream_tickets(request: Request, user_id: str = Depends(get_stream_user_id)):
+    """Server-Sent Events : changements de statut et nouveaux messages des tickets du client."""
+    if hub.connections(user_id) >= SSE_MAX_CONNECTIONS_PER_USER:
+        raise HTTPException(status_code=429, detail="Trop de connexions temps réel ouvertes.")
+    last_event_id = request.headers.get("last-event-id")
+    queue = hub.subscribe(user_id)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            seen = 0
+            if last_event_id:
+                missed = hub.replay(user_id, last_event_id)
+                if missed is None:
+                    yield _sse("", "resync", {})
+                else:
+                    for seq, event_id, kind, payload in missed:
+                        seen = seq
+                        yield _sse(event_id, kind, payload)
+            while not await request.is_disconnected():
+                try:
+                    seq, event_id, kind, payload = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if seq > seen:
+                    yield _sse(event_id, kind, payload)
+        finally:
+            hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/tickets/{ticket_id}")
 async def get_ticket(ticket_id: str, user_id: str = Depends(get_current_user_id)):
+    """Détail du ticket avec la dernière page de messages (plus anciens via /messages?before=)."""
     db = get_db()
-    try:
-        doc = await db.tickets_sav.find_one({"_id": ObjectId(ticket_id), "client_id": user_id})
-    except Exception:
-        raise HTTPException(status_code=404, detail="Ticket introuvable")
-    if not doc:
-        raise HTTPException(status_code=404, detail="Ticket introuvable")
+    doc = await _load_ticket(db, ticket_id, user_id)
+    messages, older = await ticket_messages.list_messages(db, doc["_id"])
+    await _mark_read(db, doc)
     return {
         "id": str(doc["_id"]),
         "subject": doc.get("subject"),
@@ -50,9 +218,90 @@ async def get_ticket(ticket_id: str, user_id: str = Depends(get_current_user_id)
         "resolution": doc.get("resolution"),
         "created_at": doc["created_at"].isoformat() if doc.get("created_at") else None,
         "attachment_paths": doc.get("attachment_paths", []),
-        "messages": doc.get("messages", []),
+        "attachment_urls": [
+            f"/api/v1/tickets/{doc['_id']}/attachments/{n}" for n in range(len(doc.get("attachment_paths", [])))
+        ],
+        "messages": [ticket_messages.serialize(m) for m in messages],
+        "messages_before": _encode_cursor(*older) if older else None,
+        "message_count": doc.get("message_count", len(messages)),
+        "unread_count": doc.get("unread_count", 0),
+    }
+
+@router.get("/tickets/{ticket_id}/messages")
+async def list_ticket_messages(
+    ticket_id: str,
+    before: str | None = None,
+    limit: int = Query(ticket_messages.MESSAGES_PAGE, ge=1, le=100),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Messages du ticket en ordre chronologique ; `before` = curseur `messages_before` reçu."""
+    db = get_db()
+    doc = await _load_ticket(db, ticket_id, user_id, projection={})
+    cursor = _decode_cursor(before) if before else None
+    messages, older = await ticket_messages.list_messages(db, doc["_id"], cursor, limit)
+    if not before:
+        await _mark_read(db, doc)
+    return {
+        "items": [ticket_messages.serialize(m) for m in messages],
+        "before": _encode_cursor(*older) if older else None,
     }
 
+_MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "heic": "image/heic",
+    "pdf": "application/pdf",
+}
+
+def _attachment_file(rel: str) -> tuple[Path, os.stat_result] | None:
+    """Fichier sous UPLOAD_DIR et son stat (résolution des liens, accès disque : hors de la boucle)."""
+    base = Path(UPLOAD_DIR).resolve()
+    path = (base / rel).resolve()
+    if base not in path.parents:
+        return None
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (path, st) if stat.S_ISREG(st.st_mode) else None
+
+@router.get("/tickets/{ticket_id}/attachments/{n}")
+async def get_attachment(ticket_id: str, n: int, request: Request, user_id: str = Depends(get_current_user_id)):
+    """Pièce jointe n (0-based) d'un ticket du client : ETag fort, Range, cache immuable."""
+    db = get_db()
+    doc = await db.tickets_sav.find_one(
+        {"_id": _ticket_oid(ticket_id), "client_id": user_id},
+        {"attachment_paths": 1},
+    )
+    paths = (doc or {}).get("attachment_paths") or []
+    if not doc or not 0 <= n < len(paths):
+        raise HTTPException(status_code=404, detail="Pièce jointe introuvable")
+    rel = paths[n]
+    found = await asyncio.to_thread(_attachment_file, rel)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Pièce jointe introuvable")
+    path, st = found
+    name = path.name
+    headers = {"Content-Disposition": f'inline; filename="{name}"'}
+    if rel.startswith("blobs/"):
+        # Store adressé par contenu : le nom est le SHA-256 → ETag fort et contenu immuable.
+        headers["ETag"] = f'"{name.split(".", 1)[0]}"'
+        headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    else:
+        # Ancien fichier hors store : ETag taille + date de modification
+        headers["ETag"] = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        headers["Cache-Control"] = "private, max-age=3600"
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match.encode("latin-1"), headers["ETag"].encode()):
+        return Response(status_code=304, headers=headers)
+    media_type = _MEDIA_TYPES.get(name.rsplit(".", 1)[-1].lower(), "application/octet-stream")
+    if ATTACHMENTS_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = f"{ATTACHMENTS_ACCEL_REDIRECT.rstrip('/')}/{rel}"
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
 @router.post("/tickets")
 async def create_ticket(
     request: Request,
@@ -70,11 +319,8 @@ async def create_ticket(
     files = [f for f in files if f and (f.filename or "").strip()]
     if len(files) > MAX_TICKET_FILES:
         raise HTTPException(status_code=400, detail=f"Maximum {MAX_TICKET_FILES} fichiers.")
-    paths = []
-    for f in files:
-        p = await save_ticket_file(f, "tickets")
-        if p:
-            paths.append(p)
+    results = await save_ticket_files(files, "tickets")
+    paths = [r["path"] for r in results if r["accepted"]]
     db = get_db()
     doc = {
         "client_id": user_id,
@@ -84,11 +330,19 @@ async def create_ticket(
         "status": STATUS_NEW,
         "resolution": None,
         "attachment_paths": paths,
-        "messages": [],
+        "last_message": None,
+        "last_message_at": None,
+        "message_count": 0,
+        "unread_count": 0,
         "created_at": datetime.utcnow(),
     }
     r = await db.tickets_sav.insert_one(doc)
-    return {"id": str(r.inserted_id), "message": "Ticket créé. Diagnostic SAV 49€ — offert si pris en charge, déduit si devis accepté. Réponse sous 24–48h ouvrées."}
+    await add_refs(paths)
+    return {
+        "id": str(r.inserted_id),
+        "message": "Ticket créé. Diagnostic SAV 49€ — offert si pris en charge, déduit si devis accepté. Réponse sous 24–48h ouvrées.",
+        "attachments": [{"filename": a["filename"], "accepted": a["accepted"], "reason": a["reason"]} for a in results],
+    }
 
 class MessageBody(BaseModel):
     body: str
@@ -99,17 +353,8 @@ async def add_message(
     msg: MessageBody,
     user_id: str = Depends(get_current_user_id),
 ):
-    body = msg.body
     db = get_db()
-    try:
-        doc = await db.tickets_sav.find_one({"_id": ObjectId(ticket_id), "client_id": user_id})
-    except Exception:
+    created = await ticket_messages.add_message(db, _ticket_oid(ticket_id), user_id, msg.body[:2000])
+    if not created:
         raise HTTPException(status_code=404, detail="Ticket introuvable")
-    if not doc:
-        raise HTTPException(status_code=404, detail="Ticket introuvable")
-    msg = {"body": body[:2000], "from_client": True, "created_at": datetime.utcnow().isoformat()}
-    await db.tickets_sav.update_one(
-        {"_id": ObjectId(ticket_id), "client_id": user_id},
-        {"$push": {"messages": msg}},
-    )
-    return {"ok": True}
+    return {"ok": True, "message": ticket_messages.serialize(created)}
@@ -0,0 +1,213 @@
+"""
+Stockage des pièces jointes adressé par contenu.
+
+Chemin : `blobs/<2 hex>/<2 hex>/<sha256>.<ext>` sous UPLOAD_DIR — une photo renvoyée
+(autre ticket, retry) n'est stockée qu'une fois. La collection `attachment_blobs`
+(_id = sha256) garde taille, type, refcount et date de dernière référence ;
+`collect_garbage` supprime les blobs qu'aucun `tickets_sav.attachment_paths` ne
+référence plus, `migrate_legacy` convertit les anciens fichiers uuid.
+
+Ordre face au GC : l'upload crée / rafraîchit la ligne d'index (last_ref_at)
+avant de poser ou réutiliser le fichier ; le refcount n'est compté qu'une fois
+le ticket inséré (`add_refs`). Le GC supprime la ligne sous condition
+(last_ref_at et refcount inchangés), écarte le fichier, puis le remet en place
+si un upload a recréé la ligne entre-temps.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.config import UPLOAD_DIR
+from app.db import get_db
+
+log = logging.getLogger(__name__)
+
+BLOB_DIR = "blobs"
+GC_GRACE = timedelta(hours=24)  # une pièce jointe peut être stockée avant l'insert du ticket
+
+
+def blob_relpath(sha256: str, ext: str) -> str:
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+
+def _abs(relpath: str) -> Path:
+    return Path(UPLOAD_DIR) / relpath
+
+
+def _store(tmp: Path, relpath: str) -> bool:
+    """Place le fichier temporaire dans le store. False si le blob existait déjà."""
+    dest = _abs(relpath)
+    if dest.exists():
+        tmp.unlink(missing_ok=True)
+        return False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, dest)
+    return True
+
+
+async def put_blob(tmp: Path, sha256: str, ext: str, size: int) -> str:
+    """Range un fichier (déjà écrit et fsync) sous son empreinte. Référence comptée par `add_refs`."""
+    relpath = blob_relpath(sha256, ext)
+    now = datetime.utcnow()
+    # Index d'abord : last_ref_at récent protège le blob du GC, et un fichier posé a toujours sa ligne.
+    await get_db().attachment_blobs.update_one(
+        {"_id": sha256},
+        {
+            "$setOnInsert": {"path": relpath, "ext": ext, "size": size, "created_at": now, "refcount": 0},
+            "$set": {"last_ref_at": now},
+        },
+        upsert=True,
+    )
+    created = await asyncio.to_thread(_store, tmp, relpath)
+    if not created:
+        log.info("[attachments] doublon %s réutilisé", relpath)
+    return relpath
+
+
+async def add_refs(paths: list[str]) -> None:
+    """Compte les références d'un ticket inséré (une par occurrence dans attachment_paths)."""
+    now = datetime.utcnow()
+    for relpath in paths:
+        if not relpath.startswith(f"{BLOB_DIR}/"):
+            continue
+        sha256 = Path(relpath).name.split(".", 1)[0]
+        await get_db().attachment_blobs.update_one(
+            {"_id": sha256}, {"$set": {"last_ref_at": now}, "$inc": {"refcount": 1}},
+        )
+
+
+def _set_aside(relpath: str) -> Path | None:
+    path = _abs(relpath)
+    aside = path.with_name(f".{path.name}.gc")
+    try:
+        os.replace(path, aside)
+    except FileNotFoundError:
+        return None
+    return aside
+
+
+def _restore(aside: Path, relpath: str) -> None:
+    # Contenu adressé : un fichier déjà reposé par l'upload concurrent est identique.
+    if _abs(relpath).exists():
+        aside.unlink(missing_ok=True)
+    else:
+        os.replace(aside, _abs(relpath))
+
+
+async def collect_garbage(dry_run: bool = False) -> dict[str, int]:
+    """Supprime les blobs non référencés (hors délai de grâce) et resynchronise les refcounts."""
+    db = get_db()
+    cutoff = datetime.utcnow() - GC_GRACE
+    stats = {"checked": 0, "removed": 0, "freed_bytes": 0}
+    async for blob in db.attachment_blobs.find({"last_ref_at": {"$lt": cutoff}}):
+        stats["checked"] += 1
+        refs = await db.tickets_sav.count_documents({"attachment_paths": blob["path"]})
+        if refs:
+            if refs != blob.get("refcount"):
+                await db.attachment_blobs.update_one({"_id": blob["_id"]}, {"$set": {"refcount": refs}})
+            continue
+        if dry_run:
+            stats["removed"] += 1
+            stats["freed_bytes"] += blob.get("size", 0)
+            continue
+        # last_ref_at / refcount inchangés : aucun upload ni ticket n'a référencé le blob depuis la lecture.
+        r = await db.attachment_blobs.delete_one(
+            {"_id": blob["_id"], "last_ref_at": blob["last_ref_at"], "refcount": blob.get("refcount")},
+        )
+        if not r.deleted_count:
+            continue
+        aside = await asyncio.to_thread(_set_aside, blob["path"])
+        if aside is None:
+            continue
+        # Un upload du même contenu a pu recréer la ligne et réutiliser le fichier avant l'écartement.
+        if await db.attachment_blobs.find_one({"_id": blob["_id"]}, {"_id": 1}):
+            await asyncio.to_thread(_restore, aside, blob["path"])
+            continue
+        await asyncio.to_thread(aside.unlink, missing_ok=True)
+        stats["removed"] += 1
+        stats["freed_bytes"] += blob.get("size", 0)
+    return stats
+
+
+def _link_into_store(src: Path, relpath: str) -> bool:
+    """Copie (lien dur si possible) un fichier existant dans le store, sans toucher la source."""
+    dest = _abs(relpath)
+    if dest.exists():
+        return False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.part")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
+    return True
+
+
+def _legacy_files(folder: Path) -> list[Path]:
+    if not folder.is_dir():
+        return []
+    return [p for p in sorted(folder.iterdir()) if p.is_file() and not p.name.startswith(".")]
+
+
+def _read_file(path: Path) -> tuple[bytes, str, int]:
+    """(premiers octets, SHA-256, taille) en une lecture."""
+    h = hashlib.sha256()
+    head = b""
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            if not size:
+                head = chunk[:64]
+            h.update(chunk)
+            size += len(chunk)
+    return head, h.hexdigest(), size
+
+
+async def migrate_legacy(subdir: str = "tickets", dry_run: bool = False) -> dict[str, int]:
+    """Déplace les anciens fichiers `<subdir>/<uuid>.<ext>` dans le store et réécrit les tickets."""
+    # Import local : file_service importe ce module
+    from app.services.file_service import file_ext, sniff_kind
+
+    db = get_db()
+    stats = {"files": 0, "migrated": 0, "duplicates": 0, "skipped": 0}
+    for path in await asyncio.to_thread(_legacy_files, Path(UPLOAD_DIR) / subdir):
+        stats["files"] += 1
+        old = f"{subdir}/{path.name}"
+        head, sha256, size = await asyncio.to_thread(_read_file, path)
+        ext = sniff_kind(head) or file_ext(path.name)
+        if not ext:
+            stats["skipped"] += 1
+            continue
+        new = blob_relpath(sha256, ext)
+        refs = await db.tickets_sav.count_documents({"attachment_paths": old})
+        if dry_run:
+            stats["migrated"] += 1
+            continue
+        # Ordre sûr en cas d'interruption : copie dans le store, tickets réécrits, puis suppression.
+        created = await asyncio.to_thread(_link_into_store, path, new)
+        if not created:
+            stats["duplicates"] += 1
+        now = datetime.utcnow()
+        await db.attachment_blobs.update_one(
+            {"_id": sha256},
+            {
+                "$setOnInsert": {"path": new, "ext": ext, "size": size, "created_at": now},
+                "$set": {"last_ref_at": now},
+                "$inc": {"refcount": refs},
+            },
+            upsert=True,
+        )
+        await db.tickets_sav.update_many(
+            {"attachment_paths": old},
+            {"$set": {"attachment_paths.$[p]": new}},
+            array_filters=[{"p": old}],
+        )
+        await asyncio.to_thread(path.unlink, missing_ok=True)
+        stats["migrated"] += 1
+    return stats
@@ -9,6 +9,7 @@ from app.config import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     REFRESH_TOKEN_EXPIRE_DAYS,
     MAGIC_LINK_EXPIRE_MINUTES,
+    SSE_TOKEN_EXPIRE_SECONDS,
     BASE_URL_CLIENT,
 )
 
@@ -37,6 +38,15 @@ def create_refresh_token(sub: str) -> str:
         algorithm=JWT_ALGORITHM,
     )
 
+def create_stream_token(sub: str) -> str:
+    """Jeton court, valable uniquement pour ouvrir /tickets/stream (passé en ?token=)."""
+    expire = datetime.utcnow() + timedelta(seconds=SSE_TOKEN_EXPIRE_SECONDS)
+    return jwt.encode(
+        {"sub": sub, "exp": expire, "type": "stream"},
+        JWT_SECRET,
+        algorithm=JWT_ALGORITHM,
+    )
+
 def decode_token(token: str) -> dict | None:
     try:
         return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
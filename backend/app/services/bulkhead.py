@@ -0,0 +1,128 @@
+"""
+Cloisons (bulkheads) par service amont : DF, PDF DF, compta.
+
+Chaque cloison borne le nombre d'appels simultanés du worker vers son service.
+Au-delà, les appels attendent dans une file bornée, servie par priorité puis
+par ordre d'arrivée : les lectures interactives passent avant les tâches de fond
+(export, préchargement). File pleine ou attente trop longue → `BulkheadFull`,
+l'appel amont n'est pas tenté (les connecteurs le traitent comme une erreur
+réseau et renvoient une valeur vide).
+
+La priorité suit le contexte asyncio : `with background():` s'applique aussi aux
+tâches créées à l'intérieur.
+"""
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator
+
+from app.config import (
+    COMPTA_MAX_CONCURRENCY,
+    DF_MAX_CONCURRENCY,
+    DF_PDF_MAX_CONCURRENCY,
+    UPSTREAM_QUEUE_SIZE,
+    UPSTREAM_QUEUE_TIMEOUT_SECONDS,
+)
+from app.services import metrics
+
+INTERACTIVE = 0
+BACKGROUND = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class BulkheadFull(Exception):
+    pass
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Appels amont du bloc (et des tâches qu'il crée) en priorité basse."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Bulkhead:
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: list[list] = []  # tas de [priorité, n° d'arrivée, future]
+        self._seq = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, priority: int | None = None) -> AsyncIterator[None]:
+        priority = _priority.get() if priority is None else priority
+        t0 = time.perf_counter()
+        await self._acquire(priority)
+        metrics.observe(
+            "bulkhead_wait_seconds", time.perf_counter() - t0,
+            upstream=self.name, priority=_PRIORITY_NAMES[priority],
+        )
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._gauges()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", priority)
+        fut = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), fut]
+        heapq.heappush(self._waiters, entry)
+        self._gauges()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(entry)
+            self._reject("timeout", priority)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()  # place cédée juste avant l'annulation : on la rend
+            else:
+                self._discard(entry)
+            raise
+
+    def _release(self) -> None:
+        # La place passe directement au prochain en file (le compteur ne bouge pas)
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                self._gauges()
+                return
+        self._active -= 1
+        self._gauges()
+
+    def _discard(self, entry: list) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        self._gauges()
+
+    def _reject(self, reason: str, priority: int) -> None:
+        metrics.incr("bulkhead_rejected", upstream=self.name, reason=reason, priority=_PRIORITY_NAMES[priority])
+        raise BulkheadFull(f"{self.name} : {reason}")
+
+    def _gauges(self) -> None:
+        metrics.set_gauge("bulkhead_active", self._active, upstream=self.name)
+        metrics.set_gauge("bulkhead_queued", len(self._waiters), upstream=self.name)
+
+
+df = Bulkhead("df", DF_MAX_CONCURRENCY, UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT_SECONDS)
+df_pdf = Bulkhead("df_pdf", DF_PDF_MAX_CONCURRENCY, UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT_SECONDS)
+compta = Bulkhead("compta", COMPTA_MAX_CONCURRENCY, UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT_SECONDS)
@@ -0,0 +1,185 @@
+"""
+Instrumentation du client MongoDB (listeners pymongo, passés à AsyncIOMotorClient).
+
+- Commandes : durée par collection et par opération (`mongo_command_seconds`),
+  échecs (`mongo_command_failed`). Au-delà de MONGO_SLOW_QUERY_MS, la commande
+  est loguée avec la forme de son filtre (valeurs remplacées par "?", opérateurs
+  et champs conservés) et gardée dans `slow_commands()`.
+- Pool de connexions : attente au checkout (`mongo_pool_checkout_seconds`),
+  échecs (`mongo_pool_checkout_failed`, ex. délai MONGO_WAIT_QUEUE_TIMEOUT_MS
+  dépassé), connexions ouvertes et en service par serveur (jauges).
+
+Les listeners sont appelés depuis les threads de pymongo : ils ne font que des
+opérations courtes, `metrics` est protégé par un verrou.
+"""
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any
+
+from pymongo import monitoring
+
+from app.config import MONGO_SLOW_QUERY_MS
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+# Commandes de service (handshake, sessions, auth) : pas de collection, pas mesurées
+_IGNORED = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo", "killCursors"}
+
+_slow: deque[dict] = deque(maxlen=50)
+
+
+def slow_commands() -> list[dict]:
+    """Dernières commandes lentes (les plus récentes en dernier)."""
+    return list(_slow)
+
+
+def _shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shape(v) for v in value[:3]]
+    return "?"
+
+
+def _collection(name: str, command: dict) -> str | None:
+    if name == "getMore":
+        return command.get("collection")
+    target = command.get(name)
+    return target if isinstance(target, str) else None
+
+
+def _filter(name: str, command: dict) -> Any:
+    if name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if name == "aggregate":
+        return command.get("pipeline")
+    if name == "findAndModify":
+        return command.get("query")
+    if name in ("update", "delete"):
+        ops = command.get(name + "s") or [{}]
+        return ops[0].get("q")
+    return None
+
+
+class CommandMonitor(monitoring.CommandListener):
+    def __init__(self, slow_ms: float = MONGO_SLOW_QUERY_MS) -> None:
+        self.slow_ms = slow_ms
+        self._started: dict[tuple, tuple[str, str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        if event.command_name in _IGNORED:
+            return
+        coll = _collection(event.command_name, event.command)
+        if coll is None:
+            return
+        with self._lock:
+            self._started[(event.request_id, event.connection_id)] = (coll, event.command_name, event.command)
+
+    def _finish(self, event) -> tuple[str, str, dict] | None:
+        with self._lock:
+            return self._started.pop((event.request_id, event.connection_id), None)
+
+    def succeeded(self, event) -> None:
+        info = self._finish(event)
+        if info is None:
+            return
+        coll, op, command = info
+        seconds = event.duration_micros / 1e6
+        metrics.observe("mongo_command_seconds", seconds, collection=coll, op=op)
+        if seconds * 1000 >= self.slow_ms:
+            shape = _shape(_filter(op, command))
+            metrics.incr("mongo_slow_commands", collection=coll, op=op)
+            _slow.append({"at": time.time(), "collection": coll, "op": op, "ms": round(seconds * 1000, 1), "filter": shape})
+            log.warning("[mongo] commande lente %.0f ms : %s.%s %s", seconds * 1000, coll, op, shape)
+
+    def failed(self, event) -> None:
+        info = self._finish(event)
+        if info is None:
+            return
+        coll, op, _ = info
+        metrics.observe("mongo_command_seconds", event.duration_micros / 1e6, collection=coll, op=op)
+        metrics.incr("mongo_command_failed", collection=coll, op=op)
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Attente au checkout et taille du pool, par serveur."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._open: dict[str, int] = defaultdict(int)
+        self._in_use: dict[str, int] = defaultdict(int)
+        # Checkout synchrone dans le thread pymongo : début mémorisé par thread
+        # (les événements n'ont un champ `duration` qu'à partir de pymongo 4.7).
+        self._local = threading.local()
+
+    @staticmethod
+    def _addr(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _gauges(self, addr: str) -> None:
+        metrics.set_gauge("mongo_pool_connections", self._open[addr], address=addr)
+        metrics.set_gauge("mongo_pool_in_use", self._in_use[addr], address=addr)
+
+    def _wait(self, event) -> float:
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            return duration
+        return time.perf_counter() - getattr(self._local, "t0", time.perf_counter())
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.t0 = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        addr = self._addr(event)
+        metrics.observe("mongo_pool_checkout_seconds", self._wait(event), address=addr)
+        with self._lock:
+            self._in_use[addr] += 1
+            self._gauges(addr)
+
+    def connection_check_out_failed(self, event) -> None:
+        addr = self._addr(event)
+        metrics.observe("mongo_pool_checkout_seconds", self._wait(event), address=addr)
+        metrics.incr("mongo_pool_checkout_failed", address=addr, reason=str(event.reason))
+
+    def connection_checked_in(self, event) -> None:
+        addr = self._addr(event)
+        with self._lock:
+            self._in_use[addr] = max(self._in_use[addr] - 1, 0)
+            self._gauges(addr)
+
+    def connection_created(self, event) -> None:
+        addr = self._addr(event)
+        with self._lock:
+            self._open[addr] += 1
+            self._gauges(addr)
+
+    def connection_closed(self, event) -> None:
+        addr = self._addr(event)
+        with self._lock:
+            self._open[addr] = max(self._open[addr] - 1, 0)
+            self._gauges(addr)
+
+    def pool_cleared(self, event) -> None:
+        metrics.incr("mongo_pool_cleared", address=self._addr(event))
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+
+def listeners() -> list:
+    return [CommandMonitor(), PoolMonitor()]
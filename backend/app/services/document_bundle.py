@@ -0,0 +1,143 @@
+"""
+Archive ZIP des PDF du client (factures de maintenance, contrats), produite en flux.
+
+Les PDF sont téléchargés depuis DF par `DOCUMENT_BUNDLE_CONCURRENCY` workers et
+passés à l'archive au fur et à mesure qu'ils arrivent. Le ZIP est écrit dans un
+tampon vidé après chaque fichier (pas de fichier temporaire) ; la file entre
+workers et archive est bornée, donc un client lent suspend les téléchargements
+au lieu d'accumuler des PDF en mémoire. Les PDF sont stockés sans recompression.
+Les documents indisponibles sont listés dans `documents-manquants.txt`.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date
+from typing import AsyncIterator, Awaitable, Callable
+
+from app.config import DOCUMENT_BUNDLE_CONCURRENCY
+from app.connectors.df_connector import (
+    get_all_contracts_for_client,
+    get_contract_pdf_bytes,
+    get_invoice_pdf_bytes,
+    get_maintenance_invoices_for_client,
+)
+
+log = logging.getLogger(__name__)
+
+BUNDLE_TYPES = {"facture", "contrat"}
+
+
+@dataclass
+class BundleEntry:
+    name: str
+    type: str
+    date: str  # YYYY-MM-DD ou ""
+    fetch: Callable[[], Awaitable[bytes | None]]
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^\w.-]+", "-", text, flags=re.UNICODE).strip("-")[:80] or "document"
+
+
+async def list_entries(email: str, types: set[str], date_from: date | None, date_to: date | None) -> list[BundleEntry]:
+    """PDF disponibles pour le client, filtrés par type et par date (bornes incluses)."""
+    want_invoices = not types or "facture" in types
+    want_contracts = not types or "contrat" in types
+    invoices, contracts = await asyncio.gather(
+        get_maintenance_invoices_for_client(email) if want_invoices else asyncio.sleep(0, []),
+        get_all_contracts_for_client(email) if want_contracts else asyncio.sleep(0, []),
+    )
+    entries = []
+    for inv in invoices:
+        if not inv.get("id"):
+            continue
+        entries.append(BundleEntry(
+            name=f"factures/{inv.get('date') or 'sans-date'}_{_slug(inv.get('label') or inv['id'])}.pdf",
+            type="facture",
+            date=inv.get("date") or "",
+            fetch=lambda i=inv["id"]: get_invoice_pdf_bytes(i, email),
+        ))
+    for c in contracts:
+        if not c.get("id"):
+            continue
+        start = str(c.get("start_date") or "")[:10]
+        entries.append(BundleEntry(
+            name=f"contrats/{start or 'sans-date'}_contrat-{_slug(c.get('contract_number') or c['id'][:8])}.pdf",
+            type="contrat",
+            date=start,
+            fetch=lambda i=c["id"]: get_contract_pdf_bytes(i, email),
+        ))
+    if date_from or date_to:
+        lo = date_from.isoformat() if date_from else ""
+        hi = date_to.isoformat() if date_to else "9999-12-31"
+        entries = [e for e in entries if e.date and lo <= e.date <= hi]
+    entries.sort(key=lambda e: e.date, reverse=True)
+    return entries
+
+
+class _ZipBuffer:
+    """Flux en écriture seule pour zipfile : accumule les octets jusqu'au prochain drain()."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+async def _fetched(entries: list[BundleEntry]) -> AsyncIterator[tuple[BundleEntry, bytes | None]]:
+    """PDF téléchargés par un pool borné de workers, dans l'ordre d'arrivée."""
+    pending = iter(entries)
+    done: asyncio.Queue = asyncio.Queue(maxsize=DOCUMENT_BUNDLE_CONCURRENCY)
+
+    async def worker() -> None:
+        for entry in pending:
+            try:
+                data = await entry.fetch()
+            except Exception as exc:
+                log.error("[bundle] %s : %s", entry.name, exc)
+                data = None
+            await done.put((entry, data))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(DOCUMENT_BUNDLE_CONCURRENCY, len(entries)))]
+    try:
+        for _ in entries:
+            yield await done.get()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def zip_stream(entries: list[BundleEntry]) -> AsyncIterator[bytes]:
+    buf = _ZipBuffer()
+    missing: list[str] = []
+    names: set[str] = set()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        async for entry, data in _fetched(entries):
+            if not data:
+                missing.append(entry.name)
+                continue
+            name = entry.name
+            n = 1
+            while name in names:
+                n += 1
+                name = entry.name.replace(".pdf", f"-{n}.pdf")
+            names.add(name)
+            zf.writestr(name, data)
+            yield buf.drain()
+        if missing:
+            zf.writestr("documents-manquants.txt", "Documents indisponibles au moment de l'export :\n" + "\n".join(missing) + "\n")
+    yield buf.drain()
@@ -0,0 +1,150 @@
+"""
+Liste paginée des documents (compta, DF, maintenance).
+
+Chaque source produit un flux déjà trié du plus récent au plus ancien, filtré au
+plus près du connecteur (type / statut / date pour DF). Les flux sont fusionnés
+à la volée (k-way merge sur un tas) : on ne lit que `limit + 1` éléments, et les
+jetons de signature / paiement DF ne sont demandés que pour la page renvoyée.
+
+Ordre total : (date, source, id) décroissant. Le curseur opaque est la clé du
+dernier élément de la page (JSON en base64url) ; la page suivante reprend
+strictement après.
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import heapq
+from typing import Any, AsyncIterator
+
+import orjson
+
+from app.connectors.compta_connector import get_documents_for_client as compta_docs
+from app.connectors.df_connector import document_fields, document_item, get_maintenance_invoices_for_client, iter_client_documents
+from app.connectors.schemas import DfDocument
+
+PAGE_DEFAULT = 30
+PAGE_MAX = 100
+SOURCES = {"compta", "df", "maintenance"}
+
+Key = tuple[str, str, str]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key: Key) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(key)).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Key:
+    try:
+        key = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, orjson.JSONDecodeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not (isinstance(key, list) and len(key) == 3 and all(isinstance(k, str) for k in key)):
+        raise InvalidCursor(cursor)
+    return tuple(key)
+
+
+def _key(item: dict) -> Key:
+    return (item.get("date") or "", item.get("source") or "", str(item.get("id") or ""))
+
+
+class _Desc:
+    """Inverse l'ordre de la clé : heapq est un tas min, on veut le plus récent d'abord."""
+    __slots__ = ("key",)
+
+    def __init__(self, key: Key) -> None:
+        self.key = key
+
+    def __lt__(self, other: _Desc) -> bool:
+        return self.key > other.key
+
+
+async def _list_stream(items, doc_type, status, since, after) -> AsyncIterator[tuple[Key, dict]]:
+    """Flux trié d'une source renvoyée d'un bloc (compta, maintenance), filtrée localement."""
+    keyed = sorted(((_key(d), d) for d in await items), key=lambda kd: kd[0], reverse=True)
+    for key, d in keyed:
+        if since and key[0] < since:
+            return
+        if (after and key >= after) or (doc_type and d.get("type") != doc_type) or (status and d.get("status") != status):
+            continue
+        yield key, d
+
+
+async def _df_stream(email, doc_type, status, since, after) -> AsyncIterator[tuple[Key, DfDocument]]:
+    # Date du curseur envoyée à DF (borne incluse) : la reprise ne repart pas de la page 1
+    async for d in iter_client_documents(email, doc_type, status, since, after[0] if after else None):
+        key = (d.date, "df", str(d.id))
+        if after and key >= after:
+            continue
+        yield key, d
+
+
+async def _merge(streams: list[AsyncIterator]) -> AsyncIterator[tuple[Key, Any]]:
+    heads = await asyncio.gather(*(anext(s, None) for s in streams))
+    heap = [(_Desc(h[0]), i, h[1]) for i, h in enumerate(heads) if h is not None]
+    heapq.heapify(heap)
+    while heap:
+        desc, i, value = heap[0]
+        yield desc.key, value
+        nxt = await anext(streams[i], None)
+        if nxt is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (_Desc(nxt[0]), i, nxt[1]))
+
+
+async def _ready(item: dict) -> dict:
+    return item
+
+
+async def list_documents(
+    email: str,
+    doc_type: str | None = None,
+    status: str | None = None,
+    since: str | None = None,
+    sources: set[str] | None = None,
+    cursor: str | None = None,
+    limit: int = PAGE_DEFAULT,
+    links: bool = True,
+) -> dict[str, Any]:
+    """Une page de documents : {"items": [...], "next_cursor": str | None}.
+
+    `links=False` : documents DF sans liens signature / paiement (`actions` indique
+    seulement ce qui est attendu du client), donc sans aucun POST vers DF.
+
+    Lève InvalidCursor si le curseur n'a pas été produit par cette fonction.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    sources = sources or SOURCES
+    streams = []
+    if "compta" in sources:
+        streams.append(_list_stream(compta_docs(email), doc_type, status, since, after))
+    if "df" in sources:
+        streams.append(_df_stream(email, doc_type, status, since, after))
+    if "maintenance" in sources and doc_type in (None, "facture"):
+        streams.append(_list_stream(get_maintenance_invoices_for_client(email), doc_type, status, since, after))
+
+    page: list[tuple[Key, Any]] = []
+    merged = _merge(streams)
+    try:
+        async for kv in merged:
+            page.append(kv)
+            if len(page) > limit:
+                break
+    finally:
+        await merged.aclose()
+        for s in streams:
+            await s.aclose()
+
+    next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+    page = page[:limit]
+    if not links:
+        items = [document_fields(v) if isinstance(v, DfDocument) else v for _, v in page]
+        return {"items": items, "next_cursor": next_cursor}
+    items = await asyncio.gather(*(
+        document_item(v) if isinstance(v, DfDocument) else _ready(v) for _, v in page
+    ))
+    return {"items": items, "next_cursor": next_cursor}
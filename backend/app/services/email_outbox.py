@@ -0,0 +1,222 @@
+"""
+Outbox email.
+
+Les routes enregistrent le message dans la collection `email_outbox` et rendent la
+main immédiatement. Des workers asyncio (lancés au démarrage de l'app) réservent
+jusqu'à EMAIL_BATCH_SIZE messages sous un jeton de lot (`lease`), les délivrent sur
+une même session SMTP du pool, hors de la boucle d'événements, et replanifient en
+cas d'échec (backoff exponentiel). Après
+EMAIL_MAX_ATTEMPTS essais le message passe en `dead` (dead-letter, à inspecter).
+
+Bail : `locked_at` des messages du lot encore à envoyer est prolongé avant chaque
+envoi, un lot long n'est donc jamais repris par un autre worker ; les mises à jour
+de fin ne portent que sur les messages dont le worker détient encore le jeton.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import secrets
+import time
+from datetime import datetime, timedelta
+
+from app.config import (
+    EMAIL_OUTBOX_WORKERS,
+    EMAIL_OUTBOX_POLL_SECONDS,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_RETRY_BASE_SECONDS,
+    EMAIL_LEASE_SECONDS,
+    EMAIL_BATCH_SIZE,
+)
+from app.db import get_db
+from app.services import metrics
+from app.services.email_service import deliver_many, smtp_configured, smtp_pool
+
+log = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+
+_wakeup: asyncio.Event | None = None
+_workers: list[asyncio.Task] = []
+
+
+def _event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+def retry_delay(attempts: int) -> int:
+    """Délai avant le prochain essai : base, 2×base, 4×base…"""
+    return EMAIL_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+
+
+async def enqueue_email(to: str, template: str, params: dict) -> str | None:
+    """Enregistre un email (nom de template + paramètres) à envoyer.
+
+    Retourne l'id outbox (None si SMTP non configuré). Le rendu est fait à l'envoi.
+    """
+    if not smtp_configured():
+        log.warning("[outbox] SMTP non configuré, skip %s → %s", template, to)
+        return None
+    now = datetime.utcnow()
+    r = await get_db().email_outbox.insert_one({
+        "to": to,
+        "template": template,
+        "params": params,
+        "kind": template,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "last_error": None,
+        "created_at": now,
+        "next_attempt_at": now,
+        "locked_at": None,
+        "lease": None,
+        "sent_at": None,
+    })
+    metrics.incr("email_outbox_enqueued", kind=template)
+    _event().set()
+    return str(r.inserted_id)
+
+
+def _claimable(now: datetime) -> dict:
+    """Messages dus, ou `sending` dont le worker a disparu (bail expiré)."""
+    return {"$or": [
+        {"status": STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+        {"status": STATUS_SENDING, "locked_at": {"$lt": now - timedelta(seconds=EMAIL_LEASE_SECONDS)}},
+    ]}
+
+
+async def _claim_batch(size: int = EMAIL_BATCH_SIZE) -> tuple[str, list[dict]]:
+    """Réserve jusqu'à `size` messages sous un jeton de lot : 3 allers-retours quel que soit `size`."""
+    db = get_db()
+    now = datetime.utcnow()
+    cursor = db.email_outbox.find(_claimable(now), {"_id": 1}).sort("next_attempt_at", 1).limit(size)
+    ids = [d["_id"] async for d in cursor]
+    if not ids:
+        return "", []
+    lease = secrets.token_hex(8)
+    # Filtre répété : un message pris par un autre worker entre-temps n'est pas réservé deux fois.
+    await db.email_outbox.update_many(
+        {"_id": {"$in": ids}, **_claimable(now)},
+        {"$set": {"status": STATUS_SENDING, "locked_at": now, "lease": lease}, "$inc": {"attempts": 1}},
+    )
+    batch = await db.email_outbox.find({"lease": lease}).sort("next_attempt_at", 1).to_list(size)
+    return lease, batch
+
+
+async def _extend_lease(lease: str) -> int:
+    r = await get_db().email_outbox.update_many(
+        {"lease": lease, "status": STATUS_SENDING}, {"$set": {"locked_at": datetime.utcnow()}},
+    )
+    return r.matched_count
+
+
+async def _finish(msg: dict, error: Exception | None, elapsed: float) -> None:
+    db = get_db()
+    kind = msg.get("kind") or "other"
+    # Jeton du lot : sans effet si le message a été repris par un autre worker
+    mine = {"_id": msg["_id"], "lease": msg["lease"]}
+    if error is not None:
+        err = f"{type(error).__name__}: {error}"
+        if msg["attempts"] >= EMAIL_MAX_ATTEMPTS:
+            await db.email_outbox.update_one(
+                mine,
+                {"$set": {"status": STATUS_DEAD, "last_error": err, "locked_at": None, "lease": None}},
+            )
+            metrics.incr("email_outbox_dead", kind=kind)
+            log.error("[outbox] %s → %s abandonné après %s essais : %s", kind, msg["to"], msg["attempts"], err)
+        else:
+            delay = retry_delay(msg["attempts"])
+            await db.email_outbox.update_one(
+                mine,
+                {"$set": {
+                    "status": STATUS_PENDING,
+                    "last_error": err,
+                    "locked_at": None,
+                    "lease": None,
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                }},
+            )
+            metrics.incr("email_outbox_retried", kind=kind)
+            log.warning("[outbox] %s → %s échec (essai %s, retry dans %ss) : %s", kind, msg["to"], msg["attempts"], delay, err)
+        return
+    now = datetime.utcnow()
+    await db.email_outbox.update_one(
+        mine,
+        {"$set": {"status": STATUS_SENT, "sent_at": now, "locked_at": None, "last_error": None, "lease": None}},
+    )
+    metrics.incr("email_outbox_sent", kind=kind)
+    metrics.observe("email_outbox_delivery_seconds", elapsed, kind=kind)
+    metrics.observe("email_outbox_queue_seconds", (now - msg["created_at"]).total_seconds(), kind=kind)
+    log.info("[outbox] %s envoyé à %s", kind, msg["to"])
+
+
+def _delivery_item(msg: dict) -> tuple[str, str, dict]:
+    if "template" in msg:
+        return msg["to"], msg["template"], msg.get("params") or {}
+    # Messages enregistrés avant les templates : sujet + HTML déjà rendus.
+    return msg["to"], "raw", {"subject": msg.get("subject", ""), "content": msg.get("html", "")}
+
+
+async def _process(lease: str, batch: list[dict]) -> None:
+    loop = asyncio.get_running_loop()
+
+    def before_send() -> bool:
+        # Thread SMTP : prolonge le bail du lot (chaque envoi dure bien moins que EMAIL_LEASE_SECONDS).
+        try:
+            return asyncio.run_coroutine_threadsafe(_extend_lease(lease), loop).result(30) > 0
+        except Exception as exc:
+            log.error("[outbox] prolongation du bail impossible : %s", exc)
+            return False
+
+    started = time.perf_counter()
+    items = [_delivery_item(m) for m in batch]
+    errors = await asyncio.to_thread(deliver_many, items, before_send)
+    elapsed = (time.perf_counter() - started) / len(batch)
+    metrics.observe("email_outbox_batch_size", len(batch))
+    for msg, error in zip(batch, errors):
+        await _finish(msg, error, elapsed)
+
+
+async def _worker(n: int) -> None:
+    wakeup = _event()
+    while True:
+        wakeup.clear()
+        try:
+            lease, batch = await _claim_batch()
+            if batch:
+                await _process(lease, batch)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.error("[outbox] worker %s erreur : %s", n, exc)
+        try:
+            await asyncio.wait_for(wakeup.wait(), EMAIL_OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_workers(count: int = EMAIL_OUTBOX_WORKERS) -> None:
+    if _workers:
+        return
+    for n in range(count):
+        _workers.append(asyncio.create_task(_worker(n), name=f"email-outbox-{n}"))
+
+
+async def stop_workers() -> None:
+    for t in _workers:
+        t.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    await asyncio.to_thread(smtp_pool.close_all)
+
+
+async def outbox_stats() -> dict[str, int]:
+    """Nombre de messages par statut (pending / sending / sent / dead)."""
+    cursor = get_db().email_outbox.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}])
+    return {row["_id"]: row["n"] async for row in cursor}
@@ -1,7 +1,23 @@
-"""Envoi email magic link — style identique au site principal Renovia Pro."""
+"""Envoi email magic link — style identique au site principal Renovia Pro.
+
+Les emails sont des `EmailTemplate` précompilés (voir email_templates) référencés par
+nom dans TEMPLATES ; `deliver_many` rend et envoie via le pool SMTP. Les routes
+passent par l'outbox (`email_outbox.enqueue_email`).
+"""
 import smtplib
-from email.mime.text import MIMEText
-from app.config import SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM
+from typing import Callable
+from app.config import (
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_USER,
+    SMTP_PASSWORD,
+    SMTP_FROM,
+    SMTP_SECURITY,
+    SMTP_POOL_SIZE,
+    SMTP_IDLE_TIMEOUT_SECONDS,
+)
+from app.services.email_templates import EmailTemplate, html_to_text
+from app.services.smtp_pool import SmtpPool
 
 LOGO_URL   = "https://renoviapro.fr/logo.png"
 TEXT_URL   = "https://renoviapro.fr/renovia-pro-text.png?v=2"
@@ -33,8 +49,15 @@ EMAIL_FOOTER = f"""
 """
 
 
-def _magic_link_html(link: str) -> str:
-    return f"""<!DOCTYPE html>
+_FROM = SMTP_FROM or "noreply@renoviapro.fr"
+_CONSTANTS = {"header": EMAIL_HEADER, "footer": EMAIL_FOOTER, "gold": GOLD}
+
+_TEXT_FOOTER = """
+--
+Renovia Pro — 06 52 03 60 20 — contact@renoviapro.fr — renoviapro.fr
+"""
+
+_MAGIC_LINK_HTML = """<!DOCTYPE html>
 <html lang="fr">
 <head>
   <meta charset="utf-8">
@@ -46,7 +69,7 @@ def _magic_link_html(link: str) -> str:
     <tr>
       <td align="center">
         <table width="100%" style="max-width:560px; background:#fff; border-radius:12px; overflow:hidden; box-shadow:0 4px 24px rgba(0,0,0,0.08);">
-          <tr><td>{EMAIL_HEADER}</td></tr>
+          <tr><td>{header}</td></tr>
           <tr>
             <td style="padding:36px 32px;">
               <h2 style="margin:0 0 16px; font-size:22px; color:#111;">Connexion à votre espace client</h2>
@@ -57,20 +80,20 @@ def _magic_link_html(link: str) -> str:
               </p>
               <div style="margin:0 0 28px; text-align:center;">
                 <a href="{link}"
-                   style="display:inline-block; background:{GOLD}; color:#000; padding:14px 40px; border-radius:40px; text-decoration:none; font-weight:700; font-size:16px; letter-spacing:0.5px;">
+                   style="display:inline-block; background:{gold}; color:#000; padding:14px 40px; border-radius:40px; text-decoration:none; font-weight:700; font-size:16px; letter-spacing:0.5px;">
                   Se connecter à mon espace
                 </a>
               </div>
-              <div style="padding:16px; background:#f9f9f9; border-left:4px solid {GOLD}; border-radius:4px; margin-bottom:16px;">
+              <div style="padding:16px; background:#f9f9f9; border-left:4px solid {gold}; border-radius:4px; margin-bottom:16px;">
                 <p style="margin:0 0 6px; font-size:11px; color:#999; text-transform:uppercase; letter-spacing:1px;">Lien de secours</p>
-                <a href="{link}" style="font-size:12px; color:{GOLD}; word-break:break-all;">{link}</a>
+                <a href="{link}" style="font-size:12px; color:{gold}; word-break:break-all;">{link}</a>
               </div>
               <p style="margin:0; font-size:12px; color:#aaa; line-height:1.6;">
                 Si vous n'avez pas demandé cette connexion, ignorez cet email.
               </p>
             </td>
           </tr>
-          <tr><td>{EMAIL_FOOTER}</td></tr>
+          <tr><td>{footer}</td></tr>
         </table>
       </td>
     </tr>
@@ -78,20 +101,14 @@ def _magic_link_html(link: str) -> str:
 </body>
 </html>"""
 
-
-def send_welcome_email(to: str, link: str) -> bool:
-    """Email de bienvenue pour un nouveau compte — lien magique inclus."""
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print("[EMAIL] SMTP non configuré, skip welcome")
-        return False
-    html = f"""<!DOCTYPE html>
+_WELCOME_HTML = """<!DOCTYPE html>
 <html lang="fr">
 <head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1"></head>
 <body style="margin:0; padding:0; background:#f9f9f9; font-family:'Helvetica Neue',Arial,sans-serif;">
   <table width="100%" cellpadding="0" cellspacing="0" style="background:#f9f9f9; padding:32px 16px;">
     <tr><td align="center">
       <table width="100%" style="max-width:560px; background:#fff; border-radius:12px; overflow:hidden; box-shadow:0 4px 24px rgba(0,0,0,0.08);">
-        <tr><td>{EMAIL_HEADER}</td></tr>
+        <tr><td>{header}</td></tr>
         <tr>
           <td style="padding:36px 32px;">
             <h2 style="margin:0 0 8px; font-size:24px; color:#111;">Bienvenue chez Renovia Pro !</h2>
@@ -103,59 +120,33 @@ def send_welcome_email(to: str, link: str) -> bool:
               Ce lien est <strong style="color:#000;">valable 15 minutes</strong>.
             </p>
             <div style="margin:0 0 28px; text-align:center;">
-              <a href="{link}" style="display:inline-block; background:{GOLD}; color:#000; padding:16px 44px; border-radius:40px; text-decoration:none; font-weight:700; font-size:16px; letter-spacing:0.5px;">
+              <a href="{link}" style="display:inline-block; background:{gold}; color:#000; padding:16px 44px; border-radius:40px; text-decoration:none; font-weight:700; font-size:16px; letter-spacing:0.5px;">
                 Accéder à mon espace client
               </a>
             </div>
-            <div style="padding:16px; background:#f9f9f9; border-left:4px solid {GOLD}; border-radius:4px; margin-bottom:16px;">
+            <div style="padding:16px; background:#f9f9f9; border-left:4px solid {gold}; border-radius:4px; margin-bottom:16px;">
               <p style="margin:0 0 6px; font-size:11px; color:#999; text-transform:uppercase; letter-spacing:1px;">Lien de secours</p>
-              <a href="{link}" style="font-size:12px; color:{GOLD}; word-break:break-all;">{link}</a>
+              <a href="{link}" style="font-size:12px; color:{gold}; word-break:break-all;">{link}</a>
             </div>
             <p style="margin:0; font-size:12px; color:#aaa; line-height:1.6;">
               Si vous n'avez pas demandé la création de ce compte, ignorez cet email.
             </p>
           </td>
         </tr>
-        <tr><td>{EMAIL_FOOTER}</td></tr>
+        <tr><td>{footer}</td></tr>
       </table>
     </td></tr>
   </table>
 </body></html>"""
-    msg = MIMEText(html, "html", "utf-8")
-    msg["Subject"] = "Bienvenue dans votre espace client – Renovia Pro"
-    msg["From"] = SMTP_FROM or "noreply@renoviapro.fr"
-    msg["To"] = to
-    try:
-        port = int(SMTP_PORT)
-        print(f"[EMAIL] Envoi welcome à {to}")
-        if port == 465:
-            with smtplib.SMTP_SSL(SMTP_HOST, port, timeout=15) as s:
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        else:
-            with smtplib.SMTP(SMTP_HOST, port, timeout=15) as s:
-                s.starttls()
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        print(f"[EMAIL] OK welcome envoyé à {to}")
-        return True
-    except Exception as e:
-        print(f"[EMAIL] ERREUR: {e}")
-        return False
-
 
-def send_reset_password_email(to: str, link: str) -> bool:
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print("[EMAIL] SMTP non configuré, skip reset password")
-        return False
-    html = f"""<!DOCTYPE html>
+_RESET_PASSWORD_HTML = """<!DOCTYPE html>
 <html lang="fr">
 <head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1"></head>
 <body style="margin:0; padding:0; background:#f9f9f9; font-family:'Helvetica Neue',Arial,sans-serif;">
   <table width="100%" cellpadding="0" cellspacing="0" style="background:#f9f9f9; padding:32px 16px;">
     <tr><td align="center">
       <table width="100%" style="max-width:560px; background:#fff; border-radius:12px; overflow:hidden; box-shadow:0 4px 24px rgba(0,0,0,0.08);">
-        <tr><td>{EMAIL_HEADER}</td></tr>
+        <tr><td>{header}</td></tr>
         <tr>
           <td style="padding:36px 32px;">
             <h2 style="margin:0 0 16px; font-size:22px; color:#111;">Réinitialisation de votre mot de passe</h2>
@@ -165,99 +156,159 @@ def send_reset_password_email(to: str, link: str) -> bool:
               Cliquez sur le bouton ci-dessous — ce lien est <strong style="color:#000;">valable 15 minutes</strong>.
             </p>
             <div style="margin:0 0 28px; text-align:center;">
-              <a href="{link}" style="display:inline-block; background:{GOLD}; color:#000; padding:14px 40px; border-radius:40px; text-decoration:none; font-weight:700; font-size:16px; letter-spacing:0.5px;">
+              <a href="{link}" style="display:inline-block; background:{gold}; color:#000; padding:14px 40px; border-radius:40px; text-decoration:none; font-weight:700; font-size:16px; letter-spacing:0.5px;">
                 Réinitialiser mon mot de passe
               </a>
             </div>
-            <div style="padding:16px; background:#f9f9f9; border-left:4px solid {GOLD}; border-radius:4px; margin-bottom:16px;">
+            <div style="padding:16px; background:#f9f9f9; border-left:4px solid {gold}; border-radius:4px; margin-bottom:16px;">
               <p style="margin:0 0 6px; font-size:11px; color:#999; text-transform:uppercase; letter-spacing:1px;">Lien de secours</p>
-              <a href="{link}" style="font-size:12px; color:{GOLD}; word-break:break-all;">{link}</a>
+              <a href="{link}" style="font-size:12px; color:{gold}; word-break:break-all;">{link}</a>
             </div>
             <p style="margin:0; font-size:12px; color:#aaa; line-height:1.6;">
               Si vous n'avez pas demandé cette réinitialisation, ignorez cet email. Votre mot de passe reste inchangé.
             </p>
           </td>
         </tr>
-        <tr><td>{EMAIL_FOOTER}</td></tr>
+        <tr><td>{footer}</td></tr>
       </table>
     </td></tr>
   </table>
 </body></html>"""
-    msg = MIMEText(html, "html", "utf-8")
-    msg["Subject"] = "Réinitialisation de votre mot de passe – Renovia Pro"
-    msg["From"] = SMTP_FROM or "noreply@renoviapro.fr"
-    msg["To"] = to
-    try:
-        port = int(SMTP_PORT)
-        print(f"[EMAIL] Envoi reset password à {to}")
-        if port == 465:
-            with smtplib.SMTP_SSL(SMTP_HOST, port, timeout=15) as s:
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        else:
-            with smtplib.SMTP(SMTP_HOST, port, timeout=15) as s:
-                s.starttls()
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        print(f"[EMAIL] OK reset password envoyé à {to}")
-        return True
-    except Exception as e:
-        print(f"[EMAIL] ERREUR: {e}")
-        return False
 
+MAGIC_LINK = EmailTemplate(
+    subject="Connexion à votre espace client – Renovia Pro",
+    sender=_FROM,
+    constants=_CONSTANTS,
+    html=_MAGIC_LINK_HTML,
+    text="""Bonjour,
 
-def send_internal_notification(subject: str, html_content: str) -> bool:
-    """Envoie une notification interne à l'adresse Renovia Pro (contact@renoviapro.fr)."""
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print("[EMAIL] SMTP non configuré, skip notification interne")
-        return False
-    to = "contact@renoviapro.fr"
-    msg = MIMEText(html_content, "html", "utf-8")
-    msg["Subject"] = subject
-    msg["From"] = SMTP_FROM or "noreply@renoviapro.fr"
-    msg["To"] = to
+Cliquez sur le lien ci-dessous pour vous connecter à votre espace client Renovia Pro.
+Ce lien est valable 15 minutes et ne peut être utilisé qu'une seule fois.
+
+{link}
+
+Si vous n'avez pas demandé cette connexion, ignorez cet email.
+""" + _TEXT_FOOTER,
+)
+
+WELCOME = EmailTemplate(
+    subject="Bienvenue dans votre espace client – Renovia Pro",
+    sender=_FROM,
+    constants=_CONSTANTS,
+    html=_WELCOME_HTML,
+    text="""Bienvenue chez Renovia Pro !
+
+Bonjour,
+
+Nous avons créé votre espace client Renovia Pro avec l'adresse {to}.
+Cliquez sur le lien ci-dessous pour accéder à votre espace et compléter votre profil.
+Ce lien est valable 15 minutes.
+
+{link}
+
+Si vous n'avez pas demandé la création de ce compte, ignorez cet email.
+""" + _TEXT_FOOTER,
+)
+
+RESET_PASSWORD = EmailTemplate(
+    subject="Réinitialisation de votre mot de passe – Renovia Pro",
+    sender=_FROM,
+    constants=_CONSTANTS,
+    html=_RESET_PASSWORD_HTML,
+    text="""Bonjour,
+
+Vous avez demandé à réinitialiser votre mot de passe.
+Cliquez sur le lien ci-dessous — ce lien est valable 15 minutes.
+
+{link}
+
+Si vous n'avez pas demandé cette réinitialisation, ignorez cet email. Votre mot de passe reste inchangé.
+""" + _TEXT_FOOTER,
+)
+
+# Contenu HTML libre (notifications internes) : sujet et corps fournis à l'envoi ;
+# texte brut tiré du HTML si `text` n'est pas fourni (voir render).
+RAW = EmailTemplate(subject="{subject}", sender=_FROM, html="{content!s}", text="{text}")
+
+TEMPLATES: dict[str, EmailTemplate] = {
+    "magic_link": MAGIC_LINK,
+    "welcome": WELCOME,
+    "reset_password": RESET_PASSWORD,
+    "raw": RAW,
+}
+
+
+def render(template: str, to: str, params: dict) -> bytes:
+    if template == "raw" and not params.get("text"):
+        params = {**params, "text": html_to_text(params.get("content", ""))}
+    return TEMPLATES[template].render(to, params)
+
+
+def smtp_configured() -> bool:
+    return bool(SMTP_USER and SMTP_PASSWORD) or SMTP_SECURITY == "none"
+
+
+def open_smtp(timeout: float = 15) -> smtplib.SMTP:
+    """Ouvre une session SMTP authentifiée (ssl / starttls / none pour un sink local)."""
+    port = int(SMTP_PORT)
+    if SMTP_SECURITY == "ssl":
+        s = smtplib.SMTP_SSL(SMTP_HOST, port, timeout=timeout)
+    else:
+        s = smtplib.SMTP(SMTP_HOST, port, timeout=timeout)
     try:
-        port = int(SMTP_PORT)
-        if port == 465:
-            with smtplib.SMTP_SSL(SMTP_HOST, port, timeout=15) as s:
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        else:
-            with smtplib.SMTP(SMTP_HOST, port, timeout=15) as s:
-                s.starttls()
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        print(f"[EMAIL] Notification interne envoyée : {subject}")
-        return True
-    except Exception as e:
-        print(f"[EMAIL] ERREUR notification interne: {e}")
-        return False
+        if SMTP_SECURITY == "starttls":
+            s.starttls()
+        if SMTP_USER and SMTP_PASSWORD:
+            s.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        s.close()
+        raise
+    return s
 
 
-def send_magic_link_email(to: str, link: str) -> bool:
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print("[EMAIL] SMTP non configuré (SMTP_USER/SMTP_PASSWORD ou SMTP_PASS), skip magic link")
-        return False
-    subject = "Connexion à votre espace client – Renovia Pro"
-    body = _magic_link_html(link)
-    msg = MIMEText(body, "html", "utf-8")
-    msg["Subject"] = subject
-    msg["From"] = SMTP_FROM or "noreply@renoviapro.fr"
-    msg["To"] = to
+smtp_pool = SmtpPool(open_smtp, size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT_SECONDS)
+
+
+def deliver_many(
+    items: list[tuple[str, str, dict]], before_send: Callable[[], bool] | None = None,
+) -> list[Exception | None]:
+    """Envoi SMTP bloquant de (to, template, params) sur une session du pool. Erreur par message."""
+    if not smtp_configured():
+        err = RuntimeError("SMTP non configuré")
+        return [err] * len(items)
+    messages = [(_FROM, [to], render(template, to, params)) for to, template, params in items]
+    return smtp_pool.send_many(messages, before_send)
+
+
+def deliver(to: str, template: str, params: dict) -> None:
+    """Envoi SMTP bloquant d'un seul message. Lève une exception en cas d'échec."""
+    err = deliver_many([(to, template, params)])[0]
+    if err is not None:
+        raise err
+
+
+def _send(to: str, template: str, params: dict) -> bool:
     try:
-        port = int(SMTP_PORT)
-        print(f"[EMAIL] Envoi magic link à {to} via {SMTP_HOST}:{port}")
-        if port == 465:
-            with smtplib.SMTP_SSL(SMTP_HOST, port, timeout=15) as s:
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        else:
-            with smtplib.SMTP(SMTP_HOST, port, timeout=15) as s:
-                s.starttls()
-                s.login(SMTP_USER, SMTP_PASSWORD)
-                s.sendmail(msg["From"], [to], msg.as_string())
-        print(f"[EMAIL] OK magic link envoyé à {to}")
+        deliver(to, template, params)
+        print(f"[EMAIL] OK {template} envoyé à {to}")
         return True
     except Exception as e:
         print(f"[EMAIL] ERREUR SMTP: {type(e).__name__}: {e}")
         return False
+
+
+def send_welcome_email(to: str, link: str) -> bool:
+    return _send(to, "welcome", {"to": to, "link": link})
+
+
+def send_reset_password_email(to: str, link: str) -> bool:
+    return _send(to, "reset_password", {"link": link})
+
+
+def send_magic_link_email(to: str, link: str) -> bool:
+    return _send(to, "magic_link", {"link": link})
+
+
+def send_internal_notification(subject: str, html_content: str) -> bool:
+    """Envoie une notification interne à l'adresse Renovia Pro (contact@renoviapro.fr)."""
+    return _send("contact@renoviapro.fr", "raw", {"subject": subject, "content": html_content})
@@ -0,0 +1,128 @@
+"""
+Templates email précompilés.
+
+Chaque template (sujet, HTML, texte brut) est découpé une seule fois, au chargement,
+en segments statiques (constantes déjà résolues) et en emplacements `{nom}`. Le
+rendu d'un message joint segments et valeurs échappées puis encode chaque corps
+d'un seul tenant en quoted-printable (CRLF, lignes de 76 caractères au plus,
+RFC 2045) : pas de MIMEText ni de multipart construit par envoi.
+
+Syntaxe : `{nom}` est échappé en HTML, `{nom!s}` est inséré tel quel (contenu HTML
+déjà sûr). Les `constants` (header, footer, couleurs…) sont résolues à la compilation.
+"""
+from __future__ import annotations
+import html as _html
+import re
+import uuid
+from email import quoprimime
+from email.header import Header
+from email.utils import formatdate
+from functools import lru_cache
+from string import Formatter
+
+CRLF = "\r\n"
+
+
+def _qp(text: str) -> bytes:
+    """Quoted-printable UTF-8, fins de ligne CRLF. Corps entier : les coupures douces
+    dépendent de la colonne, deux encodages concaténés ne respectent plus 76 caractères."""
+    return quoprimime.body_encode(text.encode("utf-8").decode("latin-1"), eol=CRLF).encode("ascii")
+
+
+_BLOCK_END = re.compile(r"<br\s*/?>|</(?:p|div|tr|h[1-6]|li|table)\s*>", re.I)
+_TAG = re.compile(r"<[^>]+>")
+_STYLE = re.compile(r"<(style|script)\b.*?</\1\s*>", re.I | re.S)
+
+
+def html_to_text(html: str) -> str:
+    """Version texte brut d'un contenu HTML (partie text/plain des emails libres)."""
+    text = _STYLE.sub("", html)
+    text = _BLOCK_END.sub("\n", text)
+    text = _html.unescape(_TAG.sub("", text))
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip() + "\n"
+
+
+@lru_cache(maxsize=256)
+def _header(value: str) -> str:
+    return value if value.isascii() else Header(value, "utf-8").encode(linesep=CRLF)
+
+
+class _Defaults(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+class _Part:
+    """Un corps compilé : segments statiques + emplacements (nom, échappement)."""
+
+    def __init__(self, src: str, constants: dict[str, str], escape: bool):
+        self.segments: list[str | tuple[str, bool]] = []
+        pending = ""
+        for literal, field, _spec, conversion in Formatter().parse(src):
+            pending += literal
+            if field is None:
+                continue
+            if field in constants:
+                pending += constants[field]
+                continue
+            if pending:
+                self.segments.append(pending)
+                pending = ""
+            self.segments.append((field, escape and conversion != "s"))
+        if pending:
+            self.segments.append(pending)
+        self.slots = {seg[0] for seg in self.segments if isinstance(seg, tuple)}
+
+    def render(self, params: dict[str, str], out: list[bytes]) -> None:
+        parts = []
+        for seg in self.segments:
+            if isinstance(seg, str):
+                parts.append(seg)
+            else:
+                name, escape = seg
+                value = str(params.get(name, ""))
+                parts.append(_html.escape(value) if escape else value)
+        out.append(_qp("".join(parts)))
+
+
+class EmailTemplate:
+    def __init__(self, subject: str, html: str, text: str, sender: str, constants: dict[str, str] | None = None):
+        constants = constants or {}
+        self.subject = subject
+        self.sender = sender
+        self.html = _Part(html, constants, escape=True)
+        self.text = _Part(text, constants, escape=False)
+        self.boundary = f"=_rp_{uuid.uuid4().hex}"  # "=" jamais présent tel quel en QP
+        self._domain = sender.rsplit("@", 1)[-1]
+        self._preamble = CRLF.join([
+            "MIME-Version: 1.0",
+            f'Content-Type: multipart/alternative; boundary="{self.boundary}"',
+            f"From: {_header(sender)}",
+        ]).encode("ascii") + b"\r\n"
+        part = 'Content-Type: text/{}; charset="utf-8"\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n'
+        self._text_head = f"\r\n--{self.boundary}\r\n{part.format('plain')}".encode("ascii")
+        self._html_head = f"\r\n--{self.boundary}\r\n{part.format('html')}".encode("ascii")
+        self._end = f"\r\n--{self.boundary}--\r\n".encode("ascii")
+
+    def render_subject(self, params: dict[str, str]) -> str:
+        return self.subject.format_map(_Defaults(params)) if "{" in self.subject else self.subject
+
+    def render(self, to: str, params: dict[str, str]) -> bytes:
+        """Message RFC 5322 complet, prêt pour smtplib.sendmail."""
+        out = [
+            self._preamble,
+            (
+                f"To: {_header(to)}\r\n"
+                f"Subject: {_header(self.render_subject(params))}\r\n"
+                f"Date: {formatdate(localtime=False)}\r\n"
+                f"Message-ID: <{uuid.uuid4().hex}@{self._domain}>\r\n"
+            ).encode("ascii"),
+            self._text_head,
+        ]
+        self.text.render(params, out)
+        out.append(self._html_head)
+        self.html.render(params, out)
+        out.append(self._end)
+        return b"".join(out)
+
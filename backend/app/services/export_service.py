@@ -0,0 +1,189 @@
+"""
+Export de l'historique d'un client (tickets, messages, documents) en NDJSON ou CSV.
+
+Tout est produit par générateurs asynchrones : les tickets et messages sont lus
+par curseur Mongo (lots de `_BATCH` documents) et les documents compta/DF sont
+fusionnés au fil de l'eau par date décroissante. StreamingResponse ne demande la
+ligne suivante qu'une fois la précédente envoyée, donc un client lent freine la
+lecture Mongo au lieu de faire grossir un tampon en mémoire.
+
+Une erreur compta / DF (les connecteurs renvoient alors une liste vide) ajoute
+un enregistrement `error` par source en fin de fichier : un export incomplet ne
+passe pas pour complet. En CSV, les cellules qui commencent par `=`, `+`, `-`,
+`@`, tabulation ou retour chariot sont préfixées d'une apostrophe (pas de
+formule exécutée à l'ouverture dans Excel).
+"""
+from __future__ import annotations
+import asyncio
+import csv
+import heapq
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from app.connectors import failures
+from app.connectors.compta_connector import get_documents_for_client as compta_docs
+from app.connectors.df_connector import document_fields, get_maintenance_invoices_for_client, iter_client_documents
+from app.services.bulkhead import background
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+_BATCH = 200
+_CHUNK_BYTES = 32 * 1024  # regroupe les petites lignes en écritures réseau raisonnables
+
+CSV_COLUMNS = [
+    "record", "id", "ticket_id", "type", "date", "status", "label", "body", "resolution", "from_client", "amount", "url",
+]
+
+
+def _iso(value) -> str | None:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value) if value else None
+
+
+async def _tickets(db, client_id: str) -> AsyncIterator[dict]:
+    cursor = db.tickets_sav.find(
+        {"client_id": client_id},
+        {"subject": 1, "description": 1, "status": 1, "resolution": 1, "created_at": 1, "messages": 1},
+    ).sort([("created_at", -1), ("_id", -1)]).batch_size(_BATCH)
+    async for t in cursor:
+        yield {
+            "record": "ticket",
+            "id": str(t["_id"]),
+            "date": _iso(t.get("created_at")),
+            "status": t.get("status"),
+            "label": t.get("subject"),
+            "body": t.get("description"),
+            "resolution": t.get("resolution"),
+        }
+        # Messages pas encore migrés vers ticket_messages
+        for m in t.get("messages") or []:
+            yield {
+                "record": "message",
+                "ticket_id": str(t["_id"]),
+                "date": _iso(m.get("created_at")),
+                "body": m.get("body"),
+                "from_client": bool(m.get("from_client")),
+            }
+
+
+async def _messages(db, client_id: str) -> AsyncIterator[dict]:
+    cursor = db.ticket_messages.find(
+        {"client_id": client_id}, {"ticket_id": 1, "body": 1, "from_client": 1, "created_at": 1},
+    ).batch_size(_BATCH)
+    async for m in cursor:
+        yield {
+            "record": "message",
+            "id": str(m["_id"]),
+            "ticket_id": str(m["ticket_id"]),
+            "date": _iso(m.get("created_at")),
+            "body": m.get("body"),
+            "from_client": bool(m.get("from_client")),
+        }
+
+
+async def _df_documents(email: str) -> list[dict]:
+    # Pages DF brutes, sans document_item() : l'export ne crée aucun lien signature / paiement
+    docs = [document_fields(d) async for d in iter_client_documents(email)]
+    return docs + await get_maintenance_invoices_for_client(email)
+
+
+async def _fetch_documents(email: str) -> tuple[list[dict], list[dict], list[tuple[str, str]]]:
+    # Export : tâche de fond vis-à-vis de compta/DF, passe après les lectures interactives
+    with background(), failures.collect() as errors:
+        compta, df = await asyncio.gather(compta_docs(email), _df_documents(email))
+    return compta, df, errors
+
+
+async def _documents(fetch: asyncio.Task) -> AsyncIterator[dict]:
+    compta, df, errors = await fetch
+    key = lambda d: d.get("date") or ""  # noqa: E731
+    # Listes potentiellement partagées (cache des connecteurs) : copies triées
+    compta = sorted(compta, key=key, reverse=True)
+    df = sorted(df, key=key, reverse=True)
+    for d in heapq.merge(compta, df, key=key, reverse=True):
+        yield {
+            "record": "document",
+            "id": d.get("id"),
+            "date": d.get("date"),
+            "status": d.get("status"),
+            "label": d.get("label"),
+            "type": d.get("type"),
+            "amount": d.get("total_ttc"),
+            "url": d.get("url"),
+        }
+    reported = {}
+    for source, detail in errors:
+        reported.setdefault(source, detail)
+    for source, detail in reported.items():
+        yield {
+            "record": "error",
+            "type": source,
+            "status": "incomplete",
+            "label": f"Documents {source} indisponibles, export incomplet",
+            "body": detail,
+        }
+
+
+async def iter_records(db, client_id: str, email: str) -> AsyncIterator[dict]:
+    """Tickets (plus récents d'abord), messages, puis documents."""
+    # Les appels compta/DF partent tout de suite et se recouvrent avec la lecture Mongo.
+    fetch = asyncio.create_task(_fetch_documents(email))
+    try:
+        async for r in _tickets(db, client_id):
+            yield r
+        async for r in _messages(db, client_id):
+            yield r
+        async for r in _documents(fetch):
+            yield r
+    finally:
+        fetch.cancel()
+
+
+async def _chunked(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    buf: list[str] = []
+    size = 0
+    async for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= _CHUNK_BYTES:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode()
+
+
+async def _ndjson_lines(records: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for r in records:
+        yield json.dumps(r, ensure_ascii=False, default=str) + "\n"
+
+
+_FORMULA_START = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _cell(value):
+    # Texte saisi par le client : jamais interprété comme formule par le tableur
+    if isinstance(value, str) and value.startswith(_FORMULA_START):
+        return "'" + value
+    return value
+
+
+async def _csv_lines(records: AsyncIterator[dict]) -> AsyncIterator[str]:
+    # BOM + `;` : ouverture directe dans Excel (réglages français)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, CSV_COLUMNS, delimiter=";", extrasaction="ignore")
+    writer.writeheader()
+    yield "\ufeff" + out.getvalue()
+    async for r in records:
+        out.seek(0)
+        out.truncate()
+        writer.writerow({k: _cell(v) for k, v in r.items()})
+        yield out.getvalue()
+
+
+def export_stream(db, client_id: str, email: str, fmt: str) -> AsyncIterator[bytes]:
+    records = iter_records(db, client_id, email)
+    lines = _csv_lines(records) if fmt == "csv" else _ndjson_lines(records)
+    return _chunked(lines)
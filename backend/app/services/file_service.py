@@ -1,34 +1,112 @@
+import asyncio
+import hashlib
+import os
 import uuid
 from pathlib import Path
 from fastapi import UploadFile
-from app.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, MAX_TICKET_FILES
+from app.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, MAX_TICKET_FILES, UPLOAD_CONCURRENCY
+from app.services.attachment_store import put_blob
 
 MB = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
 ALLOWED = {"jpg", "jpeg", "png", "webp", "heic", "pdf"}
 
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+class UploadRejected(Exception):
+    """Pièce jointe refusée ; le message est destiné au client."""
+
 def ensure_upload_dir() -> Path:
     d = Path(UPLOAD_DIR)
     d.mkdir(parents=True, exist_ok=True)
     return d
 
-def _ext(name: str) -> str:
+def file_ext(name: str) -> str:
+    """Extension en minuscules du nom de fichier ("" sans extension)."""
     return name.rsplit(".", 1)[-1].lower() if "." in name else ""
 
 def allowed_file(filename: str) -> bool:
-    return _ext(filename) in ALLOWED
+    return file_ext(filename) in ALLOWED
 
-async def save_ticket_file(file: UploadFile, subdir: str = "tickets") -> str | None:
-    if not file.filename or not allowed_file(file.filename):
-        return None
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE_MB * MB:
-        return None
-    base = ensure_upload_dir()
-    folder = base / subdir
+def sniff_kind(head: bytes) -> str | None:
+    """Type réel du fichier d'après ses premiers octets (magic bytes)."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIF_BRANDS:
+        return "heic"
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    return None
+
+def _open_tmp(folder: Path) -> tuple[Path, object]:
     folder.mkdir(parents=True, exist_ok=True)
-    ext = _ext(file.filename)
-    fname = f"{uuid.uuid4().hex}.{ext}"
-    path = folder / fname
-    with open(path, "wb") as f:
-        f.write(content)
-    return f"{subdir}/{fname}"
+    tmp = folder / f".{uuid.uuid4().hex}.part"
+    return tmp, open(tmp, "wb")
+
+def _discard(fh, tmp: Path) -> None:
+    fh.close()
+    tmp.unlink(missing_ok=True)
+
+def _write(fh, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    fh.write(chunk)
+
+def _close(fh) -> None:
+    fh.flush()
+    os.fsync(fh.fileno())
+    fh.close()
+
+async def save_ticket_file(file: UploadFile, subdir: str = "tickets") -> str:
+    """Enregistre la pièce jointe par morceaux dans le store adressé par contenu.
+
+    Le fichier est écrit dans un temporaire (SHA-256 calculé au fil de l'eau) puis
+    rangé sous son empreinte : un contenu déjà connu n'est pas stocké deux fois.
+    Lève UploadRejected dès que MAX_FILE_SIZE_MB est dépassé ou si la signature ne
+    correspond pas à un type autorisé. Les accès disque sont faits hors de la boucle.
+    Le formulaire est déjà reçu à ce stade : le volume total de la requête est
+    borné avant lecture par BodyLimitMiddleware.
+    """
+    if not file.filename or not allowed_file(file.filename):
+        raise UploadRejected("Type de fichier non autorisé.")
+    first = await file.read(CHUNK_SIZE)
+    kind = sniff_kind(first)
+    if not kind:
+        raise UploadRejected("Contenu non reconnu (JPEG, PNG, WebP, HEIC ou PDF attendu).")
+    max_bytes = MAX_FILE_SIZE_MB * MB
+    tmp, fh = await asyncio.to_thread(_open_tmp, ensure_upload_dir() / subdir)
+    digest = hashlib.sha256()
+    size = 0
+    chunk = first
+    try:
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejected(f"Fichier trop volumineux (max {MAX_FILE_SIZE_MB} Mo).")
+            await asyncio.to_thread(_write, fh, digest, chunk)
+            chunk = await file.read(CHUNK_SIZE)
+        await asyncio.to_thread(_close, fh)
+        return await put_blob(tmp, digest.hexdigest(), kind, size)
+    except BaseException:
+        await asyncio.to_thread(_discard, fh, tmp)
+        raise
+
+async def save_ticket_files(files: list[UploadFile], subdir: str = "tickets") -> list[dict]:
+    """Traite les pièces jointes en parallèle (UPLOAD_CONCURRENCY au plus), dans l'ordre reçu.
+
+    Retourne un résultat par fichier : {filename, accepted, path, reason}.
+    """
+    sem = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def one(f: UploadFile) -> dict:
+        async with sem:
+            try:
+                path = await save_ticket_file(f, subdir)
+            except UploadRejected as exc:
+                return {"filename": f.filename, "accepted": False, "path": None, "reason": str(exc)}
+        return {"filename": f.filename, "accepted": True, "path": path, "reason": None}
+
+    return await asyncio.gather(*(one(f) for f in files))
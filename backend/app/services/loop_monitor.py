@@ -0,0 +1,143 @@
+"""
+Surveillance de la boucle asyncio : retard (lag) et appels bloquants.
+
+- `LagSampler` : une tâche dort LOOP_LAG_INTERVAL_SECONDS et mesure le retard de
+  son réveil (`event_loop_lag_seconds`). Activé par LOOP_LAG_MONITOR.
+- `BlockingDetector` : la boucle met à jour un battement ; un thread de garde
+  vérifie toutes les N/4 ms qu'il avance. Si la boucle ne bat plus depuis N ms,
+  la pile du thread de la boucle est capturée pendant le blocage (le code
+  fautif y est encore) : log, compteur `event_loop_blocked`, `blocking_events()`.
+  Activé par LOOP_BLOCK_DETECTOR (par défaut en DEBUG).
+
+Dans un test : `async with assert_non_blocking(50): await client.get(...)`
+lève AssertionError avec la pile si la boucle a été bloquée plus de 50 ms.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.config import LOOP_BLOCK_DETECTOR, LOOP_BLOCK_THRESHOLD_MS, LOOP_LAG_INTERVAL_SECONDS, LOOP_LAG_MONITOR
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+_events: deque[dict] = deque(maxlen=20)
+
+
+def blocking_events() -> list[dict]:
+    """Derniers blocages détectés (les plus récents en dernier)."""
+    return list(_events)
+
+
+class LagSampler:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - t0 - self.interval, 0.0)
+            metrics.observe("event_loop_lag_seconds", lag)
+            metrics.set_gauge("event_loop_lag_last_seconds", lag)
+
+
+class BlockingDetector:
+    def __init__(self, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS) -> None:
+        self.threshold = threshold_ms / 1000
+        self.events: list[dict] = []
+        self._beat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-block-detector", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reported:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=25)) if frame else ""
+            event = {"at": time.time(), "blocked_ms": round(stalled * 1000), "stack": stack}
+            self.events.append(event)
+            _events.append(event)
+            metrics.incr("event_loop_blocked")
+            log.warning("[loop] boucle bloquée depuis %.0f ms :\n%s", stalled * 1000, stack)
+
+
+sampler = LagSampler()
+detector = BlockingDetector()
+
+
+def start() -> None:
+    if LOOP_LAG_MONITOR:
+        sampler.start()
+    if LOOP_BLOCK_DETECTOR:
+        detector.start()
+
+
+async def stop() -> None:
+    await sampler.stop()
+    await detector.stop()
+
+
+@asynccontextmanager
+async def assert_non_blocking(threshold_ms: float = 50) -> AsyncIterator[BlockingDetector]:
+    """Échoue si la boucle est bloquée plus de `threshold_ms` pendant le bloc (tests)."""
+    det = BlockingDetector(threshold_ms)
+    det.start()
+    try:
+        yield det
+    finally:
+        await det.stop()
+    if det.events:
+        first = det.events[0]
+        raise AssertionError(f"boucle bloquée {first['blocked_ms']} ms :\n{first['stack']}")
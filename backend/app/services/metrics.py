@@ -0,0 +1,47 @@
+"""Compteurs et mesures en mémoire (par worker), exposés sur /api/v1/internal/metrics."""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters: dict[str, float] = defaultdict(float)
+_gauges: dict[str, float] = {}
+_timings: dict[str, dict[str, float]] = {}
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Agrège une mesure (count / sum / max), typiquement une durée en secondes."""
+    key = _key(name, labels)
+    with _lock:
+        t = _timings.get(key)
+        if t is None:
+            _timings[key] = {"count": 1, "sum": value, "max": value}
+        else:
+            t["count"] += 1
+            t["sum"] += value
+            if value > t["max"]:
+                t["max"] = value
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {k: dict(v) for k, v in _timings.items()},
+        }
@@ -0,0 +1,73 @@
+"""
+Préchargement des caches connecteurs juste après la connexion.
+
+`/auth/verify` et `/auth/login` appellent `schedule(email)` : pendant que le SPA
+charge, chantiers, documents compta, première page des documents DF, factures de
+maintenance, contrats et identifiant client DF sont lus en tâche de fond
+(priorité basse des cloisons amont) et restent en cache
+CONNECTOR_CACHE_TTL_SECONDS ; le premier écran est servi à chaud.
+
+Un préchargement par email à la fois, PREFETCH_CONCURRENCY en parallèle au plus,
+rien si le cache est déjà chaud (vérifié à la planification puis au démarrage).
+"""
+import asyncio
+import logging
+
+from app.config import PREFETCH_CONCURRENCY, PREFETCH_MAX_PENDING
+from app.connectors import compta_connector, df_connector
+from app.services import metrics
+from app.services.bulkhead import background
+
+log = logging.getLogger(__name__)
+
+_LOADERS = (
+    compta_connector.get_chantiers_for_client,
+    compta_connector.get_documents_for_client,
+    df_connector.get_maintenance_invoices_for_client,
+    df_connector.get_all_contracts_for_client,
+)
+
+_pending: dict[str, asyncio.Task] = {}
+_slots = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+
+def _warm(email: str) -> bool:
+    return all(fn.cache.fresh((email,)) for fn in _LOADERS) and df_connector.document_page_warm(email)
+
+
+def schedule(email: str) -> None:
+    """Planifie le préchargement des données de `email` (sans attendre)."""
+    if email in _pending:
+        metrics.incr("prefetch", status="deduplicated")
+        return
+    if _warm(email):
+        metrics.incr("prefetch", status="warm")
+        return
+    if len(_pending) >= PREFETCH_MAX_PENDING:
+        metrics.incr("prefetch", status="dropped")
+        return
+    task = asyncio.create_task(_run(email))
+    _pending[email] = task
+    task.add_done_callback(lambda _: _pending.pop(email, None))
+
+
+async def _run(email: str) -> None:
+    async with _slots:
+        if _warm(email):
+            metrics.incr("prefetch", status="warm")
+            return
+        with background():
+            results = await asyncio.gather(
+                *(fn(email) for fn in _LOADERS), df_connector.warm_document_page(email), return_exceptions=True,
+            )
+    for r in results:
+        if isinstance(r, Exception):
+            log.warning("[prefetch] %s : %s", email, r)
+    metrics.incr("prefetch", status="done")
+
+
+async def stop() -> None:
+    tasks = list(_pending.values())
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,222 @@
+"""
+Profilage à la demande d'une requête (administrateurs, PROFILING_ENABLED=1).
+
+Une requête portant `X-Profile: 1` et le JWT d'un email de ADMIN_EMAILS est
+exécutée normalement pendant qu'un thread échantillonne la pile du thread de la
+boucle toutes les PROFILE_SAMPLE_INTERVAL_MS. La réponse porte `X-Profile-Id` ;
+le rapport (piles repliées pour flamegraph.pl / speedscope, poids en µs ;
+temps propre et total par fonction) est gardé PROFILE_RETENTION_HOURS dans
+`request_profiles` (index TTL).
+
+Seule la requête profilée est échantillonnée : sa tâche et les tâches qu'elle crée
+(fabrique de tâches de la boucle, contexte `_active`). La fabrique n'est installée
+que tant qu'un profil est en cours, l'ancienne est remise ensuite. Le temps pendant lequel la
+boucle exécute d'autres requêtes est compté à part (`other_tasks_ms`) ; l'attente
+d'E/S apparaît comme « (boucle inactive) ».
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import secrets
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from bson import ObjectId
+
+from app.config import ADMIN_EMAILS, PROFILE_SAMPLE_INTERVAL_MS
+from app.db import get_db
+from app.services.auth_service import decode_token
+
+log = logging.getLogger(__name__)
+
+IDLE = "(boucle inactive)"
+_MAX_STACKS = 1000  # piles distinctes gardées par rapport (les plus fréquentes)
+_MAX_DEPTH = 64
+_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename
+    if path.startswith(_ROOT):
+        path = path[len(_ROOT) + 1:]
+    else:
+        path = Path(path).name
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _idle(frame) -> bool:
+    return frame.f_code.co_name == "select" and frame.f_code.co_filename.endswith("selectors.py")
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < _MAX_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+_active: ContextVar["StackSampler | None"] = ContextVar("profiled_request", default=None)
+
+
+def _task_factory(parent):
+    def factory(loop, coro, **kwargs):
+        task = parent(loop, coro, **kwargs) if parent else asyncio.Task(coro, loop=loop, **kwargs)
+        sampler = _active.get()  # contexte de l'appelant de create_task
+        if sampler is not None:
+            sampler.tasks.add(task)
+        return task
+    factory.profiler = True
+    return factory
+
+
+# Boucle → (fabrique d'origine, profils en cours)
+_installed: dict[asyncio.AbstractEventLoop, tuple[object, int]] = {}
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    previous, active = _installed.get(loop, (None, 0))
+    if not active:
+        previous = loop.get_task_factory()
+        loop.set_task_factory(_task_factory(previous))
+    _installed[loop] = (previous, active + 1)
+
+
+def _uninstall_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    previous, active = _installed.pop(loop)
+    if active > 1:
+        _installed[loop] = (previous, active - 1)
+    elif getattr(loop.get_task_factory(), "profiler", False):
+        loop.set_task_factory(previous)
+    else:
+        # Fabrique remplacée entre-temps par un tiers qui enveloppe la nôtre : laissée en place
+        log.warning("[profile] fabrique de tâches remplacée, non restaurée")
+
+
+class StackSampler:
+    """Échantillonne la pile du thread de la boucle quand une tâche de la requête s'y exécute.
+
+    À créer et démarrer depuis la tâche de la requête.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS) -> None:
+        self.interval = interval_ms / 1000
+        self.counts: Counter[str] = Counter()
+        self.other_us = 0
+        self.samples = 0
+        self.tasks: weakref.WeakSet[asyncio.Task] = weakref.WeakSet()
+        self._loop = asyncio.get_running_loop()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        _install_task_factory(self._loop)
+        self.tasks.add(asyncio.current_task())
+        self._token = _active.set(self)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        _active.reset(self._token)
+        _uninstall_task_factory(self._loop)
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join)
+
+    def _run(self) -> None:
+        # Chaque échantillon pèse le temps réel écoulé depuis le précédent (en µs) :
+        # sous le GIL, le thread peut se réveiller bien après `interval`.
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            task = asyncio.current_task(self._loop)
+            now = time.perf_counter()
+            us = round((now - last) * 1e6)
+            last = now
+            if frame is None:
+                continue
+            if task is not None and task in self.tasks:
+                self.counts[_fold(frame)] += us
+                self.samples += 1
+            elif task is None and _idle(frame):
+                self.counts[IDLE] += us
+                self.samples += 1
+            else:
+                # Autre requête, ou rappel hors tâche (transport) : pas dans ce profil
+                self.other_us += us
+
+    def report(self) -> dict:
+        self_time: Counter[str] = Counter()
+        total_time: Counter[str] = Counter()
+        for stack, us in self.counts.items():
+            frames = stack.split(";")
+            self_time[frames[-1]] += us
+            for f in set(frames):
+                total_time[f] += us
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            # Boucle occupée par d'autres requêtes du worker pendant celle-ci
+            "other_tasks_ms": round(self.other_us / 1000, 1),
+            "top": [
+                {"function": f, "self_ms": round(us / 1000, 1), "total_ms": round(total_time[f] / 1000, 1)}
+                for f, us in self_time.most_common(30)
+            ],
+            # Poids en microsecondes
+            "folded": [f"{stack} {us}" for stack, us in self.counts.most_common(_MAX_STACKS)],
+        }
+
+
+def new_id() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def token_user_id(authorization: str) -> str | None:
+    """Utilisateur du JWT d'accès de `Authorization: Bearer …` (sans lecture en base), sinon None."""
+    if not ADMIN_EMAILS or not authorization.startswith("Bearer "):
+        return None
+    payload = decode_token(authorization[7:])
+    if not payload or payload.get("type") != "access" or not ObjectId.is_valid(payload.get("sub")):
+        return None
+    return payload["sub"]
+
+
+async def admin_email(user_id: str) -> str | None:
+    """Email de l'utilisateur s'il figure dans ADMIN_EMAILS, sinon None."""
+    user = await get_db().client_users.find_one({"_id": ObjectId(user_id)}, {"email": 1})
+    email = ((user or {}).get("email") or "").lower()
+    return email if email in ADMIN_EMAILS else None
+
+
+async def save(profile_id: str, scope: dict, email: str, duration: float, status: int | None, sampler: StackSampler) -> None:
+    doc = {
+        "_id": profile_id,
+        "created_at": datetime.utcnow(),
+        "method": scope["method"],
+        "path": scope["path"],
+        "query": scope.get("query_string", b"").decode("latin-1"),
+        "status": status,
+        "admin_email": email,
+        "duration_ms": round(duration * 1000, 1),
+        **sampler.report(),
+    }
+    try:
+        await get_db().request_profiles.insert_one(doc)
+    except Exception as exc:
+        log.error("[profile] enregistrement %s : %s", profile_id, exc)
+
+
+async def load(profile_id: str) -> dict | None:
+    return await get_db().request_profiles.find_one({"_id": profile_id})
+
+
+async def recent(limit: int = 50) -> list[dict]:
+    cursor = get_db().request_profiles.find(
+        {}, {"method": 1, "path": 1, "query": 1, "status": 1, "admin_email": 1, "duration_ms": 1, "samples": 1, "created_at": 1},
+    ).sort("created_at", -1).limit(limit)
+    return await cursor.to_list(limit)
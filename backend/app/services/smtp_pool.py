@@ -0,0 +1,123 @@
+"""
+Pool de sessions SMTP persistantes (utilisé depuis des threads, jamais dans la boucle).
+
+Une session est réutilisée tant qu'elle répond au NOOP et n'est pas restée inactive
+plus de `idle_timeout` secondes ; sinon elle est fermée et rouverte. `send_many`
+envoie plusieurs messages sur une même session authentifiée et se reconnecte une
+fois si le serveur coupe en cours de lot ; `before_send` est appelé avant chaque
+message (prolongation du bail outbox) et arrête le lot s'il renvoie False.
+"""
+from __future__ import annotations
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from app.services import metrics
+
+# Erreurs liées au message (destinataire refusé…) : la session reste utilisable après RSET.
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def _close(conn: smtplib.SMTP) -> None:
+    try:
+        conn.quit()
+    except Exception:
+        conn.close()
+
+
+class SmtpPool:
+    def __init__(self, factory: Callable[[], smtplib.SMTP], size: int = 2, idle_timeout: float = 60):
+        self._factory = factory
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.idle_timeout = idle_timeout
+
+    def _healthy(self, conn: smtplib.SMTP, last_used: float) -> bool:
+        if time.monotonic() - last_used > self.idle_timeout:
+            return False
+        try:
+            return conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                metrics.incr("smtp_pool_connects")
+                return self._factory()
+            conn, last_used = item
+            if self._healthy(conn, last_used):
+                metrics.incr("smtp_pool_reuses")
+                return conn
+            _close(conn)
+
+    def _checkin(self, conn: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+            except BaseException:
+                _close(conn)
+                raise
+            self._checkin(conn)
+
+    def send_many(
+        self, messages: list[tuple[str, list[str], str]], before_send: Callable[[], bool] | None = None,
+    ) -> list[Exception | None]:
+        """Envoie (from, to, data) sur une seule session. Retourne l'erreur par message (None = OK)."""
+        results: list[Exception | None] = []
+        fatal: Exception | None = None
+        with self._slots:
+            conn: smtplib.SMTP | None = None
+            try:
+                for from_addr, to_addrs, data in messages:
+                    if fatal is not None:
+                        # Serveur injoignable même après reconnexion : on n'insiste pas.
+                        results.append(fatal)
+                        continue
+                    if before_send is not None and not before_send():
+                        fatal = RuntimeError("lot interrompu avant envoi (bail non prolongé)")
+                        results.append(fatal)
+                        continue
+                    for attempt in (0, 1):
+                        try:
+                            if conn is None:
+                                conn = self._checkout()
+                            conn.sendmail(from_addr, to_addrs, data)
+                            results.append(None)
+                            break
+                        except _MESSAGE_ERRORS as exc:
+                            try:
+                                conn.rset()
+                            except Exception:
+                                _close(conn)
+                                conn = None
+                            results.append(exc)
+                            break
+                        except Exception as exc:
+                            if conn is not None:
+                                _close(conn)
+                                conn = None
+                            if attempt:
+                                results.append(exc)
+                                fatal = exc
+            finally:
+                if conn is not None:
+                    self._checkin(conn)
+        return results
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close(conn)
@@ -0,0 +1,163 @@
+"""
+Diffusion temps réel des changements de tickets (SSE).
+
+Un seul change stream MongoDB par worker (tickets_sav + ticket_messages), démarré
+au premier abonné. Chaque événement est routé vers les connexions SSE du client
+concerné (`client_id`) et conservé dans un petit tampon pour rejouer ce qu'un
+navigateur a manqué pendant une reconnexion (`Last-Event-ID`). Si le flux est
+perdu (erreur, oplog dépassé), le hub reprend sur son resume token ou, à défaut,
+envoie `resync` aux clients pour qu'ils rechargent leurs données.
+
+Nécessite un replica set (un nœud suffit, voir README).
+"""
+from __future__ import annotations
+import asyncio
+import itertools
+import logging
+from collections import defaultdict, deque
+
+from pymongo.errors import OperationFailure
+
+from app.config import SSE_REPLAY_BUFFER
+from app.db import get_db
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+_QUEUE_SIZE = 100
+_HISTORY_LOST = 286  # ChangeStreamHistoryLost
+
+_PIPELINE = [
+    {"$match": {
+        "ns.coll": {"$in": ["tickets_sav", "ticket_messages"]},
+        "operationType": {"$in": ["insert", "update", "replace"]},
+    }},
+    {"$project": {
+        "ns.coll": 1,
+        "operationType": 1,
+        "documentKey": 1,
+        "fullDocument.client_id": 1,
+        "fullDocument.ticket_id": 1,
+        "fullDocument.status": 1,
+        "fullDocument.resolution": 1,
+        "fullDocument.unread_count": 1,
+        "fullDocument.from_client": 1,
+        "fullDocument.created_at": 1,
+    }},
+]
+
+# (seq, event_id, type, payload) ; type "resync" = recharger les données
+Event = tuple[int, str, str, dict]
+
+
+def _payload(change: dict) -> tuple[str | None, str, dict]:
+    doc = change.get("fullDocument") or {}
+    if change["ns"]["coll"] == "ticket_messages":
+        return doc.get("client_id"), "message", {
+            "ticket_id": str(doc.get("ticket_id")),
+            "message_id": str(change["documentKey"]["_id"]),
+            "from_client": bool(doc.get("from_client")),
+        }
+    return doc.get("client_id"), "ticket", {
+        "ticket_id": str(change["documentKey"]["_id"]),
+        "operation": change["operationType"],
+        "status": doc.get("status"),
+        "resolution": doc.get("resolution"),
+        "unread_count": doc.get("unread_count", 0),
+    }
+
+
+class TicketEventHub:
+    def __init__(self) -> None:
+        self._subs: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._recent: deque[tuple[int, str, str, str, dict]] = deque(maxlen=SSE_REPLAY_BUFFER)
+        self._seq = itertools.count(1)
+        self._task: asyncio.Task | None = None
+        self._resume_token: dict | None = None
+
+    def connections(self, client_id: str) -> int:
+        return len(self._subs.get(client_id, ()))
+
+    def subscribe(self, client_id: str) -> asyncio.Queue:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="ticket-change-stream")
+        q: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        self._subs[client_id].add(q)
+        metrics.incr("sse_connections_opened")
+        return q
+
+    def unsubscribe(self, client_id: str, q: asyncio.Queue) -> None:
+        subs = self._subs.get(client_id)
+        if subs:
+            subs.discard(q)
+            if not subs:
+                del self._subs[client_id]
+
+    def replay(self, client_id: str, last_event_id: str) -> list[Event] | None:
+        """Événements du client postérieurs à `last_event_id` ; None si l'id n'est plus en tampon."""
+        found = False
+        events: list[Event] = []
+        for seq, event_id, cid, kind, payload in self._recent:
+            if found and cid == client_id:
+                events.append((seq, event_id, kind, payload))
+            elif event_id == last_event_id:
+                found = True
+        return events if found else None
+
+    def _publish(self, client_id: str, event: Event) -> None:
+        for q in list(self._subs.get(client_id, ())):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                # Client trop lent : on vide sa file et on lui demande de recharger.
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait((event[0], "", "resync", {}))
+                metrics.incr("sse_resync_slow_client")
+
+    def _resync_all(self) -> None:
+        seq = next(self._seq)
+        for client_id in list(self._subs):
+            self._publish(client_id, (seq, "", "resync", {}))
+
+    def _dispatch(self, change: dict) -> None:
+        client_id, kind, payload = _payload(change)
+        if not client_id:
+            return
+        seq = next(self._seq)
+        event_id = change["_id"]["_data"]
+        self._recent.append((seq, event_id, client_id, kind, payload))
+        self._publish(client_id, (seq, event_id, kind, payload))
+        metrics.incr("sse_events", type=kind)
+
+    async def _run(self) -> None:
+        delay = 1
+        while True:
+            try:
+                async with get_db().watch(
+                    _PIPELINE, full_document="updateLookup", resume_after=self._resume_token,
+                ) as stream:
+                    delay = 1
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self._dispatch(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if exc.code == _HISTORY_LOST:
+                    self._resume_token = None
+                    self._resync_all()
+                log.error("[sse] change stream : %s", exc)
+            except Exception as exc:
+                log.error("[sse] change stream : %s", exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+hub = TicketEventHub()
@@ -0,0 +1,146 @@
+"""
+Messages des tickets SAV, stockés dans `ticket_messages` (un document par message,
+index (ticket_id, created_at, _id)) au lieu du tableau `tickets_sav.messages`.
+
+Le ticket garde un résumé dénormalisé : `last_message`, `last_message_at`,
+`message_count` et `unread_count` (réponses SAV non lues par le client,
+`last_read_at` = dernière lecture). Le back office doit insérer ses réponses ici
+et faire `$inc: {unread_count: 1}` ; les messages encore poussés dans l'ancien
+tableau sont migrés à la première lecture (`migrate_embedded`).
+"""
+from __future__ import annotations
+import calendar
+import hashlib
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+MESSAGES_PAGE = 30
+
+
+def _as_datetime(value, fallback: datetime) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return fallback
+
+
+def _summary(msg: dict) -> dict:
+    return {"body": msg["body"][:200], "from_client": msg["from_client"], "created_at": msg["created_at"]}
+
+
+def serialize(msg: dict) -> dict:
+    return {
+        "id": str(msg["_id"]),
+        "body": msg.get("body", ""),
+        "from_client": bool(msg.get("from_client")),
+        "created_at": msg["created_at"].isoformat() if msg.get("created_at") else None,
+    }
+
+
+def _migrated_id(ticket_id: ObjectId, index: int, m: dict, created_at: datetime) -> ObjectId:
+    # _id déterministe (ticket, rang, contenu) : une reprise de migration ne duplique rien.
+    # Horodatage = created_at du message, comme un ObjectId généré à l'envoi.
+    digest = hashlib.sha1(
+        f"{ticket_id}:{index}:{m.get('created_at')}:{bool(m.get('from_client'))}:{m.get('body', '')}".encode()
+    ).digest()
+    return ObjectId(calendar.timegm(created_at.utctimetuple()).to_bytes(4, "big") + digest[:8])
+
+
+async def migrate_embedded(db, ticket_id: ObjectId) -> int:
+    """
+    Déplace les messages du tableau `messages` du ticket vers `ticket_messages`.
+
+    1. Réservation atomique : `messages` est vidé dans `messages_migrating` (un seul
+       appelant les récupère ; un nouvel envoi du back office repart dans `messages`).
+    2. Insertion avec des _id déterministes (doublons ignorés : rejouable).
+    3. Résumé et compteurs mis à jour une seule fois, à condition que
+       `messages_migrating` soit encore exactement la liste insérée.
+    Un arrêt entre 1 et 3 laisse `messages_migrating`, repris à la lecture suivante.
+    """
+    fields = {"client_id": 1, "created_at": 1, "last_message_at": 1, "last_read_at": 1, "messages_migrating": 1}
+    ticket = await db.tickets_sav.find_one_and_update(
+        {"_id": ticket_id, "messages.0": {"$exists": True}},
+        [
+            {"$set": {"messages_migrating": {"$concatArrays": [{"$ifNull": ["$messages_migrating", []]}, "$messages"]}}},
+            {"$unset": "messages"},
+        ],
+        projection=fields,
+        return_document=ReturnDocument.AFTER,
+    )
+    if ticket is None:
+        # Rien à réserver : reprise d'une migration interrompue (ou en cours ailleurs)
+        ticket = await db.tickets_sav.find_one({"_id": ticket_id, "messages_migrating.0": {"$exists": True}}, fields)
+    if ticket is None:
+        return 0
+    pending = ticket["messages_migrating"]
+    fallback = ticket.get("created_at") or datetime.utcnow()
+    docs = []
+    for i, m in enumerate(pending):
+        created_at = _as_datetime(m.get("created_at"), fallback)
+        docs.append({
+            "_id": _migrated_id(ticket_id, i, m, created_at),
+            "ticket_id": ticket_id,
+            "client_id": ticket.get("client_id"),
+            "body": m.get("body", ""),
+            "from_client": bool(m.get("from_client")),
+            "created_at": created_at,
+        })
+    try:
+        await db.ticket_messages.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        if any(e.get("code") != 11000 for e in exc.details.get("writeErrors", [])):
+            raise
+    last = max(docs, key=lambda d: d["created_at"])
+    last_read = ticket.get("last_read_at")
+    unread = sum(1 for d in docs if not d["from_client"] and (last_read is None or d["created_at"] > last_read))
+    update: dict = {"$unset": {"messages_migrating": 1}, "$inc": {"message_count": len(docs), "unread_count": unread}}
+    if not ticket.get("last_message_at") or last["created_at"] >= ticket["last_message_at"]:
+        update["$set"] = {"last_message": _summary(last), "last_message_at": last["created_at"]}
+    r = await db.tickets_sav.update_one({"_id": ticket_id, "messages_migrating": pending}, update)
+    return len(docs) if r.modified_count else 0
+
+
+async def list_messages(
+    db, ticket_id: ObjectId, before: tuple[datetime, ObjectId] | None = None, limit: int = MESSAGES_PAGE,
+) -> tuple[list[dict], tuple[datetime, ObjectId] | None]:
+    """Page de messages antérieurs à `before`, en ordre chronologique, + curseur de la page précédente."""
+    query: dict = {"ticket_id": ticket_id}
+    if before:
+        created_at, oid = before
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]
+    docs = await (
+        db.ticket_messages.find(query, {"ticket_id": 0, "client_id": 0})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    older = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        older = (docs[-1]["created_at"], docs[-1]["_id"])
+    docs.reverse()
+    return docs, older
+
+
+async def add_message(db, ticket_id: ObjectId, client_id: str, body: str, from_client: bool = True) -> dict | None:
+    """Ajoute un message si le ticket appartient au client. None si ticket introuvable."""
+    if not await db.tickets_sav.find_one({"_id": ticket_id, "client_id": client_id}, {"_id": 1}):
+        return None
+    now = datetime.utcnow()
+    msg = {"ticket_id": ticket_id, "client_id": client_id, "body": body, "from_client": from_client, "created_at": now}
+    # Message d'abord : le résumé du ticket ne pointe jamais vers un message absent
+    r = await db.ticket_messages.insert_one(msg)
+    msg["_id"] = r.inserted_id
+    update: dict = {"$set": {"last_message": _summary(msg), "last_message_at": now}, "$inc": {"message_count": 1}}
+    if not from_client:
+        update["$inc"]["unread_count"] = 1
+    await db.tickets_sav.update_one({"_id": ticket_id}, update)
+    return msg
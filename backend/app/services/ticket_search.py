@@ -0,0 +1,148 @@
+"""
+Recherche plein texte dans les tickets SAV du client.
+
+Deux index texte (langue française, donc racinisation et mots vides) préfixés
+par `client_id` : `tickets_sav` (subject, description) et `ticket_messages`
+(body). La recherche exige l'égalité sur `client_id`, Mongo ne parcourt donc que
+les entrées du client. Les deux requêtes partent en parallèle ; les scores sont
+additionnés par ticket puis pondérés par la récence de la dernière activité.
+"""
+from __future__ import annotations
+import asyncio
+import re
+import unicodedata
+from datetime import datetime
+
+SEARCH_LIMIT = 20
+_CANDIDATES = 200  # meilleurs résultats lus par collection avant fusion
+_MAX_TERMS = 10
+_MESSAGE_WEIGHT = 0.8
+_RECENCY_HALF_LIFE_DAYS = 365
+_SNIPPET_CHARS = 160
+
+
+def query_terms(q: str) -> list[str]:
+    """Mots de la requête. Les opérateurs $text (guillemets, `-`) sont ignorés."""
+    return re.findall(r"\w+", q)[:_MAX_TERMS]
+
+
+def _fold(text: str) -> str:
+    """Minuscules sans accents, même longueur que `text` (offsets conservés)."""
+    return "".join(unicodedata.normalize("NFD", c.lower())[0] for c in text)
+
+
+def _term_pattern(terms: list[str]) -> re.Pattern | None:
+    # Approximation de la racinisation Mongo : on surligne les mots qui partagent le préfixe.
+    prefixes = []
+    for t in terms:
+        t = _fold(t)
+        if len(t) < 3:
+            continue
+        prefixes.append(re.escape(t[: max(4, len(t) - 2)] if len(t) > 4 else t))
+    if not prefixes:
+        return None
+    return re.compile(r"\b(?:" + "|".join(sorted(set(prefixes), key=len, reverse=True)) + r")\w*")
+
+
+def snippet(text: str, pattern: re.Pattern | None) -> dict | None:
+    """Extrait centré sur le premier terme trouvé + positions à surligner ; None si aucun terme."""
+    if not text or pattern is None:
+        return None
+    folded = _fold(text)
+    first = pattern.search(folded)
+    if not first:
+        return None
+    start = max(0, first.start() - _SNIPPET_CHARS // 3)
+    if start:
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < first.start() else start
+    end = min(len(text), start + _SNIPPET_CHARS)
+    prefix = "…" if start else ""
+    highlights = [
+        [m.start() - start + len(prefix), m.end() - start + len(prefix)]
+        for m in pattern.finditer(folded, start, end)
+    ]
+    return {"text": prefix + text[start:end] + ("…" if end < len(text) else ""), "highlights": highlights}
+
+
+def _recency(last_activity: datetime | None, now: datetime) -> float:
+    if not last_activity:
+        return 0.7
+    age_days = max(0.0, (now - last_activity).total_seconds() / 86400)
+    return 0.7 + 0.3 * 0.5 ** (age_days / _RECENCY_HALF_LIFE_DAYS)
+
+
+async def _ticket_hits(db, client_id: str, search: str) -> list[dict]:
+    return await (
+        db.tickets_sav.find(
+            {"client_id": client_id, "$text": {"$search": search}},
+            {"score": {"$meta": "textScore"}, "subject": 1, "description": 1, "status": 1,
+             "created_at": 1, "last_message_at": 1},
+        )
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(_CANDIDATES)
+        .to_list(_CANDIDATES)
+    )
+
+
+async def _message_hits(db, client_id: str, search: str) -> list[dict]:
+    pipeline = [
+        {"$match": {"client_id": client_id, "$text": {"$search": search}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1}},
+        {"$limit": _CANDIDATES},
+        {"$group": {"_id": "$ticket_id", "score": {"$max": "$score"}, "body": {"$first": "$body"}}},
+    ]
+    return await db.ticket_messages.aggregate(pipeline).to_list(None)
+
+
+async def search_tickets(db, client_id: str, q: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+    """Tickets du client correspondant à `q`, par pertinence pondérée par la récence."""
+    terms = query_terms(q)
+    if not terms:
+        return []
+    search = " ".join(terms)
+    ticket_docs, message_docs = await asyncio.gather(
+        _ticket_hits(db, client_id, search), _message_hits(db, client_id, search),
+    )
+    tickets = {d["_id"]: d for d in ticket_docs}
+    messages = {d["_id"]: d for d in message_docs}
+    missing = [tid for tid in messages if tid not in tickets]
+    if missing:
+        async for doc in db.tickets_sav.find(
+            {"_id": {"$in": missing}, "client_id": client_id},
+            {"subject": 1, "description": 1, "status": 1, "created_at": 1, "last_message_at": 1},
+        ):
+            tickets[doc["_id"]] = doc
+
+    now = datetime.utcnow()
+    pattern = _term_pattern(terms)
+    ranked = []
+    for tid, doc in tickets.items():
+        ticket_score = doc.get("score", 0.0)
+        msg = messages.get(tid)
+        message_score = msg["score"] * _MESSAGE_WEIGHT if msg else 0.0
+        score = (ticket_score + message_score) * _recency(doc.get("last_message_at") or doc.get("created_at"), now)
+        ranked.append((score, tid, doc, msg, message_score > ticket_score))
+    ranked.sort(key=lambda r: r[0], reverse=True)
+
+    results = []
+    for score, tid, doc, msg, from_message in ranked[:limit]:
+        sources = [("message", msg and msg["body"]), ("description", doc.get("description")), ("subject", doc.get("subject"))]
+        if not from_message:
+            sources.append(sources.pop(0))
+        match = None
+        for field, text in sources:
+            extract = snippet(text or "", pattern)
+            if extract:
+                match = {"field": field, **extract}
+                break
+        results.append({
+            "id": str(tid),
+            "subject": doc.get("subject"),
+            "status": doc.get("status"),
+            "created_at": doc["created_at"].isoformat() if doc.get("created_at") else None,
+            "score": round(score, 3),
+            "match": match,
+        })
+    return results
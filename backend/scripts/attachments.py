@@ -0,0 +1,27 @@
+"""
+Maintenance du store de pièces jointes.
+
+    cd backend
+    python -m scripts.attachments migrate [--dry-run]   # anciens fichiers uploads/tickets/<uuid>.<ext>
+    python -m scripts.attachments gc [--dry-run]        # blobs plus référencés par aucun ticket
+"""
+import argparse
+import asyncio
+
+from app.services.attachment_store import collect_garbage, migrate_legacy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["migrate", "gc"])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        stats = asyncio.run(migrate_legacy(dry_run=args.dry_run))
+    else:
+        stats = asyncio.run(collect_garbage(dry_run=args.dry_run))
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
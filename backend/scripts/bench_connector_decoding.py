@@ -0,0 +1,119 @@
+"""
+Benchmark décodage + normalisation d'une réponse DF de 10k documents.
+
+Compare l'ancien chemin (json.loads d'un str, dicts génériques et cascades de
+.get()) au décodage orjson depuis les octets + schémas à __slots__, filtrage des
+documents non visibles avant construction. Les jetons de signature/paiement sont
+présents dans la réponse : aucun appel réseau, seul le coût CPU est mesuré.
+
+    cd backend && python -m scripts.bench_connector_decoding
+"""
+import json
+import os
+import random
+import time
+import tracemalloc
+
+import orjson
+
+from app.connectors.df_connector import _CLIENT_VISIBLE_STATUSES, _doc_status, _doc_type, _visible_documents
+from app.connectors.schemas import decode_items
+
+N = int(os.getenv("BENCH_DOCUMENTS", "10000"))
+ROUNDS = 20
+DF = "https://df.renoviapro.fr"
+
+
+def _payload() -> bytes:
+    statuses = ["DRAFT", "SENT", "ACCEPTED", "INVOICED", "PAID", "CANCELED", "PARTIALLY_PAID"]
+    docs = []
+    for i in range(N):
+        docs.append({
+            "id": f"{random.getrandbits(128):032x}",
+            "client_id": "c-1",
+            "doc_type": random.choice(["QUOTE", "INVOICE"]),
+            "doc_number": f"DOC-{i:06d}",
+            "title": "Rénovation complète salle de bain",
+            "status": random.choice(statuses),
+            "issue_date": "2024-05-17T10:00:00Z",
+            "created_at": "2024-05-16T08:12:44Z",
+            "archived_at": None if i % 20 else "2024-06-01T00:00:00Z",
+            "deleted_at": None,
+            "total_ttc": round(random.uniform(100, 20000), 2),
+            "public_signing_token": f"{random.getrandbits(96):024x}",
+            "public_payment_token": f"{random.getrandbits(96):024x}",
+            "lines": [{"label": "Poste", "qty": 1, "unit_price": 100.0, "vat": 20}] * 8,
+            "notes": "Conditions générales " * 20,
+        })
+    return orjson.dumps(docs)
+
+
+def legacy(content: bytes) -> list[dict]:
+    data = json.loads(content.decode("utf-8"))
+    result = []
+    for d in (data if isinstance(data, list) else []):
+        status_raw = (d.get("status") or "").upper()
+        if status_raw not in _CLIENT_VISIBLE_STATUSES:
+            continue
+        if d.get("archived_at") or d.get("deleted_at"):
+            continue
+        doc_id = d.get("id", "")
+        doc_type = _doc_type((d.get("doc_type") or "").upper())
+        label = d.get("doc_number") or d.get("title") or "Document"
+        if d.get("doc_number") and d.get("title"):
+            label = f"{d['doc_number']} – {d['title']}"
+        actions, sign_url, pay_url = [], None, None
+        if doc_type == "devis" and status_raw == "SENT":
+            sign_url = f"{DF}/sign/{d.get('public_signing_token')}"
+            actions.append("sign")
+        if doc_type == "facture" and status_raw in ("SENT", "TRANSFER_PENDING", "PARTIALLY_PAID"):
+            pay_url = f"{DF}/pay/{d.get('public_payment_token')}"
+            actions.append("pay")
+        result.append({
+            "id": doc_id, "type": doc_type, "label": label,
+            "date": str(d.get("issue_date") or d.get("created_at", ""))[:10],
+            "status": _doc_status(status_raw), "url": f"/api/v1/documents/{doc_id}/view",
+            "sign_url": sign_url, "pay_url": pay_url, "actions": actions,
+            "total_ttc": d.get("total_ttc"), "source": "df",
+        })
+    return result
+
+
+def typed(content: bytes) -> list[dict]:
+    result = []
+    for d in _visible_documents(decode_items(content)):
+        doc_type = _doc_type(d.doc_type)
+        actions, sign_url, pay_url = [], None, None
+        if doc_type == "devis" and d.status == "SENT":
+            sign_url = f"{DF}/sign/{d.public_signing_token}"
+            actions.append("sign")
+        if doc_type == "facture" and d.status in ("SENT", "TRANSFER_PENDING", "PARTIALLY_PAID"):
+            pay_url = f"{DF}/pay/{d.public_payment_token}"
+            actions.append("pay")
+        result.append({
+            "id": d.id, "type": doc_type, "label": d.label, "date": d.date,
+            "status": _doc_status(d.status), "url": f"/api/v1/documents/{d.id}/view",
+            "sign_url": sign_url, "pay_url": pay_url, "actions": actions,
+            "total_ttc": d.total_ttc, "source": "df",
+        })
+    return result
+
+
+def main() -> None:
+    content = _payload()
+    print(f"réponse DF : {N} documents, {len(content) / 1e6:.1f} Mo")
+    assert legacy(content) == typed(content)
+    for name, fn in (("json.loads + dicts", legacy), ("orjson + __slots__", typed)):
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            out = fn(content)
+        dt = (time.perf_counter() - t0) / ROUNDS
+        tracemalloc.start()
+        fn(content)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:22s} {dt * 1000:8.1f} ms  pic mémoire {peak / 1e6:6.1f} Mo  ({len(out)} visibles)")
+
+
+if __name__ == "__main__":
+    main()
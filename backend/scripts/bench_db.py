@@ -0,0 +1,23 @@
+"""
+Base Mongo des benchmarks qui vident leurs collections au lancement.
+
+À appeler avant tout import de `app.*` (app.config lit MONGO_DB à l'import) :
+
+    from scripts.bench_db import use_bench_db
+    use_bench_db()
+    from app.db import get_db  # noqa: E402
+"""
+import os
+
+
+def use_bench_db() -> str:
+    """Impose BENCH_MONGO_DB (client_portal_bench par défaut) comme MONGO_DB et le retourne.
+
+    Pas de repli sur MONGO_DB (chargé depuis .env en conteneur) ; un nom qui ne
+    finit pas par _bench arrête le script.
+    """
+    name = os.getenv("BENCH_MONGO_DB", "client_portal_bench")
+    if not name.endswith("_bench"):
+        raise SystemExit(f"BENCH_MONGO_DB={name!r} : le nom doit finir par _bench (base vidée au lancement)")
+    os.environ["MONGO_DB"] = name
+    return name
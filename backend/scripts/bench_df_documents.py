@@ -0,0 +1,60 @@
+"""
+Benchmark liste des documents DF : téléchargement complet vs filtres et pagination côté DF.
+
+Démarre scripts.df_standin dans le processus et mesure, pour un client, les
+octets reçus, le nombre de requêtes et la durée :
+- ancien chemin : GET /api/documents?client_id=… puis filtrage en Python ;
+- iter_client_documents() parcouru en entier (toutes les pages) ;
+- première page de GET /api/v1/documents (30 documents DF, arrêt anticipé).
+
+    cd backend && python -m scripts.bench_df_documents
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DF_URL", f"http://127.0.0.1:{os.getenv('STANDIN_PORT', '8790')}")
+os.environ.setdefault("DF_JWT_SECRET", "bench")
+os.environ.setdefault("DF_ADMIN_USER_ID", "bench")
+
+from app.connectors.df_connector import _decode, _get_raw, _visible_documents, iter_client_documents  # noqa: E402
+from app.services.document_list import list_documents  # noqa: E402
+from scripts import df_standin  # noqa: E402
+
+EMAIL = "client.fidele@example.com"
+
+
+async def _measure(label: str, coro) -> None:
+    df_standin.STATS.update(requests=0, bytes_sent=0)
+    t0 = time.perf_counter()
+    n = await coro
+    dt = time.perf_counter() - t0
+    s = df_standin.STATS
+    print(f"{label:34s} {n:6d} docs {s['requests']:4d} req {s['bytes_sent'] / 1024:9.1f} KiB {dt * 1000:8.1f} ms")
+
+
+async def legacy() -> int:
+    raw = await _get_raw("/api/documents", {"client_id": df_standin.client_id(EMAIL)})
+    return len(_visible_documents(_decode(raw)))
+
+
+async def pushdown_all() -> int:
+    return len([d async for d in iter_client_documents(EMAIL)])
+
+
+async def first_page() -> int:
+    page = await list_documents(EMAIL, sources={"df"}, limit=30)
+    return len(page["items"])
+
+
+async def main() -> None:
+    server = await df_standin.serve()
+    async with server:
+        print(f"{df_standin.DOCUMENTS_PER_CLIENT} documents DF pour le client")
+        await _measure("complet + filtrage local", legacy())
+        await _measure("filtres DF, toutes les pages", pushdown_all())
+        await _measure("filtres DF, première page (30)", first_page())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
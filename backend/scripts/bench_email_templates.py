@@ -0,0 +1,45 @@
+"""
+Benchmark coût de rendu par email (envoi en masse, ex. rappels maintenance).
+
+Compare l'ancien chemin (format du HTML complet + MIMEText + as_bytes) au rendu
+des templates précompilés (segments joints, corps encodé d'un seul tenant).
+
+    cd backend && python -m scripts.bench_email_templates
+"""
+import os
+import time
+from email.mime.text import MIMEText
+
+from app.services import email_service as es
+
+N = int(os.getenv("BENCH_MESSAGES", "20000"))
+
+
+def legacy(to: str, link: str) -> bytes:
+    html = es._WELCOME_HTML.format(header=es.EMAIL_HEADER, footer=es.EMAIL_FOOTER, gold=es.GOLD, to=to, link=link)
+    msg = MIMEText(html, "html", "utf-8")
+    msg["Subject"] = es.WELCOME.subject
+    msg["From"] = es._FROM
+    msg["To"] = to
+    return msg.as_bytes()
+
+
+def precompiled(to: str, link: str) -> bytes:
+    return es.WELCOME.render(to, {"to": to, "link": link})
+
+
+def main() -> None:
+    recipients = [(f"client{i}@example.com", f"https://client.renoviapro.fr/auth/callback?token=t{i:08d}") for i in range(N)]
+    runs = (
+        ("MIMEText (html seul)", legacy),
+        ("précompilé (html + texte)", precompiled),
+    )
+    for name, fn in runs:
+        t0 = time.perf_counter()
+        size = sum(len(fn(to, link)) for to, link in recipients)
+        dt = time.perf_counter() - t0
+        print(f"{name:26s} {dt / N * 1e6:7.1f} µs/message  {size / N:6.0f} octets/message")
+
+
+if __name__ == "__main__":
+    main()
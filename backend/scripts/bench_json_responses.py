@@ -0,0 +1,106 @@
+"""
+Benchmark encodage JSON et compression des réponses volumineuses.
+
+Compare le chemin FastAPI par défaut (jsonable_encoder + json.dumps) à
+app.responses.dumps (orjson), puis la taille sur le fil brute / gzip / brotli,
+sur une liste de documents DF, une page de tickets et un tableau de bord.
+
+    cd backend && python -m scripts.bench_json_responses
+"""
+import gzip
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import brotli
+from fastapi.encoders import jsonable_encoder
+
+from app.middleware import _BROTLI_QUALITY, _GZIP_LEVEL
+from app.responses import dumps
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "200"))
+
+
+def _documents(n: int) -> dict:
+    items = []
+    for i in range(n):
+        kind = random.choice(["devis", "facture"])
+        items.append({
+            "id": f"{random.getrandbits(128):032x}",
+            "type": kind,
+            "label": f"{'DEV' if kind == 'devis' else 'FAC'}-2024-{i:05d} – Rénovation salle de bain, carrelage et plomberie",
+            "date": f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+            "status": random.choice(["Envoyé", "Accepté", "Facturé", "Payé", "Partiel"]),
+            "url": f"/api/v1/documents/{i}/view",
+            "sign_url": f"https://df.renoviapro.fr/sign/{random.getrandbits(96):024x}" if kind == "devis" else None,
+            "pay_url": f"https://df.renoviapro.fr/pay/{random.getrandbits(96):024x}" if kind == "facture" else None,
+            "actions": ["sign"] if kind == "devis" else ["pay"],
+            "total_ttc": round(random.uniform(80, 25000), 2),
+            "source": "df",
+        })
+    return {"items": items}
+
+
+def _tickets(n: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "items": [
+            {
+                "id": f"{random.getrandbits(96):024x}",
+                "subject": "Fuite sous l'évier de la cuisine après intervention",
+                "status": random.choice(["NEW", "IN_PROGRESS", "WAITING_CUSTOMER", "CLOSED"]),
+                "resolution": None,
+                "created_at": (now - timedelta(hours=i)).isoformat(),
+                "last_message": {
+                    "body": "Bonjour, le technicien passera jeudi entre 8h et 12h. Merci de confirmer votre présence. " * 2,
+                    "from_client": False,
+                    "created_at": (now - timedelta(minutes=i)).isoformat(),
+                },
+                "unread_count": random.randint(0, 3),
+            }
+            for i in range(n)
+        ],
+        "next_cursor": "MjAyNC0wMS0wMVQwMDowMDowMHw2NWExYjJjM2Q0ZTVmNjA3MTgyOTNhNGI",
+    }
+
+
+def _stdlib(content) -> bytes:
+    # Équivalent de fastapi.responses.JSONResponse.render après jsonable_encoder
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _timed(fn, payload) -> tuple[float, bytes]:
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        out = fn(payload)
+    return (time.perf_counter() - t0) / ROUNDS, out
+
+
+def main() -> None:
+    payloads = {
+        "documents (2000)": _documents(2000),
+        "documents (200)": _documents(200),
+        "tickets (page 100)": _tickets(100),
+    }
+    print(f"{'payload':20s} {'encodeur':22s} {'encode':>10s} {'brut':>9s} {'gzip':>9s} {'gzip ms':>8s} {'br':>9s} {'br ms':>7s}")
+    for name, payload in payloads.items():
+        for label, fn in (("jsonable_encoder+json", _stdlib), ("orjson", dumps)):
+            dt, body = _timed(fn, payload)
+            t0 = time.perf_counter()
+            gz = gzip.compress(body, _GZIP_LEVEL)
+            t_gz = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            br = brotli.compress(body, quality=_BROTLI_QUALITY)
+            t_br = time.perf_counter() - t0
+            print(
+                f"{name:20s} {label:22s} {dt * 1000:8.2f}ms {len(body):9d} {len(gz):9d} "
+                f"{t_gz * 1000:8.2f} {len(br):9d} {t_br * 1000:7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark débit SMTP : une connexion par email vs pool persistant (send_many).
+
+Lance un serveur SMTP minimal local qui simule la latence réseau (par réponse et
+à l'ouverture de session, pour représenter TLS + login).
+
+    cd backend
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_SECURITY=none python -m scripts.bench_smtp_pool
+"""
+import asyncio
+import os
+import threading
+import time
+
+N = int(os.getenv("BENCH_MESSAGES", "200"))
+RTT = float(os.getenv("BENCH_RTT_MS", "5")) / 1000
+HANDSHAKE = float(os.getenv("BENCH_HANDSHAKE_MS", "40")) / 1000
+PORT = int(os.getenv("SMTP_PORT", "2525"))
+
+
+async def _session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    await asyncio.sleep(HANDSHAKE)
+    writer.write(b"220 bench ESMTP\r\n")
+    while line := await reader.readline():
+        cmd = line[:4].upper()
+        await asyncio.sleep(RTT)
+        if cmd in (b"EHLO", b"HELO"):
+            writer.write(b"250-bench\r\n250 8BITMIME\r\n")
+        elif cmd == b"DATA":
+            writer.write(b"354 go\r\n")
+            while (await reader.readline()) != b".\r\n":
+                pass
+            writer.write(b"250 queued\r\n")
+        elif cmd == b"QUIT":
+            writer.write(b"221 bye\r\n")
+            break
+        else:
+            writer.write(b"250 ok\r\n")
+        await writer.drain()
+    writer.close()
+
+
+def _serve() -> None:
+    async def main():
+        server = await asyncio.start_server(_session, "127.0.0.1", PORT)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(main())
+
+
+def main() -> None:
+    threading.Thread(target=_serve, daemon=True).start()
+    time.sleep(0.2)
+
+    from app.services.email_service import _FROM, open_smtp, render
+    from app.services.smtp_pool import SmtpPool
+
+    data = render("magic_link", "client@example.com", {"link": "https://client.renoviapro.fr/auth/callback?token=x"})
+    messages = [(_FROM, ["client@example.com"], data)] * N
+
+    t0 = time.perf_counter()
+    for from_addr, to_addrs, data in messages:
+        with open_smtp() as s:
+            s.sendmail(from_addr, to_addrs, data)
+    per_conn = time.perf_counter() - t0
+
+    pool = SmtpPool(open_smtp, size=1)
+    t0 = time.perf_counter()
+    for i in range(0, N, 20):
+        errors = pool.send_many(messages[i:i + 20])
+        assert not any(errors), errors
+    pooled = time.perf_counter() - t0
+    pool.close_all()
+
+    print(f"{N} emails, RTT {RTT * 1000:.0f} ms, handshake {HANDSHAKE * 1000:.0f} ms")
+    print(f"  connexion par email : {per_conn:6.2f} s  ({N / per_conn:7.1f} msg/s)")
+    print(f"  pool + lots de 20   : {pooled:6.2f} s  ({N / pooled:7.1f} msg/s)")
+
+
+if __name__ == "__main__":
+    main()
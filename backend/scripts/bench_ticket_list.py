@@ -0,0 +1,107 @@
+"""
+Benchmark liste des tickets sur une collection de 100k tickets.
+
+Compare l'ancienne requête (tous les tickets du client, documents complets avec
+messages) à la page par curseur projetée. Utilise une base dédiée
+(BENCH_MONGO_DB, client_portal_bench par défaut, nom en _bench obligatoire ;
+MONGO_DB est ignoré), vidée et re-remplie au lancement.
+
+    cd backend && python -m scripts.bench_ticket_list
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from scripts.bench_db import use_bench_db
+
+use_bench_db()
+
+from app.db import ensure_indexes, get_db  # noqa: E402
+
+TOTAL = int(os.getenv("BENCH_TICKETS", "100000"))
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "50"))
+HEAVY_CLIENT = "client-0"  # reçoit 10 % des tickets
+ROUNDS = 20
+
+
+def _ticket(i: int, now: datetime) -> dict:
+    client = HEAVY_CLIENT if i % 10 == 0 else f"client-{random.randint(1, CLIENTS - 1)}"
+    return {
+        "client_id": client,
+        "chantier_id": None,
+        "subject": f"Ticket {i} — fuite sous l'évier",
+        "description": "Description détaillée du problème rencontré. " * 20,
+        "status": random.choice(["NEW", "IN_PROGRESS", "WAITING_CUSTOMER", "CLOSED"]),
+        "resolution": None,
+        "attachment_paths": [],
+        "messages": [
+            {"body": "Message de suivi SAV " * 10, "from_client": bool(m % 2), "created_at": now.isoformat()}
+            for m in range(random.randint(0, 15))
+        ],
+        "created_at": now - timedelta(minutes=i),
+    }
+
+
+async def _seed() -> None:
+    db = get_db()
+    await db.tickets_sav.drop()
+    await ensure_indexes()
+    now = datetime.utcnow()
+    batch = []
+    for i in range(TOTAL):
+        batch.append(_ticket(i, now))
+        if len(batch) == 5000:
+            await db.tickets_sav.insert_many(batch)
+            batch = []
+    if batch:
+        await db.tickets_sav.insert_many(batch)
+
+
+async def _legacy() -> int:
+    items = []
+    async for doc in get_db().tickets_sav.find({"client_id": HEAVY_CLIENT}).sort("created_at", -1):
+        items.append({"id": str(doc["_id"]), "subject": doc.get("subject"), "status": doc.get("status")})
+    return len(items)
+
+
+async def _page(cursor: dict | None = None) -> list[dict]:
+    query = {"client_id": HEAVY_CLIENT}
+    if cursor:
+        query["$or"] = [
+            {"created_at": {"$lt": cursor["created_at"]}},
+            {"created_at": cursor["created_at"], "_id": {"$lt": cursor["_id"]}},
+        ]
+    return await (
+        get_db().tickets_sav.find(query, {"subject": 1, "status": 1, "resolution": 1, "created_at": 1})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(21)
+        .to_list(21)
+    )
+
+
+async def _timed(label: str, fn) -> None:
+    timings = []
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    print(f"  {label:34s} p50 {timings[ROUNDS // 2] * 1000:8.2f} ms  p95 {timings[int(ROUNDS * 0.95) - 1] * 1000:8.2f} ms")
+
+
+async def main() -> None:
+    print(f"seed {TOTAL} tickets ({TOTAL // 10} pour {HEAVY_CLIENT})…")
+    await _seed()
+    first = await _page()
+    deep = first[-1]
+    for _ in range(50):  # curseur ~1000 tickets plus loin
+        deep = (await _page(deep))[-1]
+    await _timed("ancienne liste complète", _legacy)
+    await _timed("page 1 (limit 20, projection)", _page)
+    await _timed("page ~50 (curseur)", lambda: _page(deep))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Benchmark recherche plein texte sur 100k tickets et ~500k messages.
+
+Compare un balayage $regex insensible à la casse (ce qu'il faudrait faire sans
+index texte) à search_tickets(), pour un client avec un long historique. Utilise
+une base dédiée (BENCH_MONGO_DB, client_portal_bench par défaut, nom en _bench
+obligatoire ; MONGO_DB est ignoré), vidée et re-remplie.
+
+    cd backend && python -m scripts.bench_ticket_search
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from scripts.bench_db import use_bench_db
+
+use_bench_db()
+
+from app.db import ensure_indexes, get_db  # noqa: E402
+from app.services.ticket_search import search_tickets  # noqa: E402
+
+TOTAL = int(os.getenv("BENCH_TICKETS", "100000"))
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "50"))
+HEAVY_CLIENT = "client-0"  # reçoit 10 % des tickets
+ROUNDS = 20
+QUERIES = ["chaudière", "fuite évier", "radiateurs froids", "disjoncteur saute", "volet roulant bloqué"]
+
+_SUBJECTS = [
+    "Fuite sous l'évier", "Chaudière en panne", "Radiateur froid", "Disjoncteur qui saute",
+    "Volet roulant bloqué", "Carrelage fissuré", "Peinture qui s'écaille", "Porte qui frotte",
+    "Prise électrique HS", "Infiltration au plafond", "Ballon d'eau chaude", "VMC bruyante",
+]
+_WORDS = (
+    "depuis hier le la les un une des eau chaude froide pression bruit odeur humidité tache mur "
+    "plafond sol cuisine salle de bain chambre garage robinet joint tuyau compteur thermostat "
+    "réglage intervention technicien passage rendez-vous devis garantie photo jointe merci"
+).split()
+
+
+def _text(n: int) -> str:
+    return " ".join(random.choices(_WORDS, k=n))
+
+
+async def _flush(db, tickets: list[dict]) -> None:
+    ids = (await db.tickets_sav.insert_many(tickets)).inserted_ids
+    messages = [
+        {
+            "ticket_id": oid, "client_id": t["client_id"], "body": _text(30),
+            "from_client": bool(m % 2), "created_at": t["created_at"] + timedelta(minutes=m),
+        }
+        for t, oid in zip(tickets, ids)
+        for m in range(random.randint(0, 10))
+    ]
+    if messages:
+        await db.ticket_messages.insert_many(messages)
+
+
+async def _seed() -> None:
+    db = get_db()
+    await db.tickets_sav.drop()
+    await db.ticket_messages.drop()
+    await ensure_indexes()
+    now = datetime.utcnow()
+    batch = []
+    for i in range(TOTAL):
+        batch.append({
+            "client_id": HEAVY_CLIENT if i % 10 == 0 else f"client-{random.randint(1, CLIENTS - 1)}",
+            "subject": random.choice(_SUBJECTS),
+            "description": _text(60),
+            "status": random.choice(["NEW", "IN_PROGRESS", "WAITING_CUSTOMER", "CLOSED"]),
+            "created_at": now - timedelta(hours=i),
+        })
+        if len(batch) == 5000:
+            await _flush(db, batch)
+            batch = []
+    if batch:
+        await _flush(db, batch)
+
+
+async def _regex_scan(q: str) -> int:
+    db = get_db()
+    pattern = {"$regex": "|".join(re.escape(t) for t in q.split()), "$options": "i"}
+    tickets = await db.tickets_sav.find(
+        {"client_id": HEAVY_CLIENT, "$or": [{"subject": pattern}, {"description": pattern}]}, {"_id": 1},
+    ).to_list(None)
+    message_tickets = await db.ticket_messages.distinct("ticket_id", {"client_id": HEAVY_CLIENT, "body": pattern})
+    return len({t["_id"] for t in tickets} | set(message_tickets))
+
+
+async def _timed(label: str, fn) -> None:
+    timings = []
+    for i in range(ROUNDS):
+        t0 = time.perf_counter()
+        await fn(QUERIES[i % len(QUERIES)])
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    print(f"  {label:34s} p50 {timings[ROUNDS // 2] * 1000:8.2f} ms  p95 {timings[int(ROUNDS * 0.95) - 1] * 1000:8.2f} ms")
+
+
+async def main() -> None:
+    print(f"seed {TOTAL} tickets ({TOTAL // 10} pour {HEAVY_CLIENT}) + messages…")
+    await _seed()
+    print(f"  {await get_db().ticket_messages.estimated_document_count()} messages")
+    await _timed("balayage $regex", _regex_scan)
+    await _timed("search_tickets (index texte)", lambda q: search_tickets(get_db(), HEAVY_CLIENT, q))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Benchmark du traitement des photos à la création d'un ticket (1, 4 et 8 photos).
+
+Compare le traitement séquentiel (ancienne boucle) et `save_ticket_files`
+(parallélisme borné par UPLOAD_CONCURRENCY). Les photos sont des UploadFile
+adossés à des fichiers temporaires, comme après le parsing multipart.
+
+    cd backend && python -m scripts.bench_ticket_uploads
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+
+from fastapi import UploadFile  # noqa: E402
+
+from app.services.file_service import save_ticket_file, save_ticket_files  # noqa: E402
+
+PHOTO_MB = float(os.getenv("BENCH_PHOTO_MB", "4"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+_PHOTO = b"\xff\xd8\xff\xe0" + os.urandom(int(PHOTO_MB * 1024 * 1024) - 4)
+
+
+def _photos(n: int) -> list[UploadFile]:
+    files = []
+    for i in range(n):
+        f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        f.write(_PHOTO)
+        f.seek(0)
+        files.append(UploadFile(file=f, filename=f"photo{i}.jpg"))
+    return files
+
+
+async def sequential(files: list[UploadFile]) -> None:
+    for f in files:
+        await save_ticket_file(f)
+
+
+async def concurrent(files: list[UploadFile]) -> None:
+    await save_ticket_files(files)
+
+
+async def main() -> None:
+    print(f"photos de {PHOTO_MB:g} Mo, médiane sur {ROUNDS} essais")
+    for n in (1, 4, 8):
+        line = f"  {n} photo(s) :"
+        for name, fn in (("séquentiel", sequential), ("parallèle", concurrent)):
+            timings = []
+            for _ in range(ROUNDS):
+                files = _photos(n)
+                t0 = time.perf_counter()
+                await fn(files)
+                timings.append(time.perf_counter() - t0)
+            line += f"  {name} {sorted(timings)[ROUNDS // 2] * 1000:7.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Serveur DF de substitution (local) pour le connecteur documents.
+
+Modélise le contrat de GET /api/documents attendu par df_connector :
+
+    client_id          obligatoire
+    status             codes séparés par des virgules (SENT,PAID…)
+    archived=false     exclut archivés et supprimés
+    doc_type           QUOTE | INVOICE
+    date_from          YYYY-MM-DD (issue_date, sinon created_at)
+    date_to            YYYY-MM-DD inclus (borne haute, reprise après un curseur)
+    sort=-date,-id     du plus récent au plus ancien
+    page, page_size    → {"items": [...], "page": n, "page_size": n, "has_more": bool}
+
+Sans `page`, renvoie le tableau complet non filtré (comportement historique de
+DF). Également : GET /api/clients?search=, POST signing-link / create-payment-link.
+Aucune vérification du JWT. Octets envoyés et requêtes comptés dans `STATS`.
+
+    cd backend && python -m scripts.df_standin
+    DF_URL=http://127.0.0.1:8790 DF_JWT_SECRET=x DF_ADMIN_USER_ID=x uvicorn app.main:app
+"""
+import asyncio
+import hashlib
+import os
+import random
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+
+PORT = int(os.getenv("STANDIN_PORT", "8790"))
+DOCUMENTS_PER_CLIENT = int(os.getenv("STANDIN_DOCUMENTS", "2000"))
+LATENCY = float(os.getenv("STANDIN_LATENCY_MS", "20")) / 1000
+
+STATS = {"requests": 0, "bytes_sent": 0}
+
+_STATUSES = ["DRAFT", "SENT", "ACCEPTED", "REFUSED", "INVOICED", "COMPLETED", "PAID", "CANCELED", "PARTIALLY_PAID"]
+_documents: dict[str, list[dict]] = {}
+
+
+def client_id(email: str) -> str:
+    return hashlib.sha1(email.lower().encode()).hexdigest()[:24]
+
+
+def _date(d: dict) -> str:
+    return str(d.get("issue_date") or d.get("created_at", ""))[:10]
+
+
+def documents(cid: str) -> list[dict]:
+    """Documents (déterministes) d'un client, tous statuts confondus."""
+    if cid not in _documents:
+        rnd = random.Random(cid)
+        start = date(2019, 1, 1)
+        docs = []
+        for i in range(DOCUMENTS_PER_CLIENT):
+            day = (start + timedelta(days=rnd.randint(0, 2000))).isoformat()
+            kind = rnd.choice(["QUOTE", "INVOICE"])
+            docs.append({
+                "id": f"{rnd.getrandbits(128):032x}",
+                "client_id": cid,
+                "doc_type": kind,
+                "doc_number": f"{'DEV' if kind == 'QUOTE' else 'FAC'}-{i:06d}",
+                "title": "Rénovation salle de bain",
+                "status": rnd.choice(_STATUSES),
+                "issue_date": f"{day}T09:00:00Z",
+                "created_at": f"{day}T08:00:00Z",
+                "archived_at": None if i % 15 else f"{day}T10:00:00Z",
+                "deleted_at": None,
+                "total_ttc": round(rnd.uniform(100, 20000), 2),
+                "public_signing_token": f"{rnd.getrandbits(96):024x}" if i % 3 else None,
+                "public_payment_token": f"{rnd.getrandbits(96):024x}" if i % 3 else None,
+                "lines": [{"label": "Poste", "qty": 1, "unit_price": 100.0, "vat": 20}] * 6,
+            })
+        _documents[cid] = docs
+    return _documents[cid]
+
+
+def list_documents(q: dict[str, str]):
+    docs = documents(q.get("client_id", ""))
+    if "page" not in q:
+        return docs
+    if q.get("status"):
+        statuses = set(q["status"].split(","))
+        docs = [d for d in docs if d["status"] in statuses]
+    if q.get("archived") == "false":
+        docs = [d for d in docs if not (d["archived_at"] or d["deleted_at"])]
+    if q.get("doc_type"):
+        docs = [d for d in docs if d["doc_type"] == q["doc_type"]]
+    if q.get("date_from"):
+        docs = [d for d in docs if _date(d) >= q["date_from"]]
+    if q.get("date_to"):
+        docs = [d for d in docs if _date(d) <= q["date_to"]]
+    if q.get("sort") == "-date,-id":
+        docs = sorted(docs, key=lambda d: (_date(d), d["id"]), reverse=True)
+    page, size = max(int(q["page"]), 1), min(int(q.get("page_size", "50")), 200)
+    chunk = docs[(page - 1) * size: page * size]
+    return {"items": chunk, "page": page, "page_size": size, "has_more": page * size < len(docs)}
+
+
+def route(method: str, path: str, q: dict[str, str]) -> tuple[int, object]:
+    if method == "GET" and path == "/api/clients":
+        email = q.get("search", "")
+        return 200, [{"id": client_id(email), "email": email}] if email else []
+    if method == "GET" and path == "/api/documents":
+        return 200, list_documents(q)
+    if method == "POST" and path.endswith("/signing-link"):
+        return 201, {"token": hashlib.sha1(path.encode()).hexdigest()[:24]}
+    if method == "POST" and path.endswith("/create-payment-link"):
+        return 201, {"public_token": hashlib.sha1(path.encode()).hexdigest()[:24]}
+    return 404, {"detail": "Not found"}
+
+
+async def _session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while request_line := await reader.readline():
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            if length:
+                await reader.readexactly(length)
+            url = urlsplit(target)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            await asyncio.sleep(LATENCY)
+            status, payload = route(method, url.path, q)
+            body = orjson.dumps(payload)
+            STATS["requests"] += 1
+            STATS["bytes_sent"] += len(body)
+            writer.write(
+                f"HTTP/1.1 {status} X\r\ncontent-type: application/json\r\n"
+                f"content-length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port: int = PORT) -> asyncio.AbstractServer:
+    return await asyncio.start_server(_session, "127.0.0.1", port)
+
+
+async def main() -> None:
+    server = await serve()
+    print(f"DF stand-in sur http://127.0.0.1:{PORT} ({DOCUMENTS_PER_CLIENT} documents par client)")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+"""
+Migration des messages embarqués (`tickets_sav.messages`) vers `ticket_messages`.
+
+Rejouable : seuls les tickets ayant encore des messages embarqués (ou une
+migration interrompue) sont traités ; les messages reçoivent des _id
+déterministes, une reprise ne les duplique pas.
+
+    cd backend && python -m scripts.migrate_ticket_messages
+"""
+import asyncio
+
+from app.db import ensure_indexes, get_db
+from app.services.ticket_messages import migrate_embedded
+
+
+async def main() -> None:
+    await ensure_indexes()
+    db = get_db()
+    tickets = moved = 0
+    async for ticket in db.tickets_sav.find(
+        {"$or": [{"messages.0": {"$exists": True}}, {"messages_migrating.0": {"$exists": True}}]}, {"_id": 1},
+    ):
+        moved += await migrate_embedded(db, ticket["_id"])
+        tickets += 1
+    print(f"{moved} messages migrés depuis {tickets} tickets")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -79,9 +79,10 @@ export async function apiForm(path: string, formData: FormData, token?: string |
   return res.json();
 }
 
-export function apiUrl(path: string): string {
-  const token = getToken();
+// URL du flux SSE : jeton court propre au flux, jamais le jeton d'accès (journaux du proxy, historique).
+export async function streamUrl(path: string): Promise<string> {
+  const { token } = await api<{ token: string }>(`${path}-token`, { method: "POST" });
   const url = new URL(`${API}${path}`, window.location.origin);
-  if (token) url.searchParams.set("token", token);
+  url.searchParams.set("token", token);
   return url.toString();
 }
@@ -4,10 +4,20 @@ import { api } from "../lib/api";
 
 type User = { name?: string | null; email: string };
 
+// Chaque section peut être absente (status "timeout" / "error") sans bloquer les autres.
+type Section = { status: string; count?: number };
+type DashboardData = {
+  user: User;
+  tickets: Section & { open?: number };
+  chantiers: Section;
+  documents: Section & { more?: boolean };
+  maintenance: Section;
+};
+
 type Stats = {
   chantiers: number;
   ticketsOuverts: number;
-  documents: number;
+  documents: number | string;
   maintenance: number;
 };
 
@@ -108,26 +118,19 @@ export default function Dashboard() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    api<User>("/api/v1/me").then(setUser).catch(() => null);
-    
-    Promise.all([
-      api<{ items: unknown[] }>("/api/v1/documents").catch(() => ({ items: [] })),
-      api<{ contracts: unknown[] }>("/api/v1/maintenance/contracts").catch(() => ({ contracts: [] })),
-      api<{ tickets: { status: string }[] }>("/api/v1/tickets").catch(() => ({ tickets: [] })),
-    ]).then(([docsRes, maintRes, ticketsRes]) => {
-      const docs = docsRes.items || [];
-      const contracts = maintRes.contracts || [];
-      const tickets = ticketsRes.tickets || [];
-      const openTickets = tickets.filter(t => t.status !== "closed" && t.status !== "resolved");
-      
-      setStats({
-        chantiers: docs.filter((d: any) => d.source !== "maintenance").length > 0 ? 1 : 0,
-        ticketsOuverts: openTickets.length,
-        documents: docs.length,
-        maintenance: contracts.length,
-      });
-      setLoading(false);
-    });
+    api<DashboardData>("/api/v1/dashboard")
+      .then(d => {
+        setUser(d.user);
+        setStats({
+          chantiers: d.chantiers.count ?? 0,
+          ticketsOuverts: d.tickets.open ?? 0,
+          // Première page seulement : « 30+ » quand il y en a d'autres
+          documents: `${d.documents.count ?? 0}${d.documents.more ? "+" : ""}`,
+          maintenance: d.maintenance.count ?? 0,
+        });
+      })
+      .catch(() => null)
+      .finally(() => setLoading(false));
   }, []);
 
   const hour = new Date().getHours();
@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { api, getToken } from "../lib/api";
 
 type Doc = {
@@ -10,6 +10,16 @@ type Doc = {
 
 type TabType = "all" | "devis" | "factures" | "maintenance";
 
+type Page = { items: Doc[]; next_cursor: string | null };
+
+// Filtres appliqués côté serveur pour chaque onglet
+const TAB_QUERY: Record<TabType, string> = {
+  all: "",
+  devis: "type=devis",
+  factures: "type=facture&source=compta&source=df",
+  maintenance: "source=maintenance",
+};
+
 const CACHE_KEY = "docs_cache";
 const CACHE_TTL = 5 * 60 * 1000;
 
@@ -33,7 +43,7 @@ function StatusBadge({ status }: { status?: string }) {
   );
 }
 
-function DocumentCard({ doc: d, openPreview }: { doc: Doc; openPreview: (d: Doc) => void }) {
+function DocumentCard({ doc: d, openPreview, onExternalAction }: { doc: Doc; openPreview: (d: Doc) => void; onExternalAction: () => void }) {
   const isMaintenance = d.source === "maintenance";
   const isDevis = d.type?.toLowerCase() === "devis";
   
@@ -98,6 +108,7 @@ function DocumentCard({ doc: d, openPreview }: { doc: Doc; openPreview: (d: Doc)
               href={d.sign_url}
               target="_blank"
               rel="noopener noreferrer"
+              onClick={onExternalAction}
               className="flex-1 flex items-center justify-center gap-2 py-3 rounded-xl bg-gradient-to-r from-[#FEBD17] to-[#E6AA00] text-black text-sm font-semibold hover:shadow-lg hover:shadow-[#FEBD17]/30 transition-all no-underline"
             >
               <svg width="16" height="16" fill="none" stroke="currentColor" strokeWidth="2.5" viewBox="0 0 24 24">
@@ -113,6 +124,7 @@ function DocumentCard({ doc: d, openPreview }: { doc: Doc; openPreview: (d: Doc)
               href={d.pay_url}
               target="_blank"
               rel="noopener noreferrer"
+              onClick={onExternalAction}
               className="flex-1 flex items-center justify-center gap-2 py-3 rounded-xl bg-emerald-500 text-white text-sm font-semibold hover:bg-emerald-600 hover:shadow-lg hover:shadow-emerald-500/30 transition-all no-underline"
             >
               <svg width="16" height="16" fill="none" stroke="currentColor" strokeWidth="2.5" viewBox="0 0 24 24">
@@ -148,37 +160,83 @@ function DocumentCard({ doc: d, openPreview }: { doc: Doc; openPreview: (d: Doc)
   );
 }
 
-function readCache(): Doc[] | null {
+function readCache(tab: TabType): Page | null {
   try {
-    const raw = sessionStorage.getItem(CACHE_KEY);
+    const raw = sessionStorage.getItem(`${CACHE_KEY}:${tab}`);
     if (!raw) return null;
     const { ts, data } = JSON.parse(raw);
-    if (Date.now() - ts > CACHE_TTL) { sessionStorage.removeItem(CACHE_KEY); return null; }
+    if (Date.now() - ts > CACHE_TTL) { sessionStorage.removeItem(`${CACHE_KEY}:${tab}`); return null; }
     return data;
   } catch { return null; }
 }
-function writeCache(data: Doc[]) {
-  try { sessionStorage.setItem(CACHE_KEY, JSON.stringify({ ts: Date.now(), data })); } catch {}
+function writeCache(tab: TabType, data: Page) {
+  try { sessionStorage.setItem(`${CACHE_KEY}:${tab}`, JSON.stringify({ ts: Date.now(), data })); } catch {}
+}
+
+function clearCache() {
+  try { (Object.keys(TAB_QUERY) as TabType[]).forEach(tab => sessionStorage.removeItem(`${CACHE_KEY}:${tab}`)); } catch {}
+}
+
+function pageUrl(tab: TabType, cursor?: string | null, refresh = false) {
+  const params = [TAB_QUERY[tab], cursor ? `cursor=${encodeURIComponent(cursor)}` : "", refresh ? "refresh=1" : ""]
+    .filter(Boolean).join("&");
+  return `/api/v1/documents${params ? `?${params}` : ""}`;
 }
 
 export default function Documents() {
-  const [items, setItems] = useState<Doc[]>(() => readCache() ?? []);
-  const [loading, setLoading] = useState(!readCache());
-  const [refreshing, setRefreshing] = useState(false);
+  const [pages, setPages] = useState<Partial<Record<TabType, Page>>>(() => {
+    const cached = readCache("all");
+    return cached ? { all: cached } : {};
+  });
   const [activeTab, setActiveTab] = useState<TabType>("all");
+  const [loading, setLoading] = useState(!pages.all);
+  const [refreshing, setRefreshing] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  const fetchDocs = (force = false) => {
+  const fetchDocs = (tab: TabType, force = false) => {
     if (!force) {
-      const cached = readCache();
-      if (cached) { setItems(cached); setLoading(false); return; }
+      const cached = pages[tab] ?? readCache(tab);
+      if (cached) { setPages(p => ({ ...p, [tab]: cached })); setLoading(false); return; }
     }
     setRefreshing(true);
-    api<{ items: Doc[] }>("/api/v1/documents")
-      .then(r => { setItems(r.items); writeCache(r.items); })
+    // Forcé : le serveur relit DF sans cache (statuts après signature / paiement)
+    api<Page>(pageUrl(tab, null, force))
+      .then(r => { setPages(p => ({ ...p, [tab]: r })); writeCache(tab, r); })
       .finally(() => { setLoading(false); setRefreshing(false); });
   };
 
-  useEffect(() => { fetchDocs(); }, []);
+  const loadMore = () => {
+    const current = pages[activeTab];
+    if (!current?.next_cursor) return;
+    const tab = activeTab;
+    setLoadingMore(true);
+    api<Page>(pageUrl(tab, current.next_cursor))
+      .then(r => {
+        const merged = { items: [...current.items, ...r.items], next_cursor: r.next_cursor };
+        setPages(p => ({ ...p, [tab]: merged }));
+        writeCache(tab, merged);
+      })
+      .finally(() => setLoadingMore(false));
+  };
+
+  useEffect(() => {
+    if (!pages[activeTab]) setLoading(true);
+    fetchDocs(activeTab);
+  }, [activeTab]);
+
+  // Retour de la page de signature / paiement DF (onglet externe) : statuts rechargés
+  const awaitingReturn = useRef(false);
+  useEffect(() => {
+    const onVisible = () => {
+      if (document.visibilityState !== "visible" || !awaitingReturn.current) return;
+      awaitingReturn.current = false;
+      clearCache();
+      setPages(p => ({ [activeTab]: p[activeTab] }));
+      fetchDocs(activeTab, true);
+    };
+    document.addEventListener("visibilitychange", onVisible);
+    return () => document.removeEventListener("visibilitychange", onVisible);
+  }, [activeTab]);
 
   const openPreview = async (doc: Doc) => {
     if (!doc.url) return;
@@ -201,25 +259,20 @@ export default function Documents() {
     }
   };
 
-  const devis = items.filter(d => d.type?.toLowerCase() === "devis" && d.source !== "maintenance");
-  const factures = items.filter(d => d.type?.toLowerCase() === "facture" && d.source !== "maintenance");
-  const maintenance = items.filter(d => d.source === "maintenance");
-  
-  const filteredItems = activeTab === "all" 
-    ? items 
-    : activeTab === "devis" 
-      ? devis 
-      : activeTab === "factures" 
-        ? factures 
-        : maintenance;
+  // Déjà triés et filtrés par le serveur
+  const sortedItems = pages[activeTab]?.items ?? [];
+  const hasMore = !!pages[activeTab]?.next_cursor;
 
-  const sortedItems = [...filteredItems].sort((a, b) => b.date.localeCompare(a.date));
+  const count = (tab: TabType) => {
+    const page = pages[tab];
+    return page ? `${page.items.length}${page.next_cursor ? "+" : ""}` : "…";
+  };
 
-  const tabs: { id: TabType; label: string; count: number; color?: string }[] = [
-    { id: "all", label: "Tous", count: items.length },
-    { id: "devis", label: "Devis", count: devis.length },
-    { id: "factures", label: "Factures", count: factures.length },
-    { id: "maintenance", label: "Maintenance", count: maintenance.length, color: "gold" },
+  const tabs: { id: TabType; label: string; count: string; color?: string }[] = [
+    { id: "all", label: "Tous", count: count("all") },
+    { id: "devis", label: "Devis", count: count("devis") },
+    { id: "factures", label: "Factures", count: count("factures") },
+    { id: "maintenance", label: "Maintenance", count: count("maintenance"), color: "gold" },
   ];
 
   return (
@@ -231,7 +284,7 @@ export default function Documents() {
           <p className="text-gray-500 text-sm mt-1">Consultez et gérez vos devis, factures et documents de maintenance.</p>
         </div>
         <button
-          onClick={() => fetchDocs(true)}
+          onClick={() => fetchDocs(activeTab, true)}
           disabled={refreshing}
           className="flex items-center gap-2 px-4 py-2.5 rounded-xl bg-white border border-gray-200 hover:border-gray-300 text-sm font-medium text-gray-700 transition-all disabled:opacity-50 shadow-sm"
         >
@@ -310,26 +363,21 @@ export default function Documents() {
       {!loading && sortedItems.length > 0 && (
         <div className="grid gap-6 sm:grid-cols-2 lg:grid-cols-3">
           {sortedItems.map(d => (
-            <DocumentCard key={d.id} doc={d} openPreview={openPreview} />
+            <DocumentCard key={d.id} doc={d} openPreview={openPreview} onExternalAction={() => { awaitingReturn.current = true; }} />
           ))}
         </div>
       )}
 
-      {/* Stats footer */}
-      {!loading && items.length > 0 && (
-        <div className="flex items-center justify-center gap-8 pt-6 border-t border-gray-100 text-sm text-gray-400">
-          <span className="flex items-center gap-2">
-            <span className="w-2 h-2 rounded-full bg-blue-400" />
-            {devis.length} devis
-          </span>
-          <span className="flex items-center gap-2">
-            <span className="w-2 h-2 rounded-full bg-emerald-400" />
-            {factures.length} factures
-          </span>
-          <span className="flex items-center gap-2">
-            <span className="w-2 h-2 rounded-full bg-[#FEBD17]" />
-            {maintenance.length} maintenance
-          </span>
+      {/* Pagination */}
+      {!loading && hasMore && (
+        <div className="flex justify-center pt-2">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-5 py-3 rounded-xl bg-white border border-gray-200 hover:border-gray-300 text-sm font-medium text-gray-700 transition-all disabled:opacity-50 shadow-sm"
+          >
+            {loadingMore ? "Chargement..." : "Voir plus de documents"}
+          </button>
         </div>
       )}
     </div>
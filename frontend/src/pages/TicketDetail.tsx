@@ -1,9 +1,16 @@
 import { useEffect, useState } from "react";
 import { useParams, Link } from "react-router-dom";
-import { api } from "../lib/api";
+import { api, streamUrl } from "../lib/api";
 
-type Message = { body: string; from_client: boolean; created_at?: string };
-type Ticket = { subject: string; description: string; status: string; created_at: string; messages?: Message[] };
+type Message = { id?: string; body: string; from_client: boolean; created_at?: string };
+type Ticket = {
+  subject: string;
+  description: string;
+  status: string;
+  created_at: string;
+  messages?: Message[];
+  messages_before?: string | null;
+};
 
 const statusConfig: Record<string, { label: string; color: string }> = {
   ouvert: { label: "Ouvert", color: "bg-blue-500/15 text-blue-400 border-blue-500/20" },
@@ -15,12 +22,52 @@ const statusConfig: Record<string, { label: string; color: string }> = {
 export default function TicketDetail() {
   const { id } = useParams();
   const [data, setData] = useState<Ticket | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
 
   useEffect(() => {
     if (!id) return;
-    api<Record<string, unknown>>(`/api/v1/tickets/${id}`).then(r => setData(r as unknown as Ticket));
+    const load = () => api<Record<string, unknown>>(`/api/v1/tickets/${id}`).then(r => setData(r as unknown as Ticket));
+    load();
+    // Mises à jour temps réel : on recharge quand ce ticket change (ou sur demande de resync).
+    // Le jeton du flux expire vite : une connexion refusée (EventSource fermé) en redemande un.
+    let es: EventSource | null = null;
+    let closed = false;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    const onChange = (e: MessageEvent) => {
+      if (JSON.parse(e.data).ticket_id === id) load();
+    };
+    const connect = () =>
+      streamUrl("/api/v1/tickets/stream")
+        .then(url => {
+          if (closed) return;
+          es = new EventSource(url);
+          es.addEventListener("ticket", onChange);
+          es.addEventListener("message", onChange);
+          es.addEventListener("resync", load);
+          es.onerror = () => {
+            if (es?.readyState !== EventSource.CLOSED) return;
+            retry = setTimeout(() => { load(); connect(); }, 5000);
+          };
+        })
+        .catch(() => { if (!closed) retry = setTimeout(connect, 5000); });
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      es?.close();
+    };
   }, [id]);
 
+  const loadOlder = () => {
+    if (!id || !data?.messages_before) return;
+    setLoadingOlder(true);
+    api<{ items: Message[]; before: string | null }>(
+      `/api/v1/tickets/${id}/messages?before=${encodeURIComponent(data.messages_before)}`
+    )
+      .then(r => setData(d => d && { ...d, messages: [...r.items, ...(d.messages ?? [])], messages_before: r.before }))
+      .finally(() => setLoadingOlder(false));
+  };
+
   if (!data) {
     return (
       <div className="flex items-center justify-center py-24">
@@ -60,9 +107,18 @@ export default function TicketDetail() {
       {data.messages && data.messages.length > 0 && (
         <div className="space-y-3">
           <p className="text-white/40 text-xs uppercase tracking-wider">Échanges</p>
+          {data.messages_before && (
+            <button
+              onClick={loadOlder}
+              disabled={loadingOlder}
+              className="w-full text-xs text-white/40 hover:text-white/70 py-2 disabled:opacity-50"
+            >
+              {loadingOlder ? "Chargement…" : "Messages précédents"}
+            </button>
+          )}
           {data.messages.map((m, i) => (
             <div
-              key={i}
+              key={m.id ?? i}
               className={`flex ${m.from_client ? "justify-end" : "justify-start"}`}
             >
               <div className={`max-w-[85%] rounded-2xl p-4 text-sm leading-relaxed ${
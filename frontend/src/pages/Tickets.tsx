@@ -21,16 +21,53 @@ function StatusBadge({ status }: { status: string }) {
   );
 }
 
+type TicketPage = { items: Ticket[]; next_cursor: string | null };
+type SearchHit = Ticket & { match: { field: string; text: string; highlights: [number, number][] } | null };
+
+function Highlighted({ text, highlights }: { text: string; highlights: [number, number][] }) {
+  const parts: React.ReactNode[] = [];
+  let pos = 0;
+  highlights.forEach(([start, end], i) => {
+    parts.push(text.slice(pos, start), <mark key={i} className="bg-[#FEBD17]/30 text-gray-900 rounded px-0.5">{text.slice(start, end)}</mark>);
+    pos = end;
+  });
+  parts.push(text.slice(pos));
+  return <>{parts}</>;
+}
+
 export default function Tickets() {
   const [items, setItems] = useState<Ticket[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [query, setQuery] = useState("");
+  const [hits, setHits] = useState<SearchHit[] | null>(null);
+
+  useEffect(() => {
+    const q = query.trim();
+    if (q.length < 2) { setHits(null); return; }
+    const timer = setTimeout(() => {
+      api<{ items: SearchHit[] }>(`/api/v1/tickets/search?q=${encodeURIComponent(q)}`)
+        .then(r => setHits(r.items))
+        .catch(() => setHits([]));
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [query]);
 
   useEffect(() => {
-    api<{ items: Ticket[] }>("/api/v1/tickets")
-      .then(r => setItems(r.items))
+    api<TicketPage>("/api/v1/tickets")
+      .then(r => { setItems(r.items); setNextCursor(r.next_cursor); })
       .finally(() => setLoading(false));
   }, []);
 
+  const loadMore = () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    api<TicketPage>(`/api/v1/tickets?cursor=${encodeURIComponent(nextCursor)}`)
+      .then(r => { setItems(prev => [...prev, ...r.items]); setNextCursor(r.next_cursor); })
+      .finally(() => setLoadingMore(false));
+  };
+
   return (
     <div className="space-y-8 fade-in max-w-3xl">
       {/* En-tête */}
@@ -66,8 +103,36 @@ export default function Tickets() {
         </p>
       </div>
 
+      {/* Recherche */}
+      <input
+        type="search"
+        placeholder="Rechercher dans vos tickets et échanges…"
+        className="w-full rounded-xl border border-gray-200 bg-white px-4 py-3 text-sm text-gray-900 placeholder-gray-400 focus:border-[#FEBD17] focus:outline-none focus:ring-2 focus:ring-[#FEBD17]/20"
+        value={query}
+        onChange={e => setQuery(e.target.value)}
+      />
+
+      {hits && (
+        <div className="space-y-4">
+          {hits.length === 0 && <p className="text-gray-500 text-sm text-center py-8">Aucun ticket ne correspond à votre recherche.</p>}
+          {hits.map(t => (
+            <Link key={t.id} to={`/tickets/${t.id}`} className="card group block p-5 no-underline hover:shadow-lg transition-all">
+              <div className="flex items-center justify-between gap-4">
+                <p className="text-gray-900 font-medium text-sm truncate">{t.subject}</p>
+                <StatusBadge status={t.status} />
+              </div>
+              {t.match && (
+                <p className="text-gray-500 text-xs mt-2 leading-relaxed">
+                  <Highlighted text={t.match.text} highlights={t.match.highlights} />
+                </p>
+              )}
+            </Link>
+          ))}
+        </div>
+      )}
+
       {/* Liste */}
-      {loading && (
+      {!hits && loading && (
         <div className="space-y-4">
           {[1, 2, 3].map(i => (
             <div key={i} className="card p-5">
@@ -83,7 +148,7 @@ export default function Tickets() {
         </div>
       )}
 
-      {!loading && items.length === 0 && (
+      {!hits && !loading && items.length === 0 && (
         <div className="card text-center py-16 px-6">
           <div className="w-20 h-20 mx-auto mb-6 rounded-2xl bg-gray-100 flex items-center justify-center">
             <svg width="36" height="36" fill="none" stroke="#9CA3AF" strokeWidth="1.5" viewBox="0 0 24 24">
@@ -106,7 +171,7 @@ export default function Tickets() {
         </div>
       )}
 
-      {!loading && items.length > 0 && (
+      {!hits && !loading && items.length > 0 && (
         <div className="space-y-4">
           {items.map(t => (
             <Link
@@ -131,6 +196,15 @@ export default function Tickets() {
               </svg>
             </Link>
           ))}
+          {nextCursor && (
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="w-full py-3 text-sm font-semibold text-[#D9A200] hover:underline disabled:opacity-50"
+            >
+              {loadingMore ? "Chargement…" : "Voir plus de tickets"}
+            </button>
+          )}
         </div>
       )}
     </div>